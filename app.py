@@ -11,6 +11,7 @@ sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 from src.auth import check_authentication, show_login_page, logout
 from src.utils.database import DatabaseManager
+from src.utils.backends import database_target
 from src.utils.pdf_processor import PDFProcessor
 from src.utils.embeddings import EmbeddingGenerator
 from src.qa_system.rag_processor import RAGProcessor
@@ -20,6 +21,10 @@ from src.flashcards.flashcard_manager import FlashcardManager
 from src.wiki.wiki_builder import WikiBuilder
 from src.analytics.tracker import ProgressTracker
 
+# Rows fetched per keyset page in the wiki index and saved-question browser
+WIKI_TOPICS_PER_PAGE = 50
+QUESTIONS_PER_PAGE = 10
+
 # Page configuration with zoom
 st.set_page_config(
     page_title="MedPrepLibrary - USMLE Step 1 Prep",
@@ -374,7 +379,7 @@ def initialize_system():
         
         # Initialize database
         db_path = user_data_dir / "medprep.db"
-        st.session_state.db_manager = DatabaseManager(str(db_path))
+        st.session_state.db_manager = DatabaseManager(database_target(db_path))
         
         # Initialize embedding generator
         st.session_state.embedding_generator = EmbeddingGenerator()
@@ -609,8 +614,8 @@ def show_wiki_page():
         return
     
     try:
-        # Get pages organized by system
-        systems = st.session_state.db_manager.get_all_wiki_pages_by_system()
+        # Get page counts per system; titles are loaded a page at a time below
+        systems = st.session_state.db_manager.get_wiki_system_counts()
         
         if not systems or len(systems) == 0:
             st.warning("⚠️ Wiki database is empty or not loaded properly.")
@@ -620,6 +625,9 @@ def show_wiki_page():
         # Initialize selected topic in session state
         if 'selected_wiki_topic' not in st.session_state:
             st.session_state.selected_wiki_topic = None
+        # Number of title pages shown per system
+        if 'wiki_index_pages' not in st.session_state:
+            st.session_state.wiki_index_pages = {}
         
         # Create two columns: ontology on left, content on right
         col1, col2 = st.columns([1, 2])
@@ -631,17 +639,34 @@ def show_wiki_page():
             # Display expanded ontology
             for system in sorted(systems.keys()):
                 # System header with expander
-                with st.expander(f"**{system}** ({len(systems[system])} topics)", expanded=True):
-                    # Display all topics as clickable buttons
-                    for page in sorted(systems[system], key=lambda x: x['title']):
-                        topic_title = page['title']
-                        # Create a unique button for each topic
-                        if st.button(
-                            f"📄 {topic_title}", 
-                            key=f"wiki_topic_{topic_title}",
-                            width="stretch"
-                        ):
-                            st.session_state.selected_wiki_topic = topic_title
+                with st.expander(f"**{system}** ({systems[system]} topics)", expanded=True):
+                    # Page through the system's topics by title
+                    pages_shown = st.session_state.wiki_index_pages.get(system, 1)
+                    after = None
+                    shown = 0
+                    for _ in range(pages_shown):
+                        batch = st.session_state.db_manager.get_wiki_pages_page(
+                            system, after=after, limit=WIKI_TOPICS_PER_PAGE
+                        )
+                        # Display topics as clickable buttons
+                        for page in batch:
+                            topic_title = page['title']
+                            # Create a unique button for each topic
+                            if st.button(
+                                f"📄 {topic_title}", 
+                                key=f"wiki_topic_{topic_title}",
+                                width="stretch"
+                            ):
+                                st.session_state.selected_wiki_topic = topic_title
+                                st.rerun()
+                        shown += len(batch)
+                        if len(batch) < WIKI_TOPICS_PER_PAGE:
+                            break
+                        after = (system, batch[-1]['title'])
+                    
+                    if shown < systems[system]:
+                        if st.button(f"Show more ({systems[system] - shown} left)", key=f"wiki_more_{system}"):
+                            st.session_state.wiki_index_pages[system] = pages_shown + 1
                             st.rerun()
         
         with col2:
@@ -679,7 +704,7 @@ def show_wiki_page():
                 
                 # Show system summary
                 for system in sorted(systems.keys()):
-                    st.markdown(f"- **{system}**: {len(systems[system])} topics")
+                    st.markdown(f"- **{system}**: {systems[system]} topics")
                 
                 st.markdown("---")
                 st.info("💡 **Tip:** Click on any topic in the left panel to get started!")
@@ -710,7 +735,7 @@ def show_question_bank_page():
     with col1:
         # Get all systems for dropdown
         try:
-            systems = st.session_state.db_manager.get_all_wiki_pages_by_system()
+            systems = st.session_state.db_manager.get_wiki_system_counts()
             if systems and len(systems) > 0:
                 system_list = ["Any System"] + sorted(systems.keys())
             else:
@@ -747,7 +772,11 @@ def show_question_bank_page():
                 else:
                     query = "medical knowledge"
                 
-                context_chunks = st.session_state.rag_processor.get_relevant_chunks(query, k=10)
+                # Scope retrieval to the selected system, falling back to the whole corpus
+                scope = selected_system if selected_system != "Any System" else None
+                context_chunks = st.session_state.rag_processor.get_relevant_chunks(query, k=10, system=scope)
+                if not context_chunks and scope:
+                    context_chunks = st.session_state.rag_processor.get_relevant_chunks(query, k=10)
                 context = "\n\n".join([chunk['text'] for chunk in context_chunks])
                 
                 # Generate 10 questions
@@ -821,6 +850,8 @@ def show_question_bank_page():
             st.markdown("### 🎯 Your Results")
             st.metric("Score", f"{correct_count}/{len(st.session_state.generated_questions)} ({score_pct:.1f}%)")
     
+    show_saved_questions(system_list)
+    
     # Show some stats
     st.markdown("---")
     st.markdown("### 📊 Your Question Bank Stats")
@@ -838,6 +869,58 @@ def show_question_bank_page():
     except:
         st.info("Start answering questions to see your statistics!")
 
+def show_saved_questions(system_list):
+    """Browse saved questions a page at a time"""
+    st.markdown("---")
+    st.markdown("### 🗂️ Saved Questions")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        browse_system = st.selectbox("System:", system_list, key="browse_system")
+    with col2:
+        browse_topic = st.text_input("Topic:", placeholder="Exact topic name", key="browse_topic")
+    with col3:
+        browse_difficulty = st.selectbox("Difficulty:", ["Any", "Easy", "Medium", "Hard"], key="browse_difficulty")
+    
+    filters = {
+        'system': browse_system if browse_system != "Any System" else None,
+        'topic': browse_topic.strip() or None,
+        'difficulty': browse_difficulty.lower() if browse_difficulty != "Any" else None
+    }
+    
+    # Keyset cursors: the last question_id before each page visited so far
+    if st.session_state.get('browse_filters') != filters:
+        st.session_state.browse_filters = filters
+        st.session_state.browse_cursors = [0]
+    
+    questions = st.session_state.db_manager.get_questions_page(
+        after_id=st.session_state.browse_cursors[-1], limit=QUESTIONS_PER_PAGE, **filters
+    )
+    
+    if not questions:
+        st.info("No saved questions match these filters.")
+    
+    page_number = len(st.session_state.browse_cursors)
+    for question in questions:
+        with st.expander(f"**#{question['question_id']}** {question['topic']} ({question['difficulty']})"):
+            st.markdown(f"**{question['question_text']}**")
+            for key, value in question['options'].items():
+                st.markdown(f"{key}. {value}")
+            st.markdown(f"**Answer:** {question['correct_answer']}")
+            st.info(question['explanation'])
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if page_number > 1 and st.button("⬅️ Previous", key="browse_prev"):
+            st.session_state.browse_cursors.pop()
+            st.rerun()
+    with col2:
+        st.markdown(f"<p style='text-align: center;'>Page {page_number}</p>", unsafe_allow_html=True)
+    with col3:
+        if len(questions) == QUESTIONS_PER_PAGE and st.button("Next ➡️", key="browse_next"):
+            st.session_state.browse_cursors.append(questions[-1]['question_id'])
+            st.rerun()
+
 def show_flashcards_page():
     """Show Flashcards page"""
     st.markdown("## 🎴 Flashcards")
@@ -861,7 +944,7 @@ def show_flashcards_page():
     with col1:
         # Get all systems for dropdown
         try:
-            systems = st.session_state.db_manager.get_all_wiki_pages_by_system()
+            systems = st.session_state.db_manager.get_wiki_system_counts()
             if systems and len(systems) > 0:
                 system_list = ["Any System"] + sorted(systems.keys())
             else:
@@ -891,7 +974,11 @@ def show_flashcards_page():
                 else:
                     query = "medical knowledge"
                 
-                context_chunks = st.session_state.rag_processor.get_relevant_chunks(query, k=2)
+                # Scope retrieval to the selected system, falling back to the whole corpus
+                scope = selected_system if selected_system != "Any System" else None
+                context_chunks = st.session_state.rag_processor.get_relevant_chunks(query, k=2, system=scope)
+                if not context_chunks and scope:
+                    context_chunks = st.session_state.rag_processor.get_relevant_chunks(query, k=2)
                 context = "\n\n".join([chunk['text'] for chunk in context_chunks])
                 
                 # Generate flashcard using GeminiQA
@@ -991,8 +1078,8 @@ def show_analytics_page():
     
     try:
         # Get wiki pages count
-        systems = st.session_state.db_manager.get_all_wiki_pages_by_system()
-        total_topics = sum(len(topics) for topics in systems.values())
+        systems = st.session_state.db_manager.get_wiki_system_counts()
+        total_topics = sum(systems.values())
         
         col1, col2, col3, col4 = st.columns(4)
         
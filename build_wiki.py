@@ -2,6 +2,7 @@
 Build comprehensive wiki pages from cached documents
 """
 from src.utils.database import DatabaseManager
+from src.utils.backends import database_target
 from src.utils.embeddings import EmbeddingGenerator
 from src.qa_system.rag_processor import RAGProcessor
 from src.wiki.wiki_builder import WikiBuilder
@@ -14,7 +15,7 @@ sys.path.insert(0, str(Path(__file__).parent / "src"))
 db_file = Path('data/user_data/medprep.db')
 db_file.parent.mkdir(parents=True, exist_ok=True)
 
-db = DatabaseManager(db_file)
+db = DatabaseManager(database_target(db_file))
 emb_gen = EmbeddingGenerator()
 rag = RAGProcessor(Path('data/cache'), emb_gen)
 
@@ -0,0 +1,52 @@
+"""
+Merge duplicate questions and flashcards, logging every merge
+Exact duplicates stored before content hashing (found by the schema migration,
+which only records them) are merged first, then near-duplicates (same content
+in different words); new exact duplicates are already rejected on insert
+"""
+from src.utils.database import DatabaseManager
+from src.utils.backends import database_target
+from src.utils.embeddings import EmbeddingGenerator
+from src.utils.near_duplicates import merge_near_duplicates
+from src.utils.dedup import merge_exact_duplicates
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+# --dry-run: report the groups without merging anything
+dry_run = '--dry-run' in sys.argv
+# --exact-only: skip the near-duplicate pass (and loading the embedding model)
+exact_only = '--exact-only' in sys.argv
+THRESHOLD = 0.92
+
+db_file = Path('data/user_data/medprep.db')
+target = database_target(db_file)
+if target == str(db_file) and not db_file.exists():
+    print(f'❌ Database not found: {db_file}')
+    exit(1)
+
+db = DatabaseManager(target)
+
+for kind in ('questions', 'flashcards'):
+    print(f'Looking for exact duplicate {kind} recorded by the content-hash migration...')
+    groups = merge_exact_duplicates(db, kind, dry_run=dry_run)
+    for keep_id, duplicate_ids in groups:
+        print(f'   keep {keep_id}: {"would merge" if dry_run else "merged"} {duplicate_ids}')
+    merged = sum(len(duplicate_ids) for _, duplicate_ids in groups)
+    print(f'✅ {merged} exact duplicate {kind} {"found" if dry_run else "merged"} in {len(groups)} groups')
+
+if exact_only:
+    db.close()
+    exit(0)
+
+embedding_generator = EmbeddingGenerator()
+for kind in ('questions', 'flashcards'):
+    print(f'Looking for near-duplicate {kind} (cosine >= {THRESHOLD})...')
+    groups = merge_near_duplicates(db, embedding_generator, kind, THRESHOLD, dry_run=dry_run)
+    for keep_id, duplicate_ids in groups:
+        print(f'   keep {keep_id}: {"would merge" if dry_run else "merged"} {duplicate_ids}')
+    merged = sum(len(duplicate_ids) for _, duplicate_ids in groups)
+    print(f'✅ {merged} near-duplicate {kind} {"found" if dry_run else "merged"} in {len(groups)} groups')
+
+db.close()
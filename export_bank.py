@@ -0,0 +1,32 @@
+"""
+Export the question bank, response log and flashcard progress to columnar files
+Usage: python export_bank.py [out_dir] [--arrow]
+"""
+from src.utils.database import DatabaseManager
+from src.utils.backends import database_target
+from src.utils.columnar import export_tables
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+# --arrow: Arrow IPC files instead of Parquet
+fmt = 'arrow' if '--arrow' in sys.argv else 'parquet'
+args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+out_dir = Path(args[0] if args else 'data/exports')
+
+db_file = Path('data/user_data/medprep.db')
+target = database_target(db_file)
+if target == str(db_file) and not db_file.exists():
+    print(f'❌ Database not found: {db_file}')
+    exit(1)
+
+db = DatabaseManager(target)
+
+print(f'Exporting to {out_dir} ({fmt})...')
+counts = export_tables(db, out_dir, fmt=fmt)
+db.close()
+
+for table, rows in counts.items():
+    print(f'   {table}: {rows} rows')
+print('✅ Export complete')
@@ -0,0 +1,31 @@
+"""
+Import columnar files written by export_bank.py into this deployment's database
+Usage: python import_bank.py in_dir
+"""
+from src.utils.database import DatabaseManager
+from src.utils.backends import database_target
+from src.utils.columnar import import_tables
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+if len(sys.argv) < 2:
+    print('Usage: python import_bank.py in_dir')
+    exit(1)
+in_dir = Path(sys.argv[1])
+if not in_dir.is_dir():
+    print(f'❌ Export directory not found: {in_dir}')
+    exit(1)
+
+db_file = Path('data/user_data/medprep.db')
+db_file.parent.mkdir(parents=True, exist_ok=True)
+db = DatabaseManager(database_target(db_file))
+
+print(f'Importing from {in_dir}...')
+counts = import_tables(db, in_dir)
+db.close()
+
+for table, rows in counts.items():
+    print(f'   {table}: {rows} rows imported')
+print('✅ Import complete')
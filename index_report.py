@@ -0,0 +1,51 @@
+"""
+Compare approximate and compressed FAISS index types against exact search on the cached RAG index
+Reports index size, recall@k and per-query latency for each configuration, using the wiki topics as queries
+"""
+from src.utils.embeddings import EmbeddingGenerator
+from src.qa_system.rag_processor import RAGProcessor
+from src.qa_system.index_factory import index_contents, recall_report
+from src.wiki.wiki_builder import WikiBuilder
+from pathlib import Path
+import numpy as np
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+K = 8  # what the wiki builder retrieves per topic
+CONFIGS = [
+    ('hnsw', {'M': 32, 'efSearch': 32}),
+    ('hnsw', {'M': 32, 'efSearch': 64}),
+    ('hnsw', {'M': 32, 'efSearch': 128}),
+    ('ivf', {'nprobe': 8}),
+    ('ivf', {'nprobe': 16}),
+    ('ivf', {'nprobe': 32}),
+    ('sq8', {'rerank': 1}),
+    ('sq8', {'rerank': 4}),
+    ('pq', {'m': 48, 'rerank': 1}),
+    ('pq', {'m': 48, 'rerank': 4}),
+    ('pq', {'m': 96, 'rerank': 4}),
+    ('ivfpq', {'m': 48, 'nprobe': 16, 'rerank': 4}),
+    ('ivfpq', {'m': 48, 'nprobe': 32, 'rerank': 8}),
+]
+
+emb_gen = EmbeddingGenerator()
+rag = RAGProcessor(Path('data/cache'), emb_gen)
+if not rag.load_index():
+    print('❌ Failed to load RAG index. Run preprocess.py first.')
+    exit(1)
+
+ids, embeddings = index_contents(rag.index)
+if len(rag.vectors):
+    # A compressed index only holds approximations; use the stored originals
+    embeddings = rag.vectors[ids]
+embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+topics = WikiBuilder(None, rag)._get_comprehensive_topics()
+queries = np.asarray(emb_gen.encode(topics), dtype='float32')
+print(f'{len(embeddings)} vectors, {len(queries)} queries, recall@{K} against exact search\n')
+
+print(f"{'index':<8}{'params':<52}{'MB':>8}{'build s':>9}{'ms/query':>10}{'recall':>8}")
+for row in recall_report(embeddings, queries, K, CONFIGS):
+    params = ', '.join(f'{name}={value}' for name, value in row['params'].items())
+    print(f"{row['index_type']:<8}{params:<52}{row['index_mb']:>8.1f}{row['build_seconds']:>9.2f}"
+          f"{row['ms_per_query']:>10.3f}{row['recall']:>8.3f}")
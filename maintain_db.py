@@ -0,0 +1,58 @@
+"""
+Database maintenance: refresh planner statistics, checkpoint the WAL and reclaim free pages
+Safe to schedule (e.g. nightly from cron) while the app is running; --convert and --offline are not
+Existing databases need one --convert run before free pages can be reclaimed
+"""
+from src.utils.maintenance import maintain_database
+from src.utils.backends import database_target
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+# --analyze: full ANALYZE instead of PRAGMA optimize
+# --convert: one-time switch of older files to incremental auto-vacuum (blocks writers; run when quiet)
+# --offline: the app is stopped, so also truncate the WAL file (TRUNCATE checkpoint, blocks writers)
+analyze = '--analyze' in sys.argv
+convert = '--convert' in sys.argv
+offline = '--offline' in sys.argv
+
+user_data_dir = Path('data/user_data')
+targets = []
+for name in ('medprep.db', 'users.db'):
+    target = database_target(user_data_dir / name)
+    if target in targets:
+        # Both stores live in one server database
+        continue
+    if target == str(user_data_dir / name) and not (user_data_dir / name).exists():
+        print(f'⚠️  Skipping {target}: not found')
+        continue
+    targets.append(target)
+
+
+def format_bytes(size):
+    return f'{size / 1024 / 1024:.2f} MB'
+
+
+for target in targets:
+    report = maintain_database(target, analyze=analyze, convert_incremental=convert, truncate_wal=offline)
+    before, after = report['before'], report['after']
+    print(f"🔧 {report['database']} ({report['seconds']:.2f}s)")
+    if 'file_bytes' in before:
+        print(f"   file: {format_bytes(before['file_bytes'])} -> {format_bytes(after['file_bytes'])}")
+        note = ''
+        if after['wal_bytes'] and report['checkpoint']['mode'] == 'PASSIVE':
+            note = ' (run with --offline while the app is stopped to truncate)'
+        elif after['wal_bytes'] and not report['checkpoint']['truncated']:
+            note = ' (truncate skipped: database busy)'
+        print(f"   wal:  {format_bytes(before['wal_bytes'])} -> {format_bytes(after['wal_bytes'])}{note}")
+        print(f"   free pages: {before['freelist_count']} ({before['free_percent']:.1f}%) -> "
+              f"{after['freelist_count']} ({after['free_percent']:.1f}%), reclaimed {report['vacuumed_pages']}")
+        if after['auto_vacuum'] != 'incremental':
+            print('   ℹ️  auto_vacuum is off for this file; run with --convert once to enable reclaiming space')
+    else:
+        print(f"   size: {format_bytes(before['database_bytes'])} -> {format_bytes(after['database_bytes'])}")
+        print(f"   dead rows: {before['dead_rows']} ({before['dead_percent']:.1f}%) -> "
+              f"{after['dead_rows']} ({after['dead_percent']:.1f}%)")
+
+print('✅ Maintenance complete')
@@ -0,0 +1,23 @@
+"""
+Rebuild per-user statistics from the raw response log
+"""
+from src.utils.database import DatabaseManager
+from src.utils.backends import database_target
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+db_file = Path('data/user_data/medprep.db')
+target = database_target(db_file)
+if target == str(db_file) and not db_file.exists():
+    print(f'❌ Database not found: {db_file}')
+    exit(1)
+
+db = DatabaseManager(target)
+
+print('Rebuilding user statistics from user_responses...')
+rows = db.rebuild_user_statistics()
+db.close()
+
+print(f'✅ Rebuilt {rows} user/system aggregate rows')
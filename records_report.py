@@ -0,0 +1,69 @@
+"""
+Benchmark question reads: slotted Question records against the dict rows they replaced
+Builds a synthetic question bank in a temporary database and reports the time to fetch one
+system's questions and the memory the result retains, as records and as formatted dicts
+"""
+from src.utils.database import DatabaseManager
+from src.utils.records import Question
+from pathlib import Path
+import tracemalloc
+import tempfile
+import json
+import time
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+QUESTIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+REPEATS = 5
+
+
+def fetch_dicts(db, system):
+    """The read path before records: format each row tuple into a dict, decoding options up front"""
+    with db.connection() as conn:
+        rows = conn.execute(f'SELECT {Question.columns} FROM questions WHERE system = ?', (system,)).fetchall()
+    return [
+        {'question_id': q[0], 'topic': q[1], 'system': q[2], 'difficulty': q[3], 'question_text': q[4],
+         'options': json.loads(q[5]), 'correct_answer': q[6], 'explanation': q[7],
+         'source_document': q[8], 'source_page': q[9], 'created_at': q[10]}
+        for q in rows
+    ]
+
+
+def measure(fetch):
+    """Get (best ms of REPEATS fetches, MB the result retains, ms to then read every question's options)"""
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fetch()
+        best = min(best, (time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    result = fetch()
+    retained = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for question in result:
+        question['options']
+    return best, retained, (time.perf_counter() - start) * 1000
+
+
+with tempfile.TemporaryDirectory() as directory:
+    db = DatabaseManager(Path(directory) / 'records_report.db')
+    print(f'Building {QUESTIONS} questions...')
+    db.add_questions_bulk([
+        {'topic': f'Topic {i % 200}', 'system': 'Renal', 'difficulty': 'Medium',
+         'question_text': f'Question {i}: a patient presents with the following findings. ' * 3,
+         'options': {letter: f'Option {letter} for question {i}' for letter in 'ABCDE'},
+         'correct_answer': 'A', 'explanation': 'Explanation of the answer. ' * 10,
+         'source_document': 'synthetic.pdf'}
+        for i in range(QUESTIONS)
+    ])
+    
+    print(f"{'rows':<10}{'fetch ms':>10}{'retained MB':>13}{'options ms':>12}")
+    for label, fetch in (('dicts', lambda: fetch_dicts(db, 'Renal')),
+                         ('records', lambda: db.get_questions_by_system('Renal'))):
+        fetch_ms, retained_mb, options_ms = measure(fetch)
+        print(f"{label:<10}{fetch_ms:>10.1f}{retained_mb:>13.1f}{options_ms:>12.1f}")
+    db.close()
+
+print(f'✅ {QUESTIONS} questions per fetch; records decode options on first access (options ms)')
@@ -0,0 +1,44 @@
+"""
+Latency budget of dense, lexical (BM25) and hybrid retrieval on the cached RAG index
+Runs the wiki topics through each retrieval mode one query at a time and reports p50/p95 per stage
+"""
+from src.utils.embeddings import EmbeddingGenerator
+from src.qa_system.rag_processor import RAGProcessor, RETRIEVAL_MODES
+from src.wiki.wiki_builder import WikiBuilder
+from pathlib import Path
+import numpy as np
+import time
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+K = 8  # what the wiki builder retrieves per topic
+STAGES = ['encode', 'dense_search', 'lexical_search', 'fuse', 'fetch', 'total']
+
+emb_gen = EmbeddingGenerator()
+topics = None
+print(f"{'mode':<9}{'stage':<16}{'p50 ms':>9}{'p95 ms':>9}")
+for mode in RETRIEVAL_MODES:
+    rag = RAGProcessor(Path('data/cache'), emb_gen, retrieval_mode=mode)
+    if not rag.load_index():
+        print('❌ Failed to load RAG index. Run preprocess.py first.')
+        exit(1)
+    if topics is None:
+        topics = WikiBuilder(None, rag)._get_comprehensive_topics()
+    rag.get_relevant_chunks(topics[0], K)  # warm up the model and page in the index
+    
+    timings = {stage: [] for stage in STAGES}
+    for topic in topics:
+        start = time.perf_counter()
+        rag.get_relevant_chunks(topic, K)
+        timings['total'].append((time.perf_counter() - start) * 1000)
+        for stage, ms in rag.last_timings.items():
+            timings[stage].append(ms)
+    
+    for stage in STAGES:
+        if timings[stage]:
+            p50, p95 = np.percentile(timings[stage], [50, 95])
+            print(f"{mode:<9}{stage:<16}{p50:>9.2f}{p95:>9.2f}")
+    print()
+
+print(f'✅ {len(topics)} queries per mode, k={K}')
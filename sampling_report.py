@@ -0,0 +1,81 @@
+"""
+Benchmark random practice sets: the slot sampler against ORDER BY RANDOM()
+Builds synthetic question banks of 100k and 1M questions (or the sizes given as arguments), with a
+third of the questions deleted to leave id gaps, in temporary databases and reports p50/p95 latency
+of drawing a 40-question set each way
+"""
+from src.utils.database import DatabaseManager
+from src.utils.systems import SYSTEM_KEYWORDS
+from pathlib import Path
+import numpy as np
+import tempfile
+import random
+import time
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+SIZES = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+COUNT = 40  # the practice set size the app uses
+REPEATS = 30
+SYSTEMS = list(SYSTEM_KEYWORDS)
+DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+
+
+def timed(draw):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        rows = draw()
+        timings.append((time.perf_counter() - start) * 1000)
+    assert len(rows) == COUNT
+    return np.percentile(timings, [50, 95])
+
+
+def report(questions):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        db = DatabaseManager(Path(directory) / 'sampling_report.db')
+        print(f'\nBuilding {questions} questions...')
+        ids = db.add_questions_bulk([
+            {'topic': f'Topic {i % 500}', 'system': rng.choice(SYSTEMS), 'difficulty': rng.choice(DIFFICULTIES),
+             'question_text': f'Question {i}: which finding is most likely?',
+             'options': {'A': f'Option {i}a', 'B': f'Option {i}b', 'C': f'Option {i}c', 'D': f'Option {i}d'},
+             'correct_answer': 'A', 'explanation': 'Explanation ' * 20, 'source_document': 'synthetic.pdf'}
+            for i in range(questions)
+        ])
+        with db.transaction() as conn:
+            conn.executemany('DELETE FROM questions WHERE question_id = ?', [(i,) for i in ids if i % 3 == 0])
+            # A user who has answered a tenth of the bank
+            conn.executemany(
+                'INSERT INTO user_responses (user_id, question_id, selected_answer, is_correct) VALUES (1, ?, ?, 1)',
+                [(i, 'A') for i in ids if i % 3 and i % 10 == 1]
+            )
+        
+        def order_by_random(where='', params=()):
+            with db.connection() as conn:
+                return conn.execute(f'SELECT * FROM questions {where} ORDER BY RANDOM() LIMIT ?',
+                                    (*params, COUNT)).fetchall()
+        
+        cases = [
+            ('whole bank', lambda: order_by_random(), lambda: db.get_random_questions(COUNT)),
+            ('one system', lambda: order_by_random('WHERE system = ?', (SYSTEMS[0],)),
+             lambda: db.get_random_questions(COUNT, system=SYSTEMS[0])),
+            ('excluding answered', lambda: order_by_random(
+                'WHERE question_id NOT IN (SELECT question_id FROM user_responses WHERE user_id = 1)'),
+             lambda: db.get_random_questions(COUNT, exclude_user_id=1)),
+            ('stratified by system', None, lambda: db.get_random_questions(COUNT, stratify_by='system')),
+        ]
+        print(f"{'case':<22}{'method':<18}{'p50 ms':>9}{'p95 ms':>9}")
+        for case, baseline, sampler in cases:
+            for method, draw in (('ORDER BY RANDOM()', baseline), ('sampler', sampler)):
+                if draw is not None:
+                    p50, p95 = timed(draw)
+                    print(f"{case:<22}{method:<18}{p50:>9.2f}{p95:>9.2f}")
+        db.close()
+    
+    print(f'✅ {COUNT}-question sets, {REPEATS} draws each, {questions - questions // 3} questions remaining')
+
+
+for size in SIZES:
+    report(size)
@@ -0,0 +1,48 @@
+"""
+Benchmark wiki search: the FTS5 index against the LIKE substring scan it replaced
+Builds a synthetic wiki in a temporary database and reports p50/p95 latency of each search per query
+"""
+from src.utils.database import DatabaseManager
+from src.utils.systems import SYSTEM_KEYWORDS
+from pathlib import Path
+import numpy as np
+import tempfile
+import random
+import time
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+PAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+WORDS_PER_PAGE = 400
+QUERIES = ['myocardial', 'renal tubular', 'insulin receptor', 'cardio', 'pulmonary embolism', 'nephron']
+REPEATS = 20
+
+rng = random.Random(0)
+vocabulary = sorted({keyword for keywords in SYSTEM_KEYWORDS.values() for keyword in keywords} |
+                    {'embolism', 'tubular', 'acidosis', 'syndrome', 'presentation', 'diagnosis'})
+filler = [f'word{i}' for i in range(5000)]
+
+with tempfile.TemporaryDirectory() as directory:
+    db = DatabaseManager(Path(directory) / 'search_report.db')
+    print(f'Building {PAGES} wiki pages...')
+    db.upsert_wiki_pages_bulk([
+        {'title': f'Topic {i} {rng.choice(vocabulary)}', 'system': rng.choice(list(SYSTEM_KEYWORDS)),
+         'content': ' '.join(rng.choice(vocabulary) if rng.random() < 0.05 else rng.choice(filler)
+                             for _ in range(WORDS_PER_PAGE))}
+        for i in range(PAGES)
+    ])
+    
+    print(f"{'query':<20}{'method':<8}{'results':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for query in QUERIES:
+        for method, search in (('fts5', db.search_wiki_pages), ('like', db.search_wiki_pages_like)):
+            timings = []
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                results = search(query)
+                timings.append((time.perf_counter() - start) * 1000)
+            p50, p95 = np.percentile(timings, [50, 95])
+            print(f"{query:<20}{method:<8}{len(results):>9}{p50:>9.2f}{p95:>9.2f}")
+    db.close()
+
+print(f'✅ {len(QUERIES)} queries x {REPEATS} runs over {PAGES} pages (limit 50 results each)')
@@ -0,0 +1,80 @@
+"""
+Cold-start latency and memory per RAG session, with the index read into memory or memory-mapped
+Opens several sessions on the cached index in this process (as Streamlit sessions do) and in worker
+processes, and reports each one's load and first-query time and the memory it added (Linux only)
+"""
+from src.utils.embeddings import EmbeddingGenerator
+from src.qa_system.rag_processor import RAGProcessor
+from pathlib import Path
+import multiprocessing
+import time
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+SESSIONS = 4
+QUERY = "mechanism of action of loop diuretics"
+
+
+def memory_mb():
+    """Get (resident, private) memory of this process in MB; private excludes shared file pages"""
+    fields = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            fields[name] = value
+    return int(fields['VmRSS'].split()[0]) / 1024, int(fields['RssAnon'].split()[0]) / 1024
+
+
+def open_session(emb_gen, mmap_index):
+    """Load the index and answer one query; returns the session and its load ms, query ms, RSS and private MB added"""
+    rss, private = memory_mb()
+    start = time.perf_counter()
+    rag = RAGProcessor(Path('data/cache'), emb_gen, mmap_index=mmap_index)
+    if not rag.load_index():
+        print('❌ Failed to load RAG index. Run preprocess.py first.')
+        exit(1)
+    loaded = time.perf_counter()
+    rag.get_relevant_chunks(QUERY, 8)
+    queried = time.perf_counter()
+    new_rss, new_private = memory_mb()
+    return rag, ((loaded - start) * 1000, (queried - loaded) * 1000, new_rss - rss, new_private - private)
+
+
+def process_session(mmap_index, results):
+    """Worker process: one session, measured after the embedding model is loaded"""
+    emb_gen = EmbeddingGenerator()
+    emb_gen.encode([QUERY])
+    results.put(open_session(emb_gen, mmap_index)[1])
+
+
+def report(label, measurements):
+    for i, (load_ms, query_ms, rss_mb, private_mb) in enumerate(measurements, 1):
+        print(f"{label:<20}{i:>8}{load_ms:>10.0f}{query_ms:>10.1f}{rss_mb:>10.1f}{private_mb:>11.1f}")
+
+
+if __name__ == '__main__':
+    emb_gen = EmbeddingGenerator()
+    emb_gen.encode([QUERY])
+    print(f"{'':<20}{'session':>8}{'load ms':>10}{'query ms':>10}{'+RSS MB':>10}{'+private':>11}")
+    for mmap_index in (False, True):
+        mode = 'mmap' if mmap_index else 'read'
+        
+        # Sessions of one Streamlit server share the process
+        sessions = [open_session(emb_gen, mmap_index) for _ in range(SESSIONS)]
+        report(f"{mode}, in-process", [measurement for _, measurement in sessions])
+        del sessions
+        
+        # Workers run one after another, each after the previous has exited
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        measurements = []
+        for _ in range(SESSIONS):
+            worker = context.Process(target=process_session, args=(mmap_index, results))
+            worker.start()
+            measurements.append(results.get())
+            worker.join()
+        report(f"{mode}, processes", measurements)
+        print()
+    
+    print(f'✅ {SESSIONS} sessions per mode; +private is memory not shared with other sessions or processes')
@@ -4,34 +4,37 @@ Handles user login and session management
 """
 import streamlit as st
 import hashlib
-import sqlite3
 from pathlib import Path
 from datetime import datetime
 
+from src.utils.backends import create_backend, database_target
+from src.utils.connection_pool import ConnectionPool
+
 class AuthManager:
-    def __init__(self, db_path):
+    def __init__(self, db_path, pool_size=2):
+        """db_path: a SQLite file path, a postgresql:// URL, or a backend from backends.py"""
         self.db_path = db_path
+        self.backend = create_backend(db_path)
+        self.pool = ConnectionPool(self.backend, max_size=pool_size)
         self.init_database()
         self.init_default_users()
     
+    def close(self):
+        """Close all pooled connections"""
+        self.pool.close()
+    
     def init_database(self):
         """Initialize the user database"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        conn.execute('PRAGMA journal_mode=WAL')  # Enable Write-Ahead Logging for better concurrency
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with self.pool.connection() as conn:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id {self.backend.serial_primary_key},
+                    username TEXT UNIQUE NOT NULL,
+                    password_hash TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_login TIMESTAMP
+                )
+            ''')
     
     def init_default_users(self):
         """Initialize default users if they don't exist"""
@@ -50,41 +53,25 @@ class AuthManager:
     def create_user(self, username, password):
         """Create a new user if they don't exist"""
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0)
-            cursor = conn.cursor()
-            
-            password_hash = self.hash_password(password)
-            cursor.execute(
-                'INSERT INTO users (username, password_hash) VALUES (?, ?)',
-                (username, password_hash)
-            )
-            
-            conn.commit()
-            conn.close()
-            return True
-        except sqlite3.IntegrityError:
-            # User already exists
-            if conn:
-                conn.close()
-            return False
+            with self.pool.connection() as conn:
+                password_hash = self.hash_password(password)
+                cursor = conn.execute(
+                    'INSERT INTO users (username, password_hash) VALUES (?, ?) ON CONFLICT (username) DO NOTHING',
+                    (username, password_hash)
+                )
+                # No row inserted: user already exists
+                return cursor.rowcount == 1
         except Exception as e:
-            if conn:
-                conn.close()
             return False
     
     def verify_credentials(self, username, password):
         """Verify user credentials"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
-        
-        password_hash = self.hash_password(password)
-        cursor.execute(
-            'SELECT user_id FROM users WHERE username = ? AND password_hash = ?',
-            (username, password_hash)
-        )
-        
-        result = cursor.fetchone()
-        conn.close()
+        with self.pool.connection() as conn:
+            password_hash = self.hash_password(password)
+            result = conn.execute(
+                'SELECT user_id FROM users WHERE username = ? AND password_hash = ?',
+                (username, password_hash)
+            ).fetchone()
         
         if result:
             self.update_last_login(username)
@@ -93,26 +80,17 @@ class AuthManager:
     
     def update_last_login(self, username):
         """Update the last login timestamp"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'UPDATE users SET last_login = ? WHERE username = ?',
-            (datetime.now(), username)
-        )
-        
-        conn.commit()
-        conn.close()
+        with self.pool.connection() as conn:
+            conn.execute(
+                'UPDATE users SET last_login = ? WHERE username = ?',
+                (datetime.now(), username)
+            )
     
     def get_user_id(self, username):
         """Get user ID by username"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT user_id FROM users WHERE username = ?', (username,))
-        result = cursor.fetchone()
+        with self.pool.connection() as conn:
+            result = conn.execute('SELECT user_id FROM users WHERE username = ?', (username,)).fetchone()
         
-        conn.close()
         return result[0] if result else None
 
 
@@ -151,9 +129,10 @@ def show_login_page():
             if username and password:
                 # Initialize auth manager
                 db_path = Path(__file__).parent.parent / "data" / "user_data" / "users.db"
-                auth_manager = AuthManager(str(db_path))
+                auth_manager = AuthManager(database_target(db_path))
                 
                 success, user_id = auth_manager.verify_credentials(username, password)
+                auth_manager.close()
                 
                 if success:
                     st.session_state.authenticated = True
@@ -13,7 +13,10 @@ class FlashcardManager:
         generated_cards = []
         
         # Get relevant context
-        context, sources = self.rag.get_context_for_query(topic, max_chunks=5)
+        context, sources = self.rag.get_context_for_query(topic, max_chunks=5, system=system)
+        if not context:
+            # No chunks classified under this system; search the whole corpus
+            context, sources = self.rag.get_context_for_query(topic, max_chunks=5)
         
         if not context:
             return []
@@ -31,23 +34,42 @@ class FlashcardManager:
             )
             
             if flashcard_data and 'front' in flashcard_data and 'back' in flashcard_data:
-                # Add to database
-                card_id = self.db.add_flashcard(
-                    front_text=flashcard_data['front'],
-                    back_text=flashcard_data['back'],
-                    topic=topic,
-                    system=system,
-                    source_document=", ".join(sources)
-                )
-                
-                flashcard_data['card_id'] = card_id
                 generated_cards.append(flashcard_data)
         
-        return generated_cards
+        # Add to database in a single transaction
+        card_ids = self.db.add_flashcards_bulk([
+            {
+                'front_text': flashcard_data['front'],
+                'back_text': flashcard_data['back'],
+                'topic': topic,
+                'system': system,
+                'source_document': ", ".join(sources)
+            }
+            for flashcard_data in generated_cards
+        ])
+        
+        # Exact repeats within the batch map to the same stored card; return it once
+        unique_cards = []
+        seen_ids = set()
+        for flashcard_data, card_id in zip(generated_cards, card_ids):
+            if card_id in seen_ids:
+                continue
+            seen_ids.add(card_id)
+            flashcard_data['card_id'] = card_id
+            unique_cards.append(flashcard_data)
+        
+        return unique_cards
     
     def get_due_cards(self, user_id, limit=20):
-        """Get flashcards due for review"""
-        return self.db.get_due_flashcards(user_id, limit)
+        """Get flashcards due for review, topped up with new cards"""
+        cards = self.db.get_due_flashcards(user_id, limit)
+        if len(cards) < limit:
+            cards.extend(self.db.get_new_flashcards(user_id, limit - len(cards)))
+        return cards
+    
+    def count_due_cards(self, user_id):
+        """Count flashcards due for review (new cards not included)"""
+        return self.db.count_due_flashcards(user_id)
     
     def record_review(self, user_id, card_id, quality):
         """Record a flashcard review
@@ -57,4 +79,4 @@ class FlashcardManager:
         - 3: Good (correct with some effort)
         - 5: Easy (perfect recall)
         """
-        self.db.update_flashcard_progress(user_id, card_id, quality)
+        self.db.log_flashcard_review(user_id, card_id, quality)
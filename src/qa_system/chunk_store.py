@@ -0,0 +1,293 @@
+"""
+On-disk chunk store for the RAG processor
+Chunk text and metadata are memory-mapped and read lazily by FAISS id instead of loaded as JSON
+"""
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+# One row per chunk, sorted by id: where its text sits in the blob, which source
+# it came from and which system it covers (-1: not classified)
+ROW_DTYPE = np.dtype([('id', '<i8'), ('offset', '<i8'), ('length', '<i4'), ('source', '<i4'), ('system', '<i4')])
+# Rows written before chunks carried a system (chunk_sources.json then holds a plain list)
+LEGACY_ROW_DTYPE = np.dtype([('id', '<i8'), ('offset', '<i8'), ('length', '<i4'), ('source', '<i4')])
+
+# Rewrite the blob once dead text (from removed chunks) outweighs live text and exceeds this
+COMPACT_MIN_BYTES = 16 * 1024 * 1024
+
+
+class ChunkStore:
+    """Dict-like {chunk id: {"id", "text", "source", "system"}} backed by three files
+    
+    chunks.bin holds the UTF-8 texts back to back, chunks.idx the sorted row
+    table and chunk_sources.json the source and system names. Both data files are
+    memory-mapped, so the pages are shared by every session (and process)
+    reading the same cache, and a lookup decodes only the chunk it returns.
+    Changes are kept in memory until save(), which appends new text to the
+    blob and atomically replaces the row table.
+    """
+    
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.blob_path = self.directory / "chunks.bin"
+        self.rows_path = self.directory / "chunks.idx"
+        self.sources_path = self.directory / "chunk_sources.json"
+        
+        self._rows = np.zeros(0, dtype=ROW_DTYPE)
+        self._ids = self._rows['id']
+        self._blob = None
+        self._blob_file = None
+        self._sources = []
+        self._source_ids = {}
+        self._systems = []
+        self._system_ids = {}
+        
+        # Unsaved changes: chunks added or replaced, saved ids removed or replaced,
+        # and whether saved rows were changed in place (converted or classified)
+        self._pending = {}
+        self._deleted = set()
+        self._rewrite = False
+        self._rows_changed = False
+    
+    def exists(self) -> bool:
+        return self.rows_path.exists() and self.blob_path.exists() and self.sources_path.exists()
+    
+    def open(self):
+        """Map the saved store (call again after another process saves to see its changes)"""
+        self._close_maps()
+        with open(self.sources_path, 'r', encoding='utf-8') as f:
+            names = json.load(f)
+        legacy = isinstance(names, list)
+        self._sources = names if legacy else names["sources"]
+        self._systems = [] if legacy else names["systems"]
+        self._source_ids = {name: i for i, name in enumerate(self._sources)}
+        self._system_ids = {name: i for i, name in enumerate(self._systems)}
+        if legacy:
+            # Converted in memory; written in the current layout on the next save
+            old_rows = np.fromfile(self.rows_path, dtype=LEGACY_ROW_DTYPE)
+            self._rows = np.zeros(len(old_rows), dtype=ROW_DTYPE)
+            for name in LEGACY_ROW_DTYPE.names:
+                self._rows[name] = old_rows[name]
+            self._rows['system'] = -1
+        elif self.rows_path.stat().st_size > 0:
+            self._rows = np.memmap(self.rows_path, dtype=ROW_DTYPE, mode='r')
+        else:
+            self._rows = np.zeros(0, dtype=ROW_DTYPE)
+        self._ids = self._rows['id']
+        if self.blob_path.stat().st_size > 0:
+            self._blob_file = open(self.blob_path, 'rb')
+            self._blob = mmap.mmap(self._blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._pending = {}
+        self._deleted = set()
+        self._rewrite = False
+        self._rows_changed = legacy and len(self._rows) > 0
+        return self
+    
+    def _close_maps(self):
+        self._rows = np.zeros(0, dtype=ROW_DTYPE)
+        self._ids = self._rows['id']
+        if self._blob is not None:
+            self._blob.close()
+            self._blob_file.close()
+        self._blob = None
+        self._blob_file = None
+    
+    def close(self):
+        self._close_maps()
+    
+    def _find(self, chunk_id) -> int:
+        """Get the row number of a saved chunk, or -1"""
+        if self._rewrite or len(self._rows) == 0:
+            return -1
+        position = int(self._ids.searchsorted(chunk_id))
+        if position < len(self._ids) and self._ids[position] == chunk_id:
+            return position
+        return -1
+    
+    def _read_row(self, row) -> Dict:
+        offset, length = int(row['offset']), int(row['length'])
+        system = int(row['system'])
+        return {
+            "id": int(row['id']),
+            "text": self._blob[offset:offset + length].decode('utf-8'),
+            "source": self._sources[int(row['source'])],
+            "system": self._systems[system] if system >= 0 else None
+        }
+    
+    def get(self, chunk_id, default=None) -> Optional[Dict]:
+        """Get a chunk by id, reading only its own bytes from the blob"""
+        chunk_id = int(chunk_id)
+        if chunk_id in self._pending:
+            return self._pending[chunk_id]
+        if chunk_id in self._deleted:
+            return default
+        position = self._find(chunk_id)
+        if position < 0:
+            return default
+        return self._read_row(self._rows[position])
+    
+    def __getitem__(self, chunk_id) -> Dict:
+        chunk = self.get(chunk_id)
+        if chunk is None:
+            raise KeyError(chunk_id)
+        return chunk
+    
+    def __setitem__(self, chunk_id, chunk):
+        chunk_id = int(chunk_id)
+        if self._find(chunk_id) >= 0:
+            self._deleted.add(chunk_id)
+        self._pending[chunk_id] = dict(chunk, id=chunk_id)
+    
+    def __delitem__(self, chunk_id):
+        chunk_id = int(chunk_id)
+        if self._pending.pop(chunk_id, None) is not None:
+            return
+        if chunk_id in self._deleted or self._find(chunk_id) < 0:
+            raise KeyError(chunk_id)
+        self._deleted.add(chunk_id)
+    
+    def __contains__(self, chunk_id) -> bool:
+        return self.get(chunk_id) is not None
+    
+    def __len__(self) -> int:
+        saved = 0 if self._rewrite else len(self._rows) - len(self._deleted)
+        return saved + len(self._pending)
+    
+    def _saved_rows(self) -> Iterator:
+        if self._rewrite:
+            return
+        for row in self._rows:
+            if int(row['id']) not in self._deleted:
+                yield row
+    
+    def keys(self) -> Iterator[int]:
+        for row in self._saved_rows():
+            yield int(row['id'])
+        yield from self._pending
+    
+    __iter__ = keys
+    
+    def values(self) -> Iterator[Dict]:
+        for row in self._saved_rows():
+            yield self._read_row(row)
+        yield from self._pending.values()
+    
+    def items(self):
+        for chunk in self.values():
+            yield chunk["id"], chunk
+    
+    def ids_where(self, source: Optional[str] = None, system: Optional[str] = None) -> np.ndarray:
+        """Get the ids of chunks from this source and/or about this system, filtered on the row table"""
+        mask = np.ones(0 if self._rewrite else len(self._rows), dtype=bool)
+        if len(mask):
+            if source is not None:
+                mask &= self._rows['source'] == self._source_ids.get(source, -2)
+            if system is not None:
+                mask &= self._rows['system'] == self._system_ids.get(system, -2)
+            if self._deleted:
+                deleted = np.fromiter(self._deleted, dtype='int64', count=len(self._deleted))
+                mask &= ~np.isin(self._ids, deleted)
+        pending = [
+            chunk_id for chunk_id, chunk in self._pending.items()
+            if (source is None or chunk["source"] == source) and (system is None or chunk.get("system") == system)
+        ]
+        return np.concatenate([np.asarray(self._ids[mask], dtype='int64'), np.array(pending, dtype='int64')])
+    
+    def unclassified_ids(self) -> np.ndarray:
+        """Get the ids of saved chunks that have no system yet (stores written before systems existed)"""
+        if self._rewrite or len(self._rows) == 0:
+            return np.zeros(0, dtype='int64')
+        return np.asarray(self._ids[self._rows['system'] < 0], dtype='int64')
+    
+    def set_systems(self, ids, systems):
+        """Record the systems of saved chunks in place, without rewriting their text"""
+        if isinstance(self._rows, np.memmap):
+            self._rows = np.array(self._rows)
+            self._ids = self._rows['id']
+        positions = self._ids.searchsorted(np.asarray(ids, dtype='int64'))
+        self._rows['system'][positions] = [self._system_id(system) for system in systems]
+        self._rows_changed = True
+    
+    def replace_all(self, chunks):
+        """Drop every chunk and stage `chunks` (dicts with id, text and source) in their place"""
+        self._pending = {int(chunk["id"]): dict(chunk) for chunk in chunks}
+        self._deleted = set()
+        self._sources = []
+        self._source_ids = {}
+        self._systems = []
+        self._system_ids = {}
+        self._rewrite = True
+    
+    def _source_id(self, name) -> int:
+        if name not in self._source_ids:
+            self._source_ids[name] = len(self._sources)
+            self._sources.append(name)
+        return self._source_ids[name]
+    
+    def _system_id(self, name) -> int:
+        if name is None:
+            return -1
+        if name not in self._system_ids:
+            self._system_ids[name] = len(self._systems)
+            self._systems.append(name)
+        return self._system_ids[name]
+    
+    def save(self):
+        """Write pending changes: new text is appended, the row table replaced atomically"""
+        if not self._pending and not self._deleted and not self._rewrite and not self._rows_changed and self.exists():
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        
+        if self._rewrite:
+            live = np.zeros(0, dtype=ROW_DTYPE)
+        else:
+            deleted = np.fromiter(self._deleted, dtype='int64', count=len(self._deleted))
+            live = np.array(self._rows[~np.isin(self._ids, deleted)])
+        blob_size = 0 if self._rewrite or not self.blob_path.exists() else self.blob_path.stat().st_size
+        live_bytes = int(live['length'].sum()) if len(live) else 0
+        compact = self._rewrite or (blob_size - live_bytes > max(live_bytes, COMPACT_MIN_BYTES))
+        
+        if compact:
+            # Copy the live text into a fresh blob, then swap it in
+            temp_blob = self.blob_path.with_name(self.blob_path.name + '.tmp')
+            with open(temp_blob, 'wb') as f:
+                offset = 0
+                for i in range(len(live)):
+                    start, length = int(live['offset'][i]), int(live['length'][i])
+                    f.write(self._blob[start:start + length])
+                    live['offset'][i] = offset
+                    offset += length
+                new_rows = self._append(f, offset)
+            rows = np.concatenate([live, new_rows])
+            self._close_maps()
+            os.replace(temp_blob, self.blob_path)
+        else:
+            with open(self.blob_path, 'ab') as f:
+                rows = np.concatenate([live, self._append(f, blob_size)])
+        
+        rows.sort(order='id')
+        self._close_maps()
+        temp_rows = self.rows_path.with_name(self.rows_path.name + '.tmp')
+        rows.tofile(temp_rows)
+        # Replaced rather than rewritten: index versions may share (hard-link) these files
+        temp_sources = self.sources_path.with_name(self.sources_path.name + '.tmp')
+        with open(temp_sources, 'w', encoding='utf-8') as f:
+            json.dump({"sources": self._sources, "systems": self._systems}, f, ensure_ascii=False)
+        os.replace(temp_sources, self.sources_path)
+        os.replace(temp_rows, self.rows_path)
+        self.open()
+    
+    def _append(self, f, offset) -> np.ndarray:
+        """Write the pending chunks' text at `offset` in an open blob; returns their rows"""
+        rows = np.zeros(len(self._pending), dtype=ROW_DTYPE)
+        for i, (chunk_id, chunk) in enumerate(self._pending.items()):
+            data = chunk["text"].encode('utf-8')
+            f.write(data)
+            rows[i] = (chunk_id, offset, len(data), self._source_id(chunk["source"]),
+                       self._system_id(chunk.get("system")))
+            offset += len(data)
+        return rows
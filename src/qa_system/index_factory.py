@@ -0,0 +1,239 @@
+"""
+FAISS index construction for the RAG processor
+Builds exact (flat), approximate (HNSW, IVF) or compressed (SQ8, PQ, IVF-PQ)
+indexes and tunes their search-time parameters
+
+Every index is labelled with caller-chosen int64 ids, which searches return:
+flat, HNSW, SQ8 and PQ indexes are wrapped in IndexIDMap2, and IVF and IVF-PQ
+store ids natively.
+"""
+import time
+
+import faiss
+import numpy as np
+
+# read_index flag that leaves the index's vectors and inverted lists in the
+# file, mapped read-only, instead of copying them into process memory (faiss
+# releases before 1.10 can only map IVF inverted lists)
+MMAP_FLAG = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP)
+
+# Build-time parameters, plus the search-time ones (efSearch, nprobe, rerank)
+# that can also be changed on a loaded index. nlist=None picks ~4*sqrt(n)
+# lists. PQ splits vectors into m sub-vectors (m must divide the dimension)
+# of nbits each: 384-dim float32 vectors take 1536 bytes, 384 with SQ8 and
+# m with PQ at 8 bits.
+DEFAULT_PARAMS = {
+    'flat': {},
+    'hnsw': {'M': 32, 'efConstruction': 200, 'efSearch': 64},
+    'ivf': {'nlist': None, 'nprobe': 16},
+    'sq8': {'rerank': 4},
+    'pq': {'m': 48, 'nbits': 8, 'rerank': 4},
+    'ivfpq': {'nlist': None, 'm': 48, 'nbits': 8, 'nprobe': 16, 'rerank': 4},
+}
+SEARCH_PARAMS = {'flat': (), 'hnsw': ('efSearch',), 'ivf': ('nprobe',),
+                 'sq8': (), 'pq': (), 'ivfpq': ('nprobe',)}
+
+# Lossy types: their top rerank*k candidates are re-scored exactly against
+# the stored float32 vectors (rerank=1 turns that off)
+COMPRESSED_TYPES = ('sq8', 'pq', 'ivfpq')
+
+# Types that learn from the data (quantizers, IVF centroids) before vectors can be added
+TRAINED_TYPES = ('ivf', 'sq8', 'pq', 'ivfpq')
+
+# Most a filtered search widens efSearch / nprobe to make up for a narrow filter
+MAX_FILTER_BOOST = 16
+
+# FAISS wants ~39 training vectors per IVF list
+MIN_POINTS_PER_LIST = 39
+
+
+def resolve_params(index_type, params=None, count=0):
+    """Fill in defaults for an index type and size"""
+    if index_type not in DEFAULT_PARAMS:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {', '.join(DEFAULT_PARAMS)}")
+    resolved = dict(DEFAULT_PARAMS[index_type])
+    resolved.update(params or {})
+    if index_type in ('ivf', 'ivfpq') and not resolved['nlist']:
+        resolved['nlist'] = max(1, min(int(4 * np.sqrt(count)), count // MIN_POINTS_PER_LIST))
+    if 'nbits' in resolved and count:
+        # PQ training needs at least one point per centroid (2**nbits of them)
+        resolved['nbits'] = max(1, min(resolved['nbits'], int(np.log2(count))))
+    return resolved
+
+
+def build_index(embeddings, index_type='flat', params=None, ids=None):
+    """Build an index over float32 embeddings labelled with ids (default 0..n-1); returns (index, resolved params)"""
+    count, dimension = embeddings.shape
+    ids = np.arange(count, dtype='int64') if ids is None else np.asarray(ids, dtype='int64')
+    params = resolve_params(index_type, params, count)
+    
+    if index_type == 'hnsw':
+        graph = faiss.IndexHNSWFlat(dimension, params['M'])
+        graph.hnsw.efConstruction = params['efConstruction']
+        index = faiss.IndexIDMap2(graph)
+    elif index_type == 'ivf':
+        index = faiss.index_factory(dimension, f"IVF{params['nlist']},Flat")
+        index.train(embeddings)
+    elif index_type == 'sq8':
+        index = faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit))
+        index.train(embeddings)
+    elif index_type == 'pq':
+        index = faiss.IndexIDMap2(faiss.IndexPQ(dimension, params['m'], params['nbits']))
+        index.train(embeddings)
+    elif index_type == 'ivfpq':
+        # "np": no polysemous training, which only serves Hamming-filtered search
+        # (unused here) and would make training take minutes
+        index = faiss.index_factory(dimension, f"IVF{params['nlist']},PQ{params['m']}x{params['nbits']}np")
+        index.train(embeddings)
+    else:
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+    
+    index.add_with_ids(embeddings, ids)
+    set_search_params(index, index_type, params)
+    return index, params
+
+
+def set_search_params(index, index_type, params):
+    """Apply the search-time parameters that apply to this index type"""
+    space = faiss.ParameterSpace()
+    for name in SEARCH_PARAMS[index_type]:
+        if params.get(name) is not None:
+            space.set_index_parameter(index, name, params[name])
+
+
+def read_index(path, mmap=False):
+    """Read a saved index
+    
+    With mmap, the bulk of the index is served from the page cache, shared
+    by every session and process that maps the same file, and loading does
+    not read it up front. A mapped index is read-only: adding or removing
+    vectors aborts the process, so read it again without mmap to change it.
+    """
+    return faiss.read_index(str(path), MMAP_FLAG if mmap else 0)
+
+
+def filtered_search_params(index_type, params, ids, total):
+    """Build FAISS search parameters that restrict a search to these ids (out of `total`)
+    
+    The ID selector is applied inside the index scan rather than to results,
+    so a filtered search never comes back short from over-filtering. HNSW
+    and IVF only visit part of the index, which holds fewer matches the
+    narrower the filter, so efSearch and nprobe are scaled up by the inverse
+    of the filter's selectivity (capped at MAX_FILTER_BOOST). IndexPQ rejects
+    selectors, so a 'pq' index cannot be searched this way.
+    """
+    if index_type == 'pq':
+        raise ValueError("IndexPQ does not support ID selectors; search a sub-index of the matching vectors")
+    selector = faiss.IDSelectorBatch(np.asarray(ids, dtype='int64'))
+    boost = min(MAX_FILTER_BOOST, max(1, int(np.ceil(total / max(len(ids), 1)))))
+    if index_type == 'hnsw':
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=params['efSearch'] * boost)
+    if index_type in ('ivf', 'ivfpq'):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=min(params['nlist'], params['nprobe'] * boost))
+    return faiss.SearchParameters(sel=selector)
+
+
+def rerank(queries, candidates, vectors, k):
+    """Re-score candidate ids (-1 padded, one row per query) by exact L2 distance
+    
+    vectors: float32 rows indexable by an id array, e.g. a VectorStore or the
+    matrix the index was built from. Returns (distances, ids) of the best k per query.
+    """
+    distances = np.full((len(queries), k), np.inf, dtype='float32')
+    ids = np.full((len(queries), k), -1, dtype='int64')
+    for i, row in enumerate(candidates):
+        row = row[row >= 0]
+        if not len(row):
+            continue
+        exact = ((vectors[row] - queries[i]) ** 2).sum(axis=1)
+        order = np.argsort(exact)[:k]
+        distances[i, :len(order)] = exact[order]
+        ids[i, :len(order)] = row[order]
+    return distances, ids
+
+
+def index_contents(index):
+    """Get (ids, vectors) back out of an index (approximate for the compressed types)"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        ids = np.concatenate([np.zeros(0, dtype='int64')] + [
+            faiss.rev_swig_ptr(ivf.invlists.get_ids(list_no), ivf.invlists.list_size(list_no)).copy()
+            for list_no in range(ivf.nlist)
+        ])
+        ids.sort()
+        return ids, index.reconstruct_batch(ids)
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.vector_to_array(index.id_map), index.index.reconstruct_n(0, index.ntotal)
+    # Indexes saved before ids were assigned are labelled by position
+    return np.arange(index.ntotal, dtype='int64'), index.reconstruct_n(0, index.ntotal)
+
+
+def reconstruct_ids(index, ids):
+    """Get the stored vectors of these ids (approximate for the compressed types)"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index.reconstruct_batch(np.asarray(ids, dtype='int64'))
+
+
+def ensure_id_mapped(index, index_type, params):
+    """Convert a position-labelled flat or HNSW index (saved by older versions) to an id-mapped one"""
+    if faiss.try_extract_index_ivf(index) is not None or isinstance(index, faiss.IndexIDMap2):
+        return index
+    ids, vectors = index_contents(index)
+    return build_index(vectors, index_type, params, ids)[0]
+
+
+def remove_vectors(index, index_type, params, ids):
+    """Remove vectors by id; returns the index to use afterwards
+    
+    Flat and IVF indexes remove in place. An HNSW graph cannot drop nodes, so
+    it is rebuilt from its own stored vectors (nothing is re-encoded).
+    """
+    ids = np.asarray(ids, dtype='int64')
+    if index_type == 'hnsw':
+        stored_ids, vectors = index_contents(index)
+        keep = ~np.isin(stored_ids, ids)
+        return build_index(vectors[keep], index_type, params, stored_ids[keep])[0]
+    index.remove_ids(ids)
+    return index
+
+
+def recall_report(embeddings, queries, k=5, configs=None):
+    """Measure recall@k and per-query latency of index configurations against exact search
+    
+    configs: list of (index_type, params) to compare; the flat baseline is
+    always reported first. Each entry of the result is a dict with the type,
+    params, build_seconds, index_mb (serialized size), ms_per_query and
+    recall. Compressed types are re-ranked against `embeddings` the way
+    RAGProcessor re-ranks against its stored vectors.
+    """
+    exact = faiss.IndexFlatL2(embeddings.shape[1])
+    exact.add(embeddings)
+    _, truth = exact.search(queries, k)
+    
+    report = []
+    for index_type, params in [('flat', None)] + list(configs or []):
+        start = time.perf_counter()
+        index, resolved = build_index(embeddings, index_type, params)
+        build_seconds = time.perf_counter() - start
+        
+        depth = k * resolved.get('rerank', 1)
+        
+        # One query at a time, the way RAGProcessor searches
+        start = time.perf_counter()
+        found = []
+        for i in range(len(queries)):
+            ids = index.search(queries[i:i + 1], depth)[1]
+            if depth > k:
+                ids = rerank(queries[i:i + 1], ids, embeddings, k)[1]
+            found.append(ids)
+        found = np.vstack(found)
+        ms_per_query = (time.perf_counter() - start) / len(queries) * 1000
+        
+        hits = sum(len(set(found[i]) & set(truth[i])) for i in range(len(queries)))
+        report.append({'index_type': index_type, 'params': resolved, 'build_seconds': build_seconds,
+                       'index_mb': faiss.serialize_index(index).nbytes / 2 ** 20,
+                       'ms_per_query': ms_per_query, 'recall': hits / truth.size})
+    return report
@@ -0,0 +1,216 @@
+"""
+Versioned index directories for the RAG processor
+Every change is written to a new directory and published by atomically replacing a pointer file
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: writers are only serialized within one process
+    fcntl = None
+
+# Files that make up one version of the index
+INDEX_FILES = ("faiss_index.idx", "index_meta.json", "manifest.json", "chunks.bin", "chunks.idx",
+               "chunk_sources.json", "vectors.f32", "lexical.db")
+
+# SQLite updates pages in place, so each version gets its own copy; every
+# other file is only ever replaced (new inode) or appended to, so a new
+# version hard-links it and older versions keep reading their own bytes
+COPIED_FILES = ("lexical.db",)
+
+# Published versions kept on disk, the current one included, so sessions
+# still reading an older version are not cut off
+KEEP_VERSIONS = 3
+
+# Published versions whose checksums passed in this process; their files are
+# never changed, so further sessions opening the same version skip re-reading them
+_verified = set()
+
+
+class IndexVersions:
+    """Version directories under cache_dir/versions and the current.json pointer
+    
+    current.json names the published version and records each file's size
+    and the SHA-256 of that many leading bytes (appends by later versions to a
+    shared file leave an older version's checksum valid). Writers hold lock()
+    from create() to publish(), so one writes at a time; any number read.
+    """
+    
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.versions_dir = self.cache_dir / "versions"
+        self.pointer_path = self.cache_dir / "current.json"
+        self.lock_path = self.cache_dir / "versions.lock"
+        # Re-entrant for the owning thread; the file lock is taken at depth 1
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_file = None
+    
+    def acquire(self):
+        """Wait for the exclusive writer lock, shared by every instance and process on this cache"""
+        self._lock.acquire()
+        if self._lock_depth == 0:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                self._lock_file = open(self.lock_path, 'a')
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            except BaseException:
+                if self._lock_file is not None:
+                    self._lock_file.close()
+                    self._lock_file = None
+                self._lock.release()
+                raise
+        self._lock_depth += 1
+    
+    def release(self):
+        self._lock_depth -= 1
+        if self._lock_depth == 0:
+            # Closing the file drops the flock
+            self._lock_file.close()
+            self._lock_file = None
+        self._lock.release()
+    
+    @contextmanager
+    def lock(self):
+        """Hold the writer lock for the block (nested use by the same thread is fine)"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+    
+    def current(self) -> Optional[Dict]:
+        """Get the published pointer ({"version", "published_at", "files"}), or None"""
+        try:
+            with open(self.pointer_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+    
+    def stamp(self):
+        """Cheap check value that changes whenever a version is published"""
+        try:
+            stat = self.pointer_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+    
+    def directory(self, version: str) -> Path:
+        return self.versions_dir / version
+    
+    def _numbers(self):
+        if not self.versions_dir.exists():
+            return []
+        return sorted(int(path.name[1:]) for path in self.versions_dir.iterdir()
+                      if path.name.startswith('v') and path.name[1:].isdigit())
+    
+    def create(self, source=None) -> Tuple[str, Path]:
+        """Make the next version directory, starting from the files in `source` (if given)"""
+        numbers = self._numbers()
+        number = (numbers[-1] if numbers else 0) + 1
+        while True:
+            version = f"v{number:06d}"
+            directory = self.directory(version)
+            try:
+                directory.mkdir(parents=True)
+                break
+            except FileExistsError:
+                # Only possible for a writer not holding lock(); take the next number
+                number += 1
+        for name in INDEX_FILES if source else ():
+            path = Path(source) / name
+            if not path.exists():
+                continue
+            if name in COPIED_FILES:
+                shutil.copy2(path, directory / name)
+                continue
+            try:
+                os.link(path, directory / name)
+            except OSError:
+                shutil.copy2(path, directory / name)
+        return version, directory
+    
+    @staticmethod
+    def _checksum(path: Path, size: int) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            remaining = size
+            while remaining > 0:
+                block = f.read(min(remaining, 1 << 20))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+        return digest.hexdigest()
+    
+    def publish(self, version: str):
+        """Record checksums and atomically point current.json at a version, then drop old versions"""
+        directory = self.directory(version)
+        files = {}
+        for name in INDEX_FILES:
+            path = directory / name
+            if path.exists():
+                size = path.stat().st_size
+                files[name] = {"size": size, "sha256": self._checksum(path, size)}
+        pointer = {"version": version, "published_at": time.time(), "files": files}
+        temp_path = self.pointer_path.with_name(self.pointer_path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(pointer, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.pointer_path)
+        self.collect_garbage()
+    
+    def verify(self, pointer: Dict) -> bool:
+        """Check that a version's files are all there with the recorded contents"""
+        directory = self.directory(pointer["version"])
+        key = (str(directory.resolve()), pointer["published_at"])
+        if key in _verified:
+            return True
+        for name, expected in pointer["files"].items():
+            path = directory / name
+            if not path.exists() or path.stat().st_size < expected["size"]:
+                return False
+            if self._checksum(path, expected["size"]) != expected["sha256"]:
+                return False
+        _verified.add(key)
+        return True
+    
+    def discard(self, version: str):
+        """Delete an unpublished version"""
+        shutil.rmtree(self.directory(version), ignore_errors=True)
+    
+    def discard_unpublished(self, keep: Optional[str] = None):
+        """Delete versions newer than the published one (left by interrupted writes), except `keep`"""
+        pointer = self.current()
+        published = int(pointer["version"][1:]) if pointer else 0
+        for number in self._numbers():
+            version = f"v{number:06d}"
+            if number > published and version != keep:
+                self.discard(version)
+    
+    def collect_garbage(self):
+        """Delete published versions older than the newest KEEP_VERSIONS
+        
+        Files of a cache from before versioning, in cache_dir itself, are left
+        alone: sessions that loaded them have no version to be tracked by and
+        may still read them. The first version is made from them, so they can
+        be deleted by hand once no session started before it is left.
+        """
+        pointer = self.current()
+        if pointer is None:
+            return
+        published = int(pointer["version"][1:])
+        older = [number for number in self._numbers() if number <= published]
+        for number in older[:-KEEP_VERSIONS]:
+            self.discard(f"v{number:06d}")
@@ -0,0 +1,121 @@
+"""
+Lexical (BM25) retrieval for the RAG processor
+An SQLite FTS5 inverted index over chunk text, stored next to the FAISS index
+"""
+import hashlib
+import re
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Bumped when the table layout changes; an index with another version is rebuilt
+SCHEMA_VERSION = 2
+
+
+class LexicalIndex:
+    """BM25 search over chunks, keyed by the same ids as the FAISS index
+    
+    The FTS5 table is contentless (the text already lives in the chunk store),
+    so it holds only the inverted index. Porter stemming folds plurals and
+    inflections; exact terms such as drug names, eponyms and gene symbols
+    match as whole tokens, which dense embeddings often blur. Each chunk's
+    source and system are indexed as single opaque tokens in their own
+    columns, so searches can be scoped with a column filter; ranking uses
+    the text column only.
+    """
+    
+    def __init__(self, path):
+        self.path = Path(path)
+        self._conn = None
+    
+    def exists(self) -> bool:
+        """Whether a usable index is on disk (one in an older layout needs a rebuild)"""
+        if not self.path.exists():
+            return False
+        return self._connection().execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    
+    def _connection(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        return self._conn
+    
+    @staticmethod
+    def _tag(name: Optional[str]) -> str:
+        """Encode a source or system name as one token the tokenizer keeps intact"""
+        return 't' + hashlib.md5(str(name).encode('utf-8')).hexdigest()
+    
+    def _rows(self, chunks: Iterable[Dict]):
+        for chunk in chunks:
+            yield chunk["id"], chunk["text"], self._tag(chunk["source"]), self._tag(chunk.get("system"))
+    
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+    
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    
+    def rebuild(self, chunks: Iterable[Dict]):
+        """Replace the whole index with these chunks (dicts with id and text)"""
+        with self._transaction() as conn:
+            conn.execute('DROP TABLE IF EXISTS chunks_fts')
+            conn.execute('''
+                CREATE VIRTUAL TABLE chunks_fts
+                USING fts5(text, source, system, content='', tokenize='porter unicode61')
+            ''')
+            conn.execute("INSERT INTO chunks_fts (chunks_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0, 0.0)')")
+            conn.executemany('INSERT INTO chunks_fts (rowid, text, source, system) VALUES (?, ?, ?, ?)',
+                             self._rows(chunks))
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('optimize')")
+    
+    def add(self, chunks: Iterable[Dict]):
+        """Index new chunks"""
+        with self._transaction() as conn:
+            conn.executemany('INSERT INTO chunks_fts (rowid, text, source, system) VALUES (?, ?, ?, ?)',
+                             self._rows(chunks))
+    
+    def remove(self, chunks: Iterable[Dict]):
+        """Unindex chunks; a contentless table needs each chunk's original values to do so"""
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO chunks_fts (chunks_fts, rowid, text, source, system) VALUES ('delete', ?, ?, ?, ?)",
+                self._rows(chunks)
+            )
+    
+    @classmethod
+    def build_query(cls, query: str, source: Optional[str] = None, system: Optional[str] = None) -> str:
+        """Turn free text into an FTS5 query that ORs its quoted terms (BM25 weighs them by rarity)
+        
+        source and system restrict matches to chunks with that source or system.
+        """
+        terms = ' OR '.join(f'"{word}"' for word in re.findall(r'\w+', query or ''))
+        if not terms:
+            return ''
+        match = f'text : ({terms})'
+        if source is not None:
+            match += f' AND source : {cls._tag(source)}'
+        if system is not None:
+            match += f' AND system : {cls._tag(system)}'
+        return match
+    
+    def search(self, query: str, k: int, source: Optional[str] = None,
+               system: Optional[str] = None) -> List[Tuple[int, float]]:
+        """Get up to k (chunk id, bm25 score) pairs, best first (lower scores are better)"""
+        match = self.build_query(query, source, system)
+        if not match:
+            return []
+        return self._connection().execute('''
+            SELECT rowid, rank FROM chunks_fts WHERE chunks_fts MATCH ? ORDER BY rank LIMIT ?
+        ''', (match, k)).fetchall()
@@ -1,12 +1,30 @@
 """
 RAG (Retrieval Augmented Generation) processor for context retrieval
 """
+import hashlib
 import json
+import multiprocessing
+import os
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import threading
+import time
+from contextlib import contextmanager
 import faiss
 import nltk
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional, Iterable, Union
+
+from src.qa_system.chunk_store import ChunkStore
+from src.qa_system.index_versions import IndexVersions
+from src.qa_system.lexical_index import LexicalIndex
+from src.qa_system.index_factory import (
+    COMPRESSED_TYPES, TRAINED_TYPES, build_index, resolve_params, set_search_params, ensure_id_mapped, remove_vectors,
+    rerank, filtered_search_params, reconstruct_ids, read_index
+)
+from src.qa_system.vector_store import VectorStore
+from src.utils.systems import classify_system
 
 # Download required NLTK data
 try:
@@ -14,19 +32,133 @@ try:
 except LookupError:
     nltk.download('punkt', quiet=True)
 
+# 'dense' (FAISS), 'lexical' (BM25) or 'hybrid' (both, fused by reciprocal rank)
+RETRIEVAL_MODES = ('dense', 'lexical', 'hybrid')
+
+# Reciprocal rank fusion constant: a chunk scores 1 / (RRF_K + rank) per retriever
+RRF_K = 60
+
+# Index types that must be trained are built from the first this many
+# chunks of a streaming build, then the rest are added to them
+TRAIN_SAMPLE = 65536
+
+# Filters matching at most this many chunks search an exact sub-index of just
+# those chunks: HNSW and IVF traversal can miss a few matches scattered
+# through a large index, and a flat scan of a few thousand rows beats a
+# selector-filtered scan of the compressed codes
+SMALL_FILTER = 4096
+# Index types whose search takes no ID selector: every filter uses a sub-index
+UNFILTERABLE_TYPES = ('pq',)
+
+# Chunking processes are spawned rather than forked: a fork copies the
+# parent's FAISS/BLAS and encoder thread state and open database handles,
+# which can deadlock the child. The default leaves most cores to encoding
+DEFAULT_CHUNK_WORKERS = min(4, max(1, (os.cpu_count() or 2) // 2))
+
+
+def _chunk_document(content: str) -> List[str]:
+    """Process pool entry point for process_documents"""
+    return RAGProcessor.chunk_text(content)
+
 class RAGProcessor:
-    def __init__(self, cache_dir, embedding_generator):
+    def __init__(self, cache_dir, embedding_generator, index_type: str = 'flat',
+                 index_params: Optional[Dict] = None, retrieval_mode: str = 'dense',
+                 mmap_index: bool = True):
+        """index_type: 'flat' (exact), 'hnsw' or 'ivf' (approximate, see index_factory)
+        
+        index_params override the type's defaults. A loaded index keeps the type
+        it was built with (recorded in index_meta.json); only its search-time
+        parameters (efSearch, nprobe, rerank) are taken from index_params.
+        The compressed types 'sq8', 'pq' and 'ivfpq' keep the full vectors on
+        disk (vectors.f32) and re-rank their top candidates exactly.
+        
+        retrieval_mode: 'dense' (embeddings only), 'lexical' (BM25 only) or
+        'hybrid' (both, fused by reciprocal rank), see get_relevant_chunks_batch.
+        
+        mmap_index: map the loaded index read-only instead of reading it into
+        memory, so every session and process on the host shares one
+        page-cached copy (see index_factory.read_index). Changing the index
+        first reads a private copy, and publishing maps the new version.
+        
+        Each change to the index is written to a new version directory and
+        published atomically (see index_versions); other instances reading the
+        same cache switch to it before their next query. One process should
+        write to a cache at a time.
+        """
         self.cache_dir = Path(cache_dir)
-        self.index_path = self.cache_dir / "faiss_index.idx"
+        # JSON chunk list written by older versions; converted to the chunk store on load
         self.chunks_path = self.cache_dir / "text_chunks.json"
+        # Present while process_documents runs; lets an interrupted build resume
+        self.build_state_path = self.cache_dir / "build_state.json"
+        # Published version in use and the pointer stamp it was checked against
+        self.versions = IndexVersions(self.cache_dir)
+        self.version = None
+        self._pointer_stamp = None
         self.embedding_generator = embedding_generator
+        self.index_type = index_type
+        self.index_params = dict(index_params or {})
+        resolve_params(index_type, self.index_params)  # fail fast on an unknown type
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {retrieval_mode!r}; expected one of {', '.join(RETRIEVAL_MODES)}")
+        self.retrieval_mode = retrieval_mode
+        self.mmap_index = mmap_index
         
         # Initialize FAISS index
         self.embedding_size = embedding_generator.embedding_size
-        self.index = faiss.IndexFlatL2(self.embedding_size)
-        self.chunks = []
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatL2(self.embedding_size))
+        self.index_meta = {"index_type": "flat", "params": {}}
+        # Whether self.index is mapped from its file (and so read-only)
+        self._index_mapped = False
+        # Per document the ids and text hashes of its chunks, so updates only
+        # re-encode what changed
+        self._manifest = {"next_id": 0, "documents": {}}
+        # Milliseconds per stage of the last retrieval call
+        self.last_timings = {}
+        
+        # Until a version is loaded, files are read from (and changes start
+        # from) cache_dir itself, where caches from before versioning live
+        self._attach(self.cache_dir)
+        # Held by the thread switching to a newer version; others keep querying the current one
+        self._switching = threading.Lock()
+    
+    @property
+    def index_path(self) -> Path:
+        return self.version_dir / "faiss_index.idx"
+    
+    @property
+    def meta_path(self) -> Path:
+        return self.version_dir / "index_meta.json"
+    
+    @property
+    def manifest_path(self) -> Path:
+        return self.version_dir / "manifest.json"
+    
+    def _attach(self, directory: Path, chunks: Optional[ChunkStore] = None, vectors: Optional[VectorStore] = None):
+        """Read and write the chunk, vector and lexical stores in a version directory
+        
+        The previous stores are not closed: a query still running on another
+        thread may be reading them, and they close once it lets go of them.
+        """
+        self.version_dir = Path(directory)
+        # Full-precision vectors by chunk id, kept only for compressed indexes
+        self.vectors = vectors or VectorStore(self.version_dir / "vectors.f32", self.embedding_size)
+        # Chunks by id (the FAISS label), memory-mapped from disk
+        self.chunks = chunks or ChunkStore(self.version_dir)
+        # BM25 index over the same chunk ids, kept in step with the chunk store
+        self.lexical = LexicalIndex(self.version_dir / "lexical.db")
+        # Per (source, system) filter, the FAISS search parameters (ID selector)
+        # or exact sub-index to search with, rebuilt after the chunks change
+        self._filters = {}
     
-    def chunk_text(self, text: str, chunk_size: int = 800, overlap: int = 100) -> List[str]:
+    def _open_stores(self):
+        """Map the saved chunks (and vectors, for compressed indexes) of the attached directory"""
+        if self.chunks.exists():
+            self.chunks.open()
+        if self.index_meta["index_type"] in COMPRESSED_TYPES and self.vectors.exists():
+            self.vectors.open()
+    
+    @staticmethod
+    def chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> List[str]:
         """Split text into overlapping chunks using NLTK's sentence tokenizer"""
         sentences = nltk.sent_tokenize(text)
         chunks = []
@@ -63,99 +195,693 @@ class RAGProcessor:
         
         return chunks
     
-    def process_documents(self, documents: Dict[str, str]):
-        """Process documents and create FAISS index"""
+    def process_documents(self, documents: Union[Dict[str, str], Iterable[Tuple[str, str]]],
+                          workers: Optional[int] = None, batch_size: int = 256,
+                          checkpoint_every: int = 20000, resume: bool = True) -> bool:
+        """Build the index from scratch over documents, streaming
+        
+        documents: {name: text} or an iterable of (name, text) pairs, e.g. a
+            generator that reads one file at a time
+        workers: processes chunking documents in parallel (default:
+            DEFAULT_CHUNK_WORKERS); 1 chunks in this process with self.chunk_text
+        
+        Chunks are encoded batch_size at a time and added to the index as they
+        go, so memory holds one batch (plus the training sample for the
+        trained index types) rather than the corpus. Every checkpoint_every
+        chunks the index, chunks and manifest are saved; if the run is
+        interrupted, calling process_documents again with resume=True skips
+        the documents that were completely indexed. The build is written to a
+        new version, published when it completes; until then other instances
+        keep serving the current version. Other writers wait for the build.
+        """
+        self.versions.acquire()
         try:
             print("Starting document processing...")
-            all_chunks = []
-            all_texts = []
-            
-            # Process each document
-            total_chunks = 0
-            for doc_name, content in documents.items():
-                print(f"Processing {doc_name}...")
-                chunks = self.chunk_text(content)
-                total_chunks += len(chunks)
-                print(f"Generated {len(chunks)} chunks from {doc_name}")
-                
-                # Store chunk metadata
-                for chunk in chunks:
-                    all_chunks.append({
-                        "text": chunk,
-                        "source": doc_name
-                    })
-                    all_texts.append(chunk)
+            if not (resume and self._resume_build()):
+                self._start_build()
+            done = self.manifest["documents"]
+            items = documents.items() if isinstance(documents, dict) else documents
             
-            print(f"Total chunks processed: {total_chunks}")
+            # Content hash of each document still being indexed, its chunk
+            # entries so far and how many of its chunks are not yet indexed
+            open_documents = {}
+            queue = []
+            sample = []
+            since_checkpoint = 0
+            skipped = 0
             
-            # Generate embeddings
-            print("Generating embeddings...")
-            embeddings = self.embedding_generator.encode(
-                all_texts,
-                batch_size=32,
-                show_progress=True
-            )
+            def todo():
+                nonlocal skipped
+                for doc_name, content in items:
+                    content_hash = self._hash(content)
+                    if doc_name in done and done[doc_name]["content_hash"] == content_hash:
+                        skipped += 1
+                        continue
+                    open_documents[doc_name] = [content_hash, [], 0]
+                    yield doc_name, content
             
-            # Convert to numpy array
-            embeddings_array = np.array(embeddings).astype('float32')
+            for doc_name, texts in self._chunk_documents(todo(), workers):
+                document = open_documents[doc_name]
+                for text in texts:
+                    chunk_id = self.manifest["next_id"]
+                    self.manifest["next_id"] += 1
+                    queue.append({"id": chunk_id, "text": text, "source": doc_name, "system": classify_system(text)})
+                    document[1].append([chunk_id, self._hash(text)])
+                document[2] += len(texts)
+                if not texts:
+                    self._close_document(doc_name, open_documents)
+                
+                while len(queue) >= batch_size:
+                    since_checkpoint += self._index_batch(queue[:batch_size], sample, open_documents)
+                    del queue[:batch_size]
+                if since_checkpoint >= checkpoint_every:
+                    self._save()
+                    since_checkpoint = 0
+                    print(f"Checkpoint: {int(self.index.ntotal)} chunks, {len(done)} documents indexed")
             
-            # Create FAISS index
-            print("Creating FAISS index...")
-            self.index = faiss.IndexFlatL2(self.embedding_size)
-            self.index.add(embeddings_array)
-            self.chunks = all_chunks
+            if queue:
+                self._index_batch(queue, sample, open_documents)
+            if sample:
+                self._build_from_sample(sample, open_documents)
+            if skipped:
+                print(f"Skipped {skipped} documents indexed before the interruption")
             
-            # Save index and chunks
+            # Save index, its type, chunks and manifest
             print("Saving index and chunks...")
-            self.cache_dir.mkdir(parents=True, exist_ok=True)
-            faiss.write_index(self.index, str(self.index_path))
-            with open(self.chunks_path, 'w', encoding='utf-8') as f:
-                json.dump(all_chunks, f, ensure_ascii=False, indent=2)
+            self._save()
+            self._publish(self._building)
+            self.build_state_path.unlink()
             
-            print("Document processing complete!")
+            print(f"Document processing complete! {int(self.index.ntotal)} chunks from {len(done)} documents")
             return True
             
         except Exception as e:
             print(f"Error in process_documents: {str(e)}")
             import traceback
             traceback.print_exc()
+            # The unfinished version is kept for a resume; go back to the published one
+            if not self.load_index():
+                self._attach(self.cache_dir)
+                self._clear()
+            return False
+        finally:
+            self.versions.release()
+    
+    def _clear(self):
+        """Empty the in-memory index and manifest"""
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatL2(self.embedding_size))
+        self.index_meta = {"index_type": self.index_type, "params": {}}
+        self._index_mapped = False
+        self._manifest = {"next_id": 0, "documents": {}}
+        self._filters = {}
+    
+    def _start_build(self):
+        """Start a fresh build in an empty version directory and mark it as in progress"""
+        # Versions left by earlier interrupted builds or writes
+        self.versions.discard_unpublished()
+        self._building, directory = self.versions.create()
+        with open(self.build_state_path, 'w', encoding='utf-8') as f:
+            json.dump({"index_type": self.index_type, "version": self._building}, f)
+        self._attach(directory)
+        self._clear()
+        if self.index_type in COMPRESSED_TYPES:
+            self.vectors.replace_all([], np.zeros((0, self.embedding_size), dtype='float32'))
+        self.chunks.replace_all([])
+        self.chunks.save()
+        self.lexical.rebuild([])
+    
+    def _resume_build(self) -> bool:
+        """Pick up an interrupted build of the same index type from its last checkpoint"""
+        if not self.build_state_path.exists():
+            return False
+        with open(self.build_state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state["index_type"] != self.index_type or "version" not in state:
             return False
+        self.versions.discard_unpublished(keep=state["version"])
+        # Loaded into memory: the build goes on adding to it
+        if not self._load_directory(self.versions.directory(state["version"]), mmap=False):
+            return False
+        self._building = state["version"]
+        # Chunks of documents that were only partly indexed at the checkpoint
+        indexed = {chunk_id for document in self.manifest["documents"].values() for chunk_id, _ in document["chunks"]}
+        self._remove_chunks([chunk_id for chunk_id in self.chunks if chunk_id not in indexed])
+        # The lexical index commits every batch, so it may hold chunks from after the checkpoint
+        self.lexical.rebuild(self.chunks.values())
+        print(f"Resuming from a checkpoint with {len(self.manifest['documents'])} documents indexed")
+        return True
+    
+    def _chunk_documents(self, items: Iterable[Tuple[str, str]], workers: Optional[int]):
+        """Yield (name, chunks) per document in order, chunking up to `workers` at a time in a process pool"""
+        workers = workers or DEFAULT_CHUNK_WORKERS
+        if workers == 1:
+            for doc_name, content in items:
+                yield doc_name, self.chunk_text(content)
+            return
+        
+        # Keep a bounded number of documents in flight so memory does not grow with the corpus
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            in_flight = deque()
+            for doc_name, content in items:
+                in_flight.append((doc_name, pool.submit(_chunk_document, content)))
+                if len(in_flight) >= 2 * workers:
+                    doc_name, future = in_flight.popleft()
+                    yield doc_name, future.result()
+            while in_flight:
+                doc_name, future = in_flight.popleft()
+                yield doc_name, future.result()
+    
+    def _index_batch(self, chunks: List[Dict], sample: List, open_documents: Dict) -> int:
+        """Encode chunks and add them to the index; returns how many were added
+        
+        Trained index types hold chunks back in `sample` until there are
+        TRAIN_SAMPLE of them to build (and train) the index from.
+        """
+        embeddings = self.embedding_generator.encode([chunk["text"] for chunk in chunks], batch_size=32)
+        embeddings = np.asarray(embeddings, dtype='float32').reshape(len(chunks), -1)
+        if self.index.ntotal == 0 and self.index_type in TRAINED_TYPES:
+            sample.append((chunks, embeddings))
+            if sum(len(batch) for batch, _ in sample) < TRAIN_SAMPLE:
+                return 0
+            return self._build_from_sample(sample, open_documents)
+        
+        ids = np.array([chunk["id"] for chunk in chunks], dtype='int64')
+        if self.index.ntotal == 0:
+            self.index, params = build_index(embeddings, self.index_type, self.index_params, ids)
+            self.index_meta = {"index_type": self.index_type, "params": params}
+        else:
+            self.index.add_with_ids(embeddings, ids)
+        self._store_chunks(chunks, ids, embeddings, open_documents)
+        return len(chunks)
+    
+    def _build_from_sample(self, sample: List, open_documents: Dict) -> int:
+        """Build the index from the held-back sample and store its chunks"""
+        chunks = [chunk for batch, _ in sample for chunk in batch]
+        embeddings = np.vstack([batch_embeddings for _, batch_embeddings in sample])
+        ids = np.array([chunk["id"] for chunk in chunks], dtype='int64')
+        sample.clear()
+        print(f"Creating FAISS index ({self.index_type}) from {len(chunks)} chunks...")
+        self.index, params = build_index(embeddings, self.index_type, self.index_params, ids)
+        self.index_meta = {"index_type": self.index_type, "params": params}
+        self._store_chunks(chunks, ids, embeddings, open_documents)
+        return len(chunks)
+    
+    def _store_chunks(self, chunks: List[Dict], ids, embeddings, open_documents: Dict):
+        """Record indexed chunks in the chunk store, lexical index and vector store"""
+        self._filters = {}
+        if self.index_meta["index_type"] in COMPRESSED_TYPES:
+            self.vectors.add(ids, embeddings)
+        for chunk in chunks:
+            self.chunks[chunk["id"]] = chunk
+        self.lexical.add(chunks)
+        for chunk in chunks:
+            open_documents[chunk["source"]][2] -= 1
+            if open_documents[chunk["source"]][2] == 0:
+                self._close_document(chunk["source"], open_documents)
+    
+    def _close_document(self, doc_name: str, open_documents: Dict):
+        """Enter a document in the manifest once all its chunks are indexed"""
+        content_hash, entries, _ = open_documents.pop(doc_name)
+        self.manifest["documents"][doc_name] = {"content_hash": content_hash, "chunks": entries}
     
     def load_index(self) -> bool:
-        """Load pre-built index and chunks"""
+        """Load the published index version (or a cache saved before versioning)
+        
+        The new state is swapped in only once it has loaded, so if loading
+        fails the index in use is kept.
+        """
         try:
-            if self.index_path.exists() and self.chunks_path.exists():
-                print("Loading existing index...")
-                self.index = faiss.read_index(str(self.index_path))
-                with open(self.chunks_path, 'r', encoding='utf-8') as f:
-                    self.chunks = json.load(f)
-                print(f"Loaded {len(self.chunks)} chunks")
-                return True
-            return False
+            for _ in range(2):
+                stamp = self.versions.stamp()
+                pointer = self.versions.current()
+                if pointer is None or self.versions.verify(pointer):
+                    break
+                # Published over (and collected) while being read, or damaged; look again
+            else:
+                print(f"Index version {pointer['version']} failed its checksums")
+                return False
+            directory = self.versions.directory(pointer["version"]) if pointer else self.cache_dir
+            if not self._load_directory(directory):
+                return False
+            self.version = pointer["version"] if pointer else None
+            self._pointer_stamp = stamp
+            self._migrate()
+            if self.retrieval_mode != 'dense':
+                self._ensure_lexical()
+            print(f"Loaded {len(self.chunks)} chunks" + (f" (version {self.version})" if self.version else ""))
+            return True
         except Exception as e:
             print(f"Error loading index: {str(e)}")
             return False
     
-    def get_relevant_chunks(self, query: str, k: int = 5) -> List[Dict[str, str]]:
-        """Retrieve k most relevant chunks for a query"""
-        # Generate query embedding
-        query_embedding = self.embedding_generator.encode_single(query)
-        query_embedding = query_embedding.astype('float32').reshape(1, -1)
+    def _load_directory(self, directory: Path, mmap: Optional[bool] = None) -> bool:
+        """Load the index and chunks saved in a directory and switch to them (mmap overrides self.mmap_index)"""
+        mmap = self.mmap_index if mmap is None else mmap
+        index_path = directory / "faiss_index.idx"
+        chunks = ChunkStore(directory)
+        if not index_path.exists() or not (chunks.exists() or self.chunks_path.exists()):
+            return False
+        print("Loading existing index...")
+        index = read_index(index_path, mmap)
         
-        # Search index
-        distances, indices = self.index.search(query_embedding, k)
+        # Indexes saved before the type was recorded are flat
+        index_meta = {"index_type": "flat", "params": {}}
+        meta_path = directory / "index_meta.json"
+        if meta_path.exists():
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                index_meta = json.load(f)
+        if index_meta["index_type"] != self.index_type:
+            print(f"Loaded a {index_meta['index_type']} index; "
+                  f"rebuild with process_documents to switch to {self.index_type}")
+        set_search_params(index, index_meta["index_type"], {**index_meta["params"], **self.index_params})
+        vectors = VectorStore(directory / "vectors.f32", self.embedding_size)
+        if index_meta["index_type"] in COMPRESSED_TYPES and vectors.exists():
+            vectors.open()
+        if chunks.exists():
+            chunks.open()
+        
+        self.index, self.index_meta, self._index_mapped = index, index_meta, mmap
+        self._attach(directory, chunks, vectors)
+        # Only document updates need the manifest; it is read on first use
+        self._manifest = None
+        return True
+    
+    def _migrate(self):
+        """Bring a cache saved by older versions up to date, publishing the result as a new version"""
+        unclassified = self.chunks.unclassified_ids() if self.chunks.exists() else []
+        if self.version is not None and self.chunks.exists() and not len(unclassified):
+            return
+        with self._new_version():
+            # Another session may have published the migration while this one waited for the lock
+            if not self.chunks.exists():
+                # Chunk files saved before ids were assigned are labelled by position
+                print("Converting text_chunks.json to the chunk store...")
+                with open(self.chunks_path, 'r', encoding='utf-8') as f:
+                    self.chunks.replace_all(
+                        dict(chunk, id=chunk.get("id", i)) for i, chunk in enumerate(json.load(f))
+                    )
+                self.chunks.save()
+                self._dirty = True
+            unclassified = self.chunks.unclassified_ids()
+            if len(unclassified):
+                # Chunks stored before they carried a system
+                print(f"Classifying {len(unclassified)} chunks by system...")
+                self.chunks.set_systems(unclassified, [classify_system(self.chunks[chunk_id]["text"])
+                                                       for chunk_id in unclassified])
+                self._dirty = True
+            if self.version is None:
+                # A cache from before versioning is published as its first version
+                self._dirty = True
+    
+    def _ensure_lexical(self):
+        """Build the lexical index of a version saved without one"""
+        if self.lexical.exists() or not self.chunks.exists():
+            return
+        with self._new_version():
+            if self.lexical.exists():
+                return
+            print("Building lexical index...")
+            self.lexical.rebuild(self.chunks.values())
+            self._dirty = True
+    
+    def _refresh(self):
+        """Switch to a version published since the last check (by another instance or process)
+        
+        Costs one stat() of the pointer when nothing changed. Chunk ids are
+        stable across versions, so a query that straddles the switch on
+        another thread still resolves its results.
+        """
+        stamp = self.versions.stamp()
+        if stamp == self._pointer_stamp or not self._switching.acquire(blocking=False):
+            return
+        try:
+            pointer = self.versions.current()
+            if pointer is not None and pointer["version"] != self.version:
+                print(f"Switching to index version {pointer['version']}...")
+                self.load_index()
+            # A version that failed to load is not retried until the next publish
+            self._pointer_stamp = stamp
+        finally:
+            self._switching.release()
+    
+    @contextmanager
+    def _new_version(self):
+        """Apply the changes made in the block to a new version, published when the block completes
+        
+        The new version starts as hard links to the current one's files, so
+        readers of the current version are unaffected until the pointer flips.
+        Blocks that change the index call self._modify() (other changes just
+        set self._dirty); otherwise, or if the block raises, the new version
+        is thrown away. The writer lock is held throughout, and the block
+        starts from whatever version was published last, by any instance, so
+        it should check afresh whether its change is still needed.
+        """
+        with self.versions.lock():
+            pointer = self.versions.current()
+            if pointer is not None and pointer["version"] != self.version:
+                self.load_index()
+            previous = self.version_dir
+            version, directory = self.versions.create(previous)
+            self._attach(directory)
+            self._open_stores()
+            self._dirty = False
+            try:
+                yield
+            except Exception:
+                self.versions.discard(version)
+                if not self._load_directory(previous):
+                    self._attach(previous)
+                    self._clear()
+                raise
+            if not self._dirty:
+                self.versions.discard(version)
+                self._attach(previous)
+                self._open_stores()
+                return
+            self._save()
+            self._publish(version)
+    
+    def _publish(self, version: str):
+        self.versions.publish(version)
+        self.version = version
+        self._pointer_stamp = self.versions.stamp()
+        if self.mmap_index:
+            # Swap the private copy for the published file, mapped and shared with other sessions
+            self.index, self._index_mapped = read_index(self.index_path, mmap=True), True
+            self.tune_search()
+    
+    def _modify(self):
+        """Mark the new version as changed, swapping a mapped (read-only) index for a private, writable copy"""
+        self._dirty = True
+        if self._index_mapped:
+            self.index, self._index_mapped = read_index(self.index_path), False
+            self.tune_search()
+    
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    @property
+    def manifest(self) -> Dict:
+        if self._manifest is None:
+            if self.manifest_path.exists():
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+            else:
+                self._manifest = self._manifest_from_chunks()
+        return self._manifest
+    
+    def _manifest_from_chunks(self) -> Dict:
+        """Rebuild the manifest of a cache written before manifests existed"""
+        manifest = {"next_id": max(self.chunks, default=-1) + 1, "documents": {}}
+        for chunk_id, chunk in sorted(self.chunks.items()):
+            document = manifest["documents"].setdefault(chunk["source"], {"content_hash": None, "chunks": []})
+            document["chunks"].append([chunk_id, self._hash(chunk["text"])])
+        return manifest
+    
+    def _save(self):
+        """Write the index, its metadata, the chunks and the manifest to the attached version
+        
+        Each file is written beside its target and renamed over it: the old
+        file may be hard-linked into a published version.
+        """
+        self.version_dir.mkdir(parents=True, exist_ok=True)
+        self.index_meta["dimension"] = self.embedding_size
+        self.index_meta["count"] = int(self.index.ntotal)
+        temp_path = self.index_path.with_name(self.index_path.name + '.tmp')
+        faiss.write_index(self.index, str(temp_path))
+        os.replace(temp_path, self.index_path)
+        self._write_json(self.meta_path, self.index_meta, indent=2)
+        self.chunks.save()
+        if self._manifest is not None:
+            self._write_json(self.manifest_path, self._manifest)
+    
+    @staticmethod
+    def _write_json(path: Path, data, **kwargs):
+        temp_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **kwargs)
+        os.replace(temp_path, path)
+    
+    def documents(self) -> List[str]:
+        """Get the names of the indexed documents"""
+        return list(self.manifest["documents"])
+    
+    def _apply_document(self, doc_name: str, content: str) -> Dict[str, int]:
+        """Index a document's current content, encoding only chunks it did not already have"""
+        old = self.manifest["documents"].get(doc_name, {"content_hash": None, "chunks": []})
+        content_hash = self._hash(content)
+        if content_hash == old["content_hash"]:
+            return {"encoded": 0, "reused": len(old["chunks"]), "removed": 0}
+        self._modify()
+        
+        # Reuse the id (and stored vector) of every unchanged chunk
+        reusable = {}
+        for chunk_id, chunk_hash in old["chunks"]:
+            reusable.setdefault(chunk_hash, []).append(chunk_id)
+        entries = []
+        new_chunks = []
+        for text in self.chunk_text(content):
+            chunk_hash = self._hash(text)
+            if reusable.get(chunk_hash):
+                chunk_id = reusable[chunk_hash].pop(0)
+            else:
+                chunk_id = self.manifest["next_id"]
+                self.manifest["next_id"] += 1
+                new_chunks.append({"id": chunk_id, "text": text, "source": doc_name, "system": classify_system(text)})
+            entries.append([chunk_id, chunk_hash])
+        stale_ids = [chunk_id for ids in reusable.values() for chunk_id in ids]
+        
+        self._remove_chunks(stale_ids)
+        if new_chunks:
+            self._filters = {}
+            embeddings = self.embedding_generator.encode(
+                [chunk["text"] for chunk in new_chunks],
+                batch_size=32
+            )
+            embeddings_array = np.array(embeddings).astype('float32')
+            ids = np.array([chunk["id"] for chunk in new_chunks], dtype='int64')
+            if self.index.ntotal == 0:
+                # Nothing indexed yet: build the configured index type around these chunks
+                self.index, params = build_index(embeddings_array, self.index_type, self.index_params, ids)
+                self.index_meta = {"index_type": self.index_type, "params": params}
+            else:
+                self.index = ensure_id_mapped(self.index, self.index_meta["index_type"], self.index_meta["params"])
+                self.index.add_with_ids(embeddings_array, ids)
+            if self.index_meta["index_type"] in COMPRESSED_TYPES:
+                self.vectors.add(ids, embeddings_array)
+            for chunk in new_chunks:
+                self.chunks[chunk["id"]] = chunk
+            if self.lexical.exists():
+                self.lexical.add(new_chunks)
+        self.tune_search()
+        
+        self.manifest["documents"][doc_name] = {"content_hash": content_hash, "chunks": entries}
+        return {"encoded": len(new_chunks), "reused": len(entries) - len(new_chunks), "removed": len(stale_ids)}
+    
+    def _remove_chunks(self, chunk_ids: List[int]):
+        """Drop chunks from the index and the chunk store"""
+        if not chunk_ids:
+            return
+        self._filters = {}
+        index_type, params = self.index_meta["index_type"], self.index_meta["params"]
+        self.index = ensure_id_mapped(self.index, index_type, params)
+        self.index = remove_vectors(self.index, index_type, params, chunk_ids)
+        if self.lexical.exists():
+            self.lexical.remove([self.chunks[chunk_id] for chunk_id in chunk_ids])
+        for chunk_id in chunk_ids:
+            del self.chunks[chunk_id]
+    
+    def add_document(self, doc_name: str, content: str) -> Dict[str, int]:
+        """Add one document to the index without re-encoding the others
+        
+        Returns how many chunks were encoded, reused and removed.
+        """
+        self._refresh()
+        if doc_name in self.manifest["documents"]:
+            raise ValueError(f"{doc_name} is already indexed; use replace_document")
+        with self._new_version():
+            result = self._apply_document(doc_name, content)
+        return result
+    
+    def replace_document(self, doc_name: str, content: str) -> Dict[str, int]:
+        """Re-index a changed document, encoding only its new or edited chunks"""
+        with self._new_version():
+            result = self._apply_document(doc_name, content)
+        return result
+    
+    def remove_document(self, doc_name: str) -> int:
+        """Drop a document's chunks from the index; returns how many were removed"""
+        self._refresh()
+        if doc_name not in self.manifest["documents"]:
+            return 0
+        with self._new_version():
+            document = self.manifest["documents"].pop(doc_name, None)
+            if document is None:
+                return 0
+            self._modify()
+            self._remove_chunks([chunk_id for chunk_id, _ in document["chunks"]])
+            self.tune_search()
+        return len(document["chunks"])
+    
+    def update_documents(self, documents: Dict[str, str], remove_missing: bool = False) -> Dict[str, Dict[str, int]]:
+        """Bring the index in line with a set of documents, publishing one new version at the end
+        
+        New and changed documents are (re-)indexed and unchanged ones skipped;
+        with remove_missing, indexed documents not in `documents` are dropped.
+        """
+        results = {}
+        with self._new_version():
+            for doc_name, content in documents.items():
+                results[doc_name] = self._apply_document(doc_name, content)
+            if remove_missing:
+                for doc_name in set(self.manifest["documents"]) - set(documents):
+                    document = self.manifest["documents"].pop(doc_name)
+                    self._modify()
+                    self._remove_chunks([chunk_id for chunk_id, _ in document["chunks"]])
+                    results[doc_name] = {"encoded": 0, "reused": 0, "removed": len(document["chunks"])}
+                self.tune_search()
+        return results
+    
+    def tune_search(self, **params):
+        """Change search-time parameters of the current index (efSearch, nprobe, rerank; see index_factory)"""
+        self.index_params.update(params)
+        self._filters = {}
+        set_search_params(self.index, self.index_meta["index_type"],
+                          {**self.index_meta["params"], **self.index_params})
+    
+    def get_relevant_chunks(self, query: str, k: int = 5, source: Optional[str] = None,
+                            system: Optional[str] = None) -> List[Dict[str, str]]:
+        """Retrieve k most relevant chunks for a query, optionally only from one source document or system"""
+        return self.get_relevant_chunks_batch([query], k, source=source, system=system)[0]
+    
+    def get_relevant_chunks_batch(self, queries: List[str], k: int = 5, batch_size: int = 64,
+                                  source: Optional[str] = None,
+                                  system: Optional[str] = None) -> List[List[Dict[str, str]]]:
+        """Retrieve the k most relevant chunks for each of several queries
+        
+        source and system restrict the search to chunks from that document
+        and/or classified under that system (see src.utils.systems). The
+        filter is applied inside the FAISS scan with an ID selector (small
+        filters, and every filter on a 'pq' index, search an exact sub-index
+        of the matching chunks instead) and inside the FTS5 match, not by
+        over-fetching, so k results come back whenever that many chunks match.
+        
+        Dense retrieval encodes the queries in one batched pass and searches
+        the index once over the query matrix. Lexical retrieval ranks chunks by
+        BM25. Hybrid takes the top max(4k, 20) of each and orders the union by
+        reciprocal rank fusion, so a chunk ranked well by either one surfaces.
+        Results come back in query order; per-stage times (ms) are left in
+        self.last_timings.
+        """
+        self.last_timings = {}
+        if not queries:
+            return []
+        self._refresh()
+        queries = list(queries)
+        depth = k if self.retrieval_mode != 'hybrid' else max(4 * k, 20)
+        
+        rankings = []
+        if self.retrieval_mode != 'lexical':
+            rankings.append(self._dense_search(queries, depth, batch_size, source, system))
+        if self.retrieval_mode != 'dense':
+            rankings.append(self._lexical_search(queries, depth, source, system))
+        
+        start = time.perf_counter()
+        if len(rankings) == 1:
+            ranked_ids = rankings[0]
+        else:
+            ranked_ids = [self._fuse(ranked, k) for ranked in zip(*rankings)]
+            self.last_timings['fuse'] = (time.perf_counter() - start) * 1000
         
         # Get relevant chunks with metadata
+        start = time.perf_counter()
         results = []
-        for idx in indices[0]:
-            if 0 <= idx < len(self.chunks):
-                results.append(self.chunks[idx])
+        for ids in ranked_ids:
+            chunks = []
+            for chunk_id in ids[:k]:
+                chunk = self.chunks.get(chunk_id)
+                if chunk is not None:
+                    chunks.append(chunk)
+            results.append(chunks)
+        self.last_timings['fetch'] = (time.perf_counter() - start) * 1000
         
         return results
     
-    def get_context_for_query(self, query: str, max_chunks: int = 5) -> Tuple[str, List[str]]:
+    def _dense_search(self, queries: List[str], k: int, batch_size: int,
+                      source: Optional[str] = None, system: Optional[str] = None) -> List[List[int]]:
+        """Get the ids of each query's k nearest chunks (among those matching the filter)"""
+        index, params = self.index, None
+        if source is not None or system is not None:
+            start = time.perf_counter()
+            search_filter = self._search_filter(source, system)
+            self.last_timings['filter'] = (time.perf_counter() - start) * 1000
+            if search_filter is None:
+                return [[] for _ in queries]
+            index, params = search_filter
+        
+        start = time.perf_counter()
+        query_embeddings = self.embedding_generator.encode(queries, batch_size=batch_size)
+        query_embeddings = np.asarray(query_embeddings, dtype='float32').reshape(len(queries), -1)
+        self.last_timings['encode'] = (time.perf_counter() - start) * 1000
+        
+        # Compressed indexes over-fetch and re-rank against the stored vectors
+        depth = k
+        if self.index_meta["index_type"] in COMPRESSED_TYPES and len(self.vectors):
+            depth = k * {**self.index_meta["params"], **self.index_params}.get('rerank', 1)
+        
+        start = time.perf_counter()
+        distances, indices = index.search(query_embeddings, depth, params=params)
+        self.last_timings['dense_search'] = (time.perf_counter() - start) * 1000
+        if depth > k:
+            start = time.perf_counter()
+            distances, indices = rerank(query_embeddings, indices, self.vectors, k)
+            self.last_timings['rerank'] = (time.perf_counter() - start) * 1000
+        # -1 pads results when fewer than k exist
+        return [[int(idx) for idx in row if idx >= 0] for row in indices]
+    
+    def _search_filter(self, source: Optional[str], system: Optional[str]):
+        """Get (index, search parameters) that search only the chunks matching a filter, or None when none do"""
+        key = (source, system)
+        if key not in self._filters:
+            ids = self.chunks.ids_where(source, system)
+            index_type = self.index_meta["index_type"]
+            if not len(ids):
+                self._filters[key] = None
+            elif index_type in UNFILTERABLE_TYPES or (index_type != 'flat' and len(ids) <= SMALL_FILTER):
+                vectors = self.vectors[ids] if len(self.vectors) else reconstruct_ids(self.index, ids)
+                partition = faiss.IndexIDMap2(faiss.IndexFlatL2(self.embedding_size))
+                partition.add_with_ids(np.asarray(vectors, dtype='float32'), ids)
+                self._filters[key] = (partition, None)
+            else:
+                params = {**self.index_meta["params"], **self.index_params}
+                self._filters[key] = (self.index, filtered_search_params(index_type, params, ids, self.index.ntotal))
+        return self._filters[key]
+    
+    def _lexical_search(self, queries: List[str], k: int, source: Optional[str] = None,
+                        system: Optional[str] = None) -> List[List[int]]:
+        """Get the ids of each query's k best BM25 matches (among those matching the filter)"""
+        self._ensure_lexical()
+        if not self.lexical.exists():
+            return [[] for _ in queries]
+        start = time.perf_counter()
+        ranked = [[chunk_id for chunk_id, _ in self.lexical.search(query, k, source, system)] for query in queries]
+        self.last_timings['lexical_search'] = (time.perf_counter() - start) * 1000
+        return ranked
+    
+    @staticmethod
+    def _fuse(rankings, k: int) -> List[int]:
+        """Reciprocal rank fusion: order ids by the sum of 1 / (RRF_K + rank) over the rankings"""
+        scores = {}
+        for ranked in rankings:
+            for rank, chunk_id in enumerate(ranked, 1):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+    
+    def get_context_for_query(self, query: str, max_chunks: int = 5, source: Optional[str] = None,
+                              system: Optional[str] = None) -> Tuple[str, List[str]]:
         """Get relevant context and sources for a query"""
-        chunks = self.get_relevant_chunks(query, k=max_chunks)
+        chunks = self.get_relevant_chunks(query, k=max_chunks, source=source, system=system)
         context = "\n\n".join(chunk["text"] for chunk in chunks)
         sources = list(set(chunk["source"] for chunk in chunks))
         return context, sources
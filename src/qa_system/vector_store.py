@@ -0,0 +1,71 @@
+"""
+Full-precision vector store for the RAG processor
+Keeps the float32 embeddings of a compressed FAISS index on disk, memory-mapped, for exact re-ranking
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+class VectorStore:
+    """Float32 vectors in one file, row i holding the vector of chunk id i
+    
+    Chunk ids are assigned in sequence, so the file is a dense matrix read
+    through np.memmap: re-ranking touches only the candidates' rows, and the
+    pages are shared by every session reading the same cache. Rows of removed
+    chunks are left in place until the next full rebuild (replace_all).
+    """
+    
+    def __init__(self, path, dimension: int):
+        self.path = Path(path)
+        self.dimension = dimension
+        self._vectors = None
+    
+    def exists(self) -> bool:
+        return self.path.exists()
+    
+    def open(self):
+        """Map the saved vectors"""
+        self.close()
+        rows = self.path.stat().st_size // (4 * self.dimension)
+        if rows:
+            self._vectors = np.memmap(self.path, dtype='float32', mode='r', shape=(rows, self.dimension))
+        return self
+    
+    def close(self):
+        self._vectors = None
+    
+    def __len__(self) -> int:
+        return 0 if self._vectors is None else len(self._vectors)
+    
+    def __getitem__(self, ids) -> np.ndarray:
+        """Get the vectors of an array of chunk ids, one row each"""
+        return np.asarray(self._vectors[np.asarray(ids, dtype='int64')])
+    
+    def replace_all(self, ids, vectors):
+        """Write a new file holding only these vectors, swapped in atomically"""
+        ids = np.asarray(ids, dtype='int64')
+        matrix = np.zeros((int(ids.max()) + 1 if len(ids) else 0, self.dimension), dtype='float32')
+        matrix[ids] = vectors
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        matrix.tofile(temp_path)
+        os.replace(temp_path, self.path)
+        self.open()
+    
+    def add(self, ids, vectors):
+        """Write vectors into their rows, growing the file to fit the largest id"""
+        ids = np.asarray(ids, dtype='int64')
+        if not len(ids):
+            return
+        rows = max(len(self), int(ids.max()) + 1)
+        self.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'ab') as f:
+            f.truncate(rows * 4 * self.dimension)
+        matrix = np.memmap(self.path, dtype='float32', mode='r+', shape=(rows, self.dimension))
+        matrix[ids] = vectors
+        matrix.flush()
+        del matrix
+        self.open()
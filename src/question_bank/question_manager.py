@@ -33,7 +33,10 @@ class QuestionBankManager:
         generated_questions = []
         
         # Get relevant context for the topic
-        context, sources = self.rag.get_context_for_query(topic, max_chunks=3)
+        context, sources = self.rag.get_context_for_query(topic, max_chunks=3, system=system)
+        if not context:
+            # No chunks classified under this system; search the whole corpus
+            context, sources = self.rag.get_context_for_query(topic, max_chunks=3)
         
         if not context:
             return []
@@ -48,28 +51,43 @@ class QuestionBankManager:
             )
             
             if question_data:
-                # Add to database
-                question_id = self.db.add_question(
-                    topic=topic,
-                    system=system,
-                    difficulty=difficulty,
-                    question_text=question_data['question_text'],
-                    options=question_data['options'],
-                    correct_answer=question_data['correct_answer'],
-                    explanation=question_data['explanation'],
-                    source_document=", ".join(sources),
-                    source_page=None
-                )
-                
-                question_data['question_id'] = question_id
                 generated_questions.append(question_data)
         
-        return generated_questions
+        # Add to database in a single transaction
+        question_ids = self.db.add_questions_bulk([
+            {
+                'topic': topic,
+                'system': system,
+                'difficulty': difficulty,
+                'question_text': question_data['question_text'],
+                'options': question_data['options'],
+                'correct_answer': question_data['correct_answer'],
+                'explanation': question_data['explanation'],
+                'source_document': ", ".join(sources),
+                'source_page': None
+            }
+            for question_data in generated_questions
+        ])
+        
+        # Exact repeats within the batch map to the same stored question; return it once
+        unique_questions = []
+        seen_ids = set()
+        for question_data, question_id in zip(generated_questions, question_ids):
+            if question_id in seen_ids:
+                continue
+            seen_ids.add(question_id)
+            question_data['question_id'] = question_id
+            unique_questions.append(question_data)
+        
+        return unique_questions
     
-    def get_practice_set(self, mode="random", system=None, count=40):
-        """Get a practice set of questions"""
+    def get_practice_set(self, mode="random", system=None, count=40, user_id=None):
+        """Get a practice set of questions
+        
+        If user_id is given, random sets skip questions the user has already answered.
+        """
         if mode == "random":
-            return self.db.get_random_questions(count)
+            return self.db.get_random_questions(count, exclude_user_id=user_id)
         elif mode == "system" and system:
             return self.db.get_questions_by_system(system, limit=count)
         else:
@@ -79,8 +97,8 @@ class QuestionBankManager:
         """Check if answer is correct and record response"""
         is_correct = (selected_answer == correct_answer)
         
-        # Record the response
-        self.db.record_user_response(
+        # Record the response (queued when the database runs a write-behind logger)
+        self.db.log_user_response(
             user_id=user_id,
             question_id=question_id,
             selected_answer=selected_answer,
@@ -0,0 +1,313 @@
+"""
+Storage backends for MedPrepLibrary
+SQLite (the default, one file per database) and PostgreSQL (one server shared by several app nodes)
+
+DatabaseManager and AuthManager write their SQL once, in the SQLite dialect with
+`?` placeholders, and talk to connections through the sqlite3 calls they already
+use (execute, executemany, cursor, fetchone/fetchall, row_factory, rowcount).
+A backend opens those connections for the shared ConnectionPool and supplies
+the few pieces that differ between databases: the schema migrations, how a
+write transaction starts, bulk inserts that report their ids, and full-text search.
+"""
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+from src.utils.migrations import MIGRATIONS, POSTGRES_MIGRATIONS
+
+# Set to a postgresql:// URL to run every app node against one shared database
+DATABASE_URL_ENV = 'MEDPREP_DATABASE_URL'
+
+# PRAGMAs applied once to every SQLite connection
+DEFAULT_PRAGMAS = {
+    # Lets maintenance.py shrink the file in small steps; only takes effect on a
+    # new database (existing files are converted by maintain_database)
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'cache_size': -8000,  # ~8 MB page cache per connection
+}
+
+
+def create_backend(target, **options):
+    """Get the backend for a SQLite file path or a postgresql:// URL (backends pass through)"""
+    if isinstance(target, (SQLiteBackend, PostgresBackend)):
+        return target
+    if str(target).startswith(('postgresql://', 'postgres://')):
+        return PostgresBackend(str(target), **options)
+    return SQLiteBackend(target, **options)
+
+
+def database_target(default_path):
+    """Get the configured database URL, or `default_path` when none is set"""
+    return os.environ.get(DATABASE_URL_ENV) or str(default_path)
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+    migrations = MIGRATIONS
+    serial_primary_key = 'INTEGER PRIMARY KEY AUTOINCREMENT'
+    like_operator = 'LIKE'
+    # IMMEDIATE takes the write lock up front so the busy timeout applies
+    # instead of failing on a read-to-write lock upgrade
+    begin_statement = 'BEGIN IMMEDIATE'
+    # A deferred transaction keeps reading the WAL snapshot of its first
+    # SELECT, without taking the write lock
+    snapshot_statement = 'BEGIN DEFERRED'
+    # Appended to a SELECT that is read and then written back; the write
+    # transaction already excludes other writers
+    row_lock = ''
+    IntegrityError = sqlite3.IntegrityError
+    OperationalError = sqlite3.OperationalError
+    ProgrammingError = sqlite3.ProgrammingError
+    
+    def __init__(self, db_path, timeout=30.0, pragmas=None, cached_statements=256):
+        self.db_path = str(db_path)
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.cached_statements = cached_statements
+    
+    @property
+    def cache_key(self):
+        """Identifies the database for process-wide caches"""
+        return str(Path(self.db_path).resolve())
+    
+    def connect(self):
+        """Open a new connection and apply the per-connection PRAGMAs"""
+        # isolation_level=None leaves transaction control to the caller (BEGIN/COMMIT),
+        # and the statement cache lets repeated queries reuse their prepared statements
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=self.cached_statements
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name}={value}')
+        return conn
+    
+    def lock_schema(self, conn):
+        """Serialize schema changes across processes (BEGIN IMMEDIATE already does)"""
+    
+    def table_exists(self, conn, table):
+        """Check whether a table exists"""
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone() is not None
+    
+    def insert_many(self, conn, table, columns, rows, key, conflict=None):
+        """Insert rows in the caller's write transaction and return their ids in input order
+        
+        conflict: a column with a unique index; rows whose value is already
+        taken are skipped and get None
+        """
+        placeholders = ', '.join('?' for _ in columns)
+        on_conflict = f' ON CONFLICT ({conflict}) DO NOTHING' if conflict else ''
+        sql = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders}){on_conflict} RETURNING {key}'
+        # One prepared statement per row (executemany cannot return rows): each
+        # row reports its own id, so nothing assumes the batch got a contiguous
+        # run of ids (triggers or another table's inserts could break one)
+        ids = []
+        for row in rows:
+            inserted = conn.execute(sql, row).fetchone()
+            ids.append(inserted[0] if inserted else None)
+        return ids
+    
+    def build_search_query(self, query):
+        """Turn free text into an FTS5 query of quoted prefix terms
+        
+        Quoting each word keeps user input from being parsed as FTS5 syntax
+        (AND/OR/NEAR, column filters, stray quotes).
+        """
+        words = re.findall(r'\w+', query or '')
+        return ' '.join(f'"{word}"*' for word in words)
+    
+    # Wiki search: page_id, title, system, snippet, rank (lower is better)
+    search_wiki_sql = '''
+        SELECT w.page_id, w.title, w.system,
+               snippet(wiki_pages_fts, 1, '<mark>', '</mark>', '…', 24),
+               bm25(wiki_pages_fts, 10.0, 1.0) AS rank
+        FROM wiki_pages_fts
+        JOIN wiki_pages w ON w.page_id = wiki_pages_fts.rowid
+        WHERE wiki_pages_fts MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    '''
+
+
+class PostgresBackend:
+    name = 'postgres'
+    migrations = POSTGRES_MIGRATIONS
+    serial_primary_key = 'SERIAL PRIMARY KEY'
+    like_operator = 'ILIKE'
+    begin_statement = 'BEGIN'
+    snapshot_statement = 'BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY'
+    # READ COMMITTED lets two transactions read the same row; the second
+    # waits here until the first commits and then reads its result
+    row_lock = ' FOR UPDATE'
+    
+    def __init__(self, dsn, timeout=30.0, insert_batch_size=500):
+        try:
+            import psycopg2
+            import psycopg2.extensions
+        except ImportError:
+            raise ImportError("The PostgreSQL backend needs psycopg2 (pip install psycopg2-binary)")
+        self._psycopg2 = psycopg2
+        self.IntegrityError = psycopg2.IntegrityError
+        self.OperationalError = psycopg2.OperationalError
+        self.ProgrammingError = psycopg2.ProgrammingError
+        
+        self.dsn = dsn
+        self.timeout = timeout
+        self.insert_batch_size = insert_batch_size
+    
+    @property
+    def cache_key(self):
+        """Identifies the database for process-wide caches"""
+        return self.dsn
+    
+    def connect(self):
+        """Open a new connection wrapped to behave like a sqlite3 connection"""
+        raw = self._psycopg2.connect(self.dsn, connect_timeout=int(self.timeout))
+        # Like SQLite's isolation_level=None: statements autocommit unless the caller BEGINs
+        raw.autocommit = True
+        return PostgresConnection(raw, self._psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+    
+    def lock_schema(self, conn):
+        """Serialize schema changes across app nodes until the transaction ends"""
+        conn.execute("SELECT pg_advisory_xact_lock(hashtext('medprep_schema'))")
+    
+    def table_exists(self, conn, table):
+        """Check whether a table exists"""
+        return conn.execute('SELECT to_regclass(?) IS NOT NULL', (table,)).fetchone()[0]
+    
+    def insert_many(self, conn, table, columns, rows, key, conflict=None):
+        """Insert rows in the caller's write transaction and return their ids in input order
+        
+        conflict: a column with a unique index (its values distinct within
+        rows); rows whose value is already taken are skipped and get None
+        """
+        row_placeholder = '(' + ', '.join('?' for _ in columns) + ')'
+        ids = []
+        for start in range(0, len(rows), self.insert_batch_size):
+            batch = rows[start:start + self.insert_batch_size]
+            values = ', '.join(row_placeholder for _ in batch)
+            params = [value for row in batch for value in row]
+            if conflict is None:
+                cursor = conn.execute(
+                    f'INSERT INTO {table} ({", ".join(columns)}) VALUES {values} RETURNING {key}', params
+                )
+                ids.extend(row[0] for row in cursor.fetchall())
+                continue
+            # Skipped rows return nothing, so match the inserted ones up by their conflict value
+            cursor = conn.execute(
+                f'INSERT INTO {table} ({", ".join(columns)}) VALUES {values} '
+                f'ON CONFLICT ({conflict}) DO NOTHING RETURNING {conflict}, {key}', params
+            )
+            inserted = dict(cursor.fetchall())
+            position = columns.index(conflict)
+            ids.extend(inserted.get(row[position]) for row in batch)
+        return ids
+    
+    def build_search_query(self, query):
+        """Turn free text into a tsquery that ANDs quoted prefix terms"""
+        words = re.findall(r'\w+', query or '')
+        return ' & '.join(f"'{word}':*" for word in words)
+    
+    # Wiki search: page_id, title, system, snippet, rank (lower is better).
+    # Title lexemes carry weight A and content weight B; {D, C, B, A} = {0, 0, 0.1, 1}
+    # keeps the 10:1 title boost of the SQLite bm25 ranking
+    search_wiki_sql = '''
+        SELECT w.page_id, w.title, w.system,
+               ts_headline('simple', w.content, q,
+                           'StartSel=<mark>, StopSel=</mark>, MaxWords=24, MinWords=8, MaxFragments=1, FragmentDelimiter=…'),
+               -ts_rank_cd('{0, 0, 0.1, 1.0}', w.search_vector, q) AS rank
+        FROM wiki_pages w, to_tsquery('simple', ?) AS q
+        WHERE w.search_vector @@ q
+        ORDER BY rank
+        LIMIT ?
+    '''
+
+
+def _to_pyformat(sql):
+    """Rewrite `?` placeholders as psycopg2's `%s`, leaving quoted text alone"""
+    parts = re.split(r"('(?:[^']|'')*')", sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].replace('%', '%%').replace('?', '%s')
+    return ''.join(parts)
+
+
+class PostgresCursor:
+    """The subset of sqlite3.Cursor the database layer uses, over a psycopg2 cursor"""
+    
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.row_factory = None
+    
+    def execute(self, sql, params=None):
+        if params is None:
+            self._cursor.execute(sql)
+        else:
+            self._cursor.execute(_to_pyformat(sql), tuple(params))
+        return self
+    
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(_to_pyformat(sql), [tuple(params) for params in seq_of_params])
+        return self
+    
+    def _make_row(self, row):
+        if row is None or self.row_factory is None:
+            return row
+        return self.row_factory(self, row)
+    
+    def fetchone(self):
+        return self._make_row(self._cursor.fetchone())
+    
+    def fetchall(self):
+        return [self._make_row(row) for row in self._cursor.fetchall()]
+    
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._make_row(row)
+    
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+    
+    @property
+    def description(self):
+        return self._cursor.description
+    
+    def close(self):
+        self._cursor.close()
+
+
+class PostgresConnection:
+    """The subset of sqlite3.Connection the database layer uses, over a psycopg2 connection"""
+    
+    def __init__(self, raw, idle_status):
+        self.raw = raw
+        self._idle_status = idle_status
+    
+    def cursor(self):
+        return PostgresCursor(self.raw.cursor())
+    
+    def execute(self, sql, params=None):
+        return self.cursor().execute(sql, params)
+    
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+    
+    @property
+    def in_transaction(self):
+        return self.raw.info.transaction_status != self._idle_status
+    
+    def rollback(self):
+        # In autocommit mode psycopg2's rollback() is a no-op, so end the explicit BEGIN directly
+        self.raw.cursor().execute('ROLLBACK')
+    
+    def close(self):
+        self.raw.close()
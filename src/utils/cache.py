@@ -0,0 +1,97 @@
+"""
+Cache utility module for MedPrepLibrary
+Size-bounded LRU caches shared by every DatabaseManager in the process
+"""
+import threading
+from collections import OrderedDict
+
+# Shared caches, keyed by (name, database), so every Streamlit session reuses them
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+
+class GenerationalLRUCache:
+    """LRU cache whose entries belong to one generation of the underlying data
+    
+    Readers pass the generation they just read from the database. When it
+    differs from the cache's generation, every entry is dropped before the
+    lookup, so a write in any process invalidates the cache on the next read.
+    """
+    
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._evictions = 0
+    
+    def _sync_generation(self, generation):
+        """Drop all entries if the data has moved to a new generation (caller holds the lock)"""
+        if generation != self._generation:
+            if self._entries:
+                self._invalidations += 1
+                self._entries.clear()
+            self._generation = generation
+    
+    def get(self, key, generation):
+        """Look a key up; returns (found, value)"""
+        with self._lock:
+            self._sync_generation(generation)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return True, self._entries[key]
+            self._misses += 1
+            return False, None
+    
+    def put(self, key, value, generation):
+        """Store a value read at `generation`, evicting the least recently used entries"""
+        with self._lock:
+            if self._generation is not None and generation is not None and generation < self._generation:
+                # A newer generation was seen while this value was loading; it is already stale
+                return
+            self._sync_generation(generation)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._generation = None
+    
+    def get_stats(self):
+        """Get hit, miss and eviction counters"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'generation': self._generation,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': (self._hits / lookups) if lookups > 0 else 0.0,
+                'invalidations': self._invalidations,
+                'evictions': self._evictions
+            }
+
+
+def get_shared_cache(name, database_key, max_entries=512):
+    """Get the process-wide cache for one database, creating it on first use
+    
+    database_key identifies the database, e.g. a backend's cache_key.
+    """
+    key = (name, database_key)
+    with _shared_lock:
+        cache = _shared_caches.get(key)
+        if cache is None:
+            cache = GenerationalLRUCache(max_entries=max_entries)
+            _shared_caches[key] = cache
+        return cache
@@ -0,0 +1,270 @@
+"""
+Columnar export and import for MedPrepLibrary
+Streams the question bank, response log and flashcard progress to Parquet or Arrow IPC files and back
+
+Exports read every table from one snapshot (a single read transaction), so
+the response log and progress never refer to questions or cards missing from
+the export. The app's writers are not blocked meanwhile (on SQLite the
+snapshot holds back WAL checkpoints until the export ends), and memory stays
+at one keyset page. Imports go through the normal insert paths a batch per
+transaction: questions and flashcards are deduplicated by content hash and get
+new ids in the target database, keeping their created_at, and responses and
+progress are remapped onto those ids. User ids are carried over as they are,
+so import into a deployment that shares the users database (or has the same users).
+"""
+import json
+import os
+from pathlib import Path
+
+# Exported tables in import order: key column, then (column, type) pairs
+TABLES = {
+    'questions': ('question_id', [
+        ('question_id', 'int'), ('topic', 'text'), ('system', 'text'), ('difficulty', 'text'),
+        ('question_text', 'text'), ('options', 'text'), ('correct_answer', 'text'),
+        ('explanation', 'text'), ('source_document', 'text'), ('source_page', 'text'),
+        ('created_at', 'timestamp')
+    ]),
+    'flashcards': ('card_id', [
+        ('card_id', 'int'), ('front_text', 'text'), ('back_text', 'text'), ('topic', 'text'),
+        ('system', 'text'), ('source_document', 'text'), ('created_at', 'timestamp')
+    ]),
+    'user_responses': ('response_id', [
+        ('response_id', 'int'), ('user_id', 'int'), ('question_id', 'int'), ('selected_answer', 'text'),
+        ('is_correct', 'int'), ('time_taken', 'int'), ('timestamp', 'timestamp')
+    ]),
+    'flashcard_progress': ('progress_id', [
+        ('progress_id', 'int'), ('user_id', 'int'), ('card_id', 'int'), ('ease_factor', 'float'),
+        ('interval', 'int'), ('repetitions', 'int'), ('next_review_date', 'timestamp'),
+        ('last_reviewed', 'timestamp')
+    ]),
+}
+
+# File extension per format
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def _pyarrow():
+    """Import pyarrow, which only the columnar export/import needs"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Columnar export/import needs pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def _schema(pa, table):
+    types = {'int': pa.int64(), 'float': pa.float64(), 'text': pa.string(), 'timestamp': pa.timestamp('us')}
+    return pa.schema([(name, types[kind]) for name, kind in TABLES[table][1]])
+
+
+def _read_chunks(db, table, key, columns, chunk_rows):
+    """Yield a table's rows in key order, one keyset page at a time"""
+    query = f'SELECT {", ".join(columns)} FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?'
+    after = 0
+    while True:
+        with db.connection() as conn:
+            rows = conn.execute(query, (after, chunk_rows)).fetchall()
+        if rows:
+            yield rows
+        if len(rows) < chunk_rows:
+            return
+        after = rows[-1][0]
+
+
+def _record_batch(pa, schema, rows):
+    """Build a record batch from row tuples in schema order"""
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        if pa.types.is_timestamp(field.type) and any(isinstance(value, str) for value in values):
+            # SQLite keeps timestamps as ISO text; Arrow parses it into real timestamps
+            arrays.append(pa.array(values, pa.string()).cast(field.type))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_tables(db, out_dir, tables=None, fmt='parquet', chunk_rows=50000):
+    """Export tables to one file each in out_dir; returns {table: rows exported}
+    
+    fmt: 'parquet' (zstd-compressed, for analytics and archiving) or 'arrow'
+        (uncompressed Arrow IPC, fastest to write and memory-map)
+    chunk_rows: rows per read and per row group / record batch
+    Each file is written under a temporary name and renamed when complete.
+    All tables are read from the same snapshot.
+    """
+    pa = _pyarrow()
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    
+    counts = {}
+    written = []
+    with db.snapshot():
+        for table in tables or TABLES:
+            key, columns = TABLES[table]
+            schema = _schema(pa, table)
+            path = out_dir / f'{table}{FORMATS[fmt]}'
+            temp_path = path.with_name(path.name + '.tmp')
+            if fmt == 'parquet':
+                writer = pa.parquet.ParquetWriter(str(temp_path), schema, compression='zstd')
+            else:
+                writer = pa.ipc.new_file(str(temp_path), schema)
+            
+            counts[table] = 0
+            try:
+                for rows in _read_chunks(db, table, key, [name for name, _ in columns], chunk_rows):
+                    writer.write_batch(_record_batch(pa, schema, rows))
+                    counts[table] += len(rows)
+            finally:
+                writer.close()
+            written.append((temp_path, path))
+    
+    # Rename only once every table is complete, so out_dir never mixes two snapshots
+    for temp_path, path in written:
+        os.replace(temp_path, path)
+    return counts
+
+
+def _iter_batches(pa, path, batch_rows):
+    """Yield record batches of at most batch_rows from a Parquet or Arrow IPC file"""
+    if path.suffix == FORMATS['parquet']:
+        yield from pa.parquet.ParquetFile(str(path)).iter_batches(batch_size=batch_rows)
+        return
+    with pa.memory_map(str(path)) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            for start in range(0, batch.num_rows, batch_rows):
+                yield batch.slice(start, batch_rows)
+
+
+def _find_export(in_dir, table):
+    """Get the exported file for a table, in either format, or None"""
+    for extension in FORMATS.values():
+        path = Path(in_dir) / f'{table}{extension}'
+        if path.exists():
+            return path
+    return None
+
+
+def _remap(new_ids, old_id):
+    """Get the target id for an exported id, or None when its row was not imported
+    
+    With no questions (or flashcards) file in the export, ids are taken as-is,
+    e.g. when restoring a response log into the database it came from.
+    """
+    if new_ids is None:
+        return old_id
+    return new_ids.get(old_id)
+
+
+def _timestamp(value):
+    """Format a timestamp the way SQLite's CURRENT_TIMESTAMP does (keeping any microseconds), or None"""
+    if value is None:
+        return None
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f' if value.microsecond else '%Y-%m-%d %H:%M:%S')
+
+
+def _insert_new(db, table, key, insert, created_at):
+    """Run insert(), a bulk add returning ids, in one transaction; returns (ids, how many rows it added)
+    
+    Rows added in the transaction get ids above the table's previous maximum
+    and are given their exported created_at; deduplicated rows get the id of a
+    row that was already there and keep their own.
+    """
+    with db.transaction() as conn:
+        before = conn.execute(f'SELECT COALESCE(MAX({key}), 0) FROM {table}').fetchone()[0]
+        ids = insert()
+        added = {}
+        for new_id, timestamp in zip(ids, created_at):
+            if new_id > before:
+                # The first of several identical rows is the one that was inserted
+                added.setdefault(new_id, _timestamp(timestamp))
+        conn.executemany(f'UPDATE {table} SET created_at = ? WHERE {key} = ?',
+                         [(timestamp, new_id) for new_id, timestamp in added.items() if timestamp is not None])
+    return ids, len(added)
+
+
+def import_tables(db, in_dir, batch_rows=5000):
+    """Load an export from in_dir into db; returns {table: rows actually inserted}
+    
+    Every table file is optional. Questions and flashcards that already exist
+    (same content hash) are not duplicated; their responses and progress land
+    on the existing rows. Responses are appended, so import a given response
+    log only once; progress a user already has for a card is kept. Responses
+    and progress for questions or cards missing from the export are skipped.
+    """
+    pa = _pyarrow()
+    question_ids = None
+    card_ids = None
+    counts = {}
+    
+    path = _find_export(in_dir, 'questions')
+    if path:
+        counts['questions'] = 0
+        question_ids = {}
+        for batch in _iter_batches(pa, path, batch_rows):
+            rows = batch.to_pylist()
+            questions = [dict(row, options=json.loads(row['options'])) for row in rows]
+            new_ids, added = _insert_new(db, 'questions', 'question_id', lambda: db.add_questions_bulk(questions),
+                                         [row['created_at'] for row in rows])
+            question_ids.update(zip((row['question_id'] for row in rows), new_ids))
+            counts['questions'] += added
+    
+    path = _find_export(in_dir, 'flashcards')
+    if path:
+        counts['flashcards'] = 0
+        card_ids = {}
+        for batch in _iter_batches(pa, path, batch_rows):
+            rows = batch.to_pylist()
+            new_ids, added = _insert_new(db, 'flashcards', 'card_id', lambda: db.add_flashcards_bulk(rows),
+                                         [row['created_at'] for row in rows])
+            card_ids.update(zip((row['card_id'] for row in rows), new_ids))
+            counts['flashcards'] += added
+    
+    path = _find_export(in_dir, 'user_responses')
+    if path:
+        counts['user_responses'] = 0
+        for batch in _iter_batches(pa, path, batch_rows):
+            rows = [
+                (row['user_id'], question_id, row['selected_answer'], row['is_correct'], row['time_taken'],
+                 _timestamp(row['timestamp']))
+                for row in batch.to_pylist()
+                for question_id in [_remap(question_ids, row['question_id'])]
+                if question_id is not None
+            ]
+            if not rows:
+                continue
+            with db.transaction() as conn:
+                conn.executemany('''
+                    INSERT INTO user_responses (user_id, question_id, selected_answer,
+                                               is_correct, time_taken, timestamp)
+                    VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                ''', rows)
+            counts['user_responses'] += len(rows)
+    
+    path = _find_export(in_dir, 'flashcard_progress')
+    if path:
+        counts['flashcard_progress'] = 0
+        for batch in _iter_batches(pa, path, batch_rows):
+            rows = [
+                (row['user_id'], card_id, row['ease_factor'], row['interval'], row['repetitions'],
+                 row['next_review_date'], row['last_reviewed'])
+                for row in batch.to_pylist()
+                for card_id in [_remap(card_ids, row['card_id'])]
+                if card_id is not None
+            ]
+            if not rows:
+                continue
+            with db.transaction() as conn:
+                cursor = conn.executemany('''
+                    INSERT INTO flashcard_progress
+                    (user_id, card_id, ease_factor, interval, repetitions, next_review_date, last_reviewed)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (user_id, card_id) DO NOTHING
+                ''', rows)
+            # Progress a user already had is kept, so only count the rows that went in
+            counts['flashcard_progress'] += cursor.rowcount
+    
+    return counts
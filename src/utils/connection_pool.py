@@ -0,0 +1,122 @@
+"""
+Connection pool utility for MedPrepLibrary
+Keeps a bounded set of long-lived database connections that threads check out and return
+"""
+import threading
+import time
+import queue
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    def __init__(self, backend, max_size=5, timeout=30.0):
+        # Opens connections and knows the database's error types (see backends.py)
+        self.backend = backend
+        self.max_size = max_size
+        self.timeout = timeout
+        
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        
+        # Sizing metrics
+        self._checkouts = 0
+        self._waits = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._in_use = 0
+        self._peak_in_use = 0
+    
+    def acquire(self):
+        """Check a connection out of the pool, waiting if all are in use"""
+        if self._closed:
+            raise self.backend.ProgrammingError("Connection pool is closed")
+        
+        start = time.perf_counter()
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.max_size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self.backend.connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise self.backend.OperationalError(
+                        f"Timed out after {self.timeout}s waiting for a database connection"
+                    )
+        
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._checkouts += 1
+            if waited > 0.001:
+                self._waits += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+        return conn
+    
+    def release(self, conn):
+        """Return a connection to the pool"""
+        with self._lock:
+            self._in_use -= 1
+        
+        if conn.in_transaction:
+            # Never hand out a connection with a half-finished transaction
+            conn.rollback()
+        
+        if self._closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+    
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+    
+    def get_stats(self):
+        """Get checkout and wait-time statistics for sizing the pool"""
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'open_connections': self._created,
+                'idle_connections': self._idle.qsize(),
+                'in_use': self._in_use,
+                'peak_in_use': self._peak_in_use,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'total_wait_seconds': self._total_wait,
+                'avg_wait_seconds': (self._total_wait / self._checkouts) if self._checkouts > 0 else 0.0,
+                'max_wait_seconds': self._max_wait
+            }
+    
+    def close(self):
+        """Close every idle connection; connections still in use close on release"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
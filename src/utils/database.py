@@ -2,224 +2,344 @@
 Database utility module for MedPrepLibrary
 Handles all database operations for user progress, questions, and flashcards
 """
-import sqlite3
 import json
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from src.utils.backends import create_backend
+from src.utils.connection_pool import ConnectionPool
+from src.utils.cache import get_shared_cache
+from src.utils.records import Question, Flashcard
+from src.utils.dedup import question_hash, flashcard_hash, merge_questions, merge_flashcards
+from src.utils.question_sampler import QuestionSampler
+from src.utils.write_behind import WriteBehindLogger
+from src.utils.migrations import run_migrations, get_schema_version, REBUILD_USER_SYSTEM_STATS
+
 class DatabaseManager:
-    def __init__(self, db_path):
+    def __init__(self, db_path, pool_size=5, write_behind=False, write_behind_options=None,
+                 wiki_cache_size=512):
+        """db_path: a SQLite file path, a postgresql:// URL, or a backend from backends.py"""
         self.db_path = db_path
+        self.backend = create_backend(db_path)
+        # Long-lived connections (for SQLite: WAL, PRAGMAs and statement cache set once per connection)
+        self.pool = ConnectionPool(self.backend, max_size=pool_size)
+        # Connection held by the current thread's open transaction, if any
+        self._local = threading.local()
         self.init_all_tables()
+        self.sampler = QuestionSampler(self)
+        # Decoded wiki reads, shared by every DatabaseManager on this file in the process
+        self.wiki_cache = get_shared_cache('wiki_pages', self.backend.cache_key, max_entries=wiki_cache_size)
+        
+        # Optional background writer for answer/review events (see write_behind.py for durability)
+        self.writer = None
+        if write_behind:
+            self.writer = WriteBehindLogger(self, **(write_behind_options or {})).start()
     
-    def init_all_tables(self):
-        """Initialize all database tables"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        conn.execute('PRAGMA journal_mode=WAL')  # Enable Write-Ahead Logging
-        cursor = conn.cursor()
-        
-        # Questions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS questions (
-                question_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                topic TEXT NOT NULL,
-                system TEXT NOT NULL,
-                difficulty TEXT NOT NULL,
-                question_text TEXT NOT NULL,
-                options TEXT NOT NULL,
-                correct_answer TEXT NOT NULL,
-                explanation TEXT NOT NULL,
-                source_document TEXT NOT NULL,
-                source_page TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # User responses table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_responses (
-                response_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                question_id INTEGER NOT NULL,
-                selected_answer TEXT NOT NULL,
-                is_correct INTEGER NOT NULL,
-                time_taken INTEGER,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (question_id) REFERENCES questions(question_id)
-            )
-        ''')
-        
-        # Flashcards table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS flashcards (
-                card_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                front_text TEXT NOT NULL,
-                back_text TEXT NOT NULL,
-                topic TEXT NOT NULL,
-                system TEXT NOT NULL,
-                source_document TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Flashcard progress table (SM-2 algorithm)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS flashcard_progress (
-                progress_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                card_id INTEGER NOT NULL,
-                ease_factor REAL DEFAULT 2.5,
-                interval INTEGER DEFAULT 1,
-                repetitions INTEGER DEFAULT 0,
-                next_review_date TIMESTAMP,
-                last_reviewed TIMESTAMP,
-                FOREIGN KEY (card_id) REFERENCES flashcards(card_id),
-                UNIQUE(user_id, card_id)
-            )
-        ''')
-        
-        # Wiki pages table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS wiki_pages (
-                page_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT UNIQUE NOT NULL,
-                system TEXT NOT NULL,
-                content TEXT NOT NULL,
-                related_pages TEXT,
-                source_documents TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # User bookmarks table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_bookmarks (
-                bookmark_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                page_id INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (page_id) REFERENCES wiki_pages(page_id),
-                UNIQUE(user_id, page_id)
-            )
-        ''')
+    @contextmanager
+    def connection(self):
+        """Get a pooled connection, reusing the current thread's transaction if one is open"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        
+        with self.pool.connection() as conn:
+            yield conn
+    
+    @contextmanager
+    def transaction(self, conn=None):
+        """Group several operations into one transaction
+        
+        Usage:
+            with db.transaction():
+                db.add_question(...)
+                db.record_user_response(...)
+        
+        Nested calls join the outer transaction; it commits once when the
+        outermost block exits and rolls back if any exception escapes.
+        Pass `conn` to run on a connection the caller already checked out.
+        """
+        current = getattr(self._local, 'conn', None)
+        if current is not None:
+            yield current
+            return
+        
+        if conn is None:
+            with self.pool.connection() as pooled:
+                with self.transaction(conn=pooled) as conn:
+                    yield conn
+            return
+        
+        conn.execute(self.backend.begin_statement)
+        self._local.conn = conn
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            self._local.conn = None
+    
+    @contextmanager
+    def snapshot(self):
+        """Read from one consistent view of the database across several queries
         
-        conn.commit()
-        conn.close()
+        The view is fixed at the first read and writers are not blocked. Calls
+        inside the block on this thread (connection(), nested transactions)
+        use the same view; do not write in it.
+        """
+        current = getattr(self._local, 'conn', None)
+        if current is not None:
+            yield current
+            return
+        
+        with self.pool.connection() as conn:
+            conn.execute(self.backend.snapshot_statement)
+            self._local.conn = conn
+            try:
+                yield conn
+            finally:
+                self._local.conn = None
+                conn.execute('ROLLBACK')
+    
+    def get_pool_stats(self):
+        """Get connection pool checkout counts and wait times"""
+        return self.pool.get_stats()
+    
+    def get_writer_stats(self):
+        """Get write-behind queue depth and commit latency, or None if it is disabled"""
+        return self.writer.get_stats() if self.writer else None
+    
+    def close(self):
+        """Flush queued writes and close all pooled connections"""
+        if self.writer:
+            self.writer.close()
+        self.pool.close()
+    
+    def init_all_tables(self):
+        """Initialize all database tables and bring the schema up to date"""
+        run_migrations(self)
+    
+    def get_schema_version(self):
+        """Get the highest schema migration applied to this database"""
+        with self.connection() as conn:
+            return get_schema_version(conn, self.backend)
     
     # Question Bank Methods
     def add_question(self, topic, system, difficulty, question_text, options, 
                      correct_answer, explanation, source_document, source_page=None):
-        """Add a new question to the database"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO questions (topic, system, difficulty, question_text, options, 
-                                 correct_answer, explanation, source_document, source_page)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (topic, system, difficulty, question_text, json.dumps(options), 
-              correct_answer, explanation, source_document, source_page))
+        """Add a new question to the database
         
-        question_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        An exact duplicate (same system, stem and options after normalization)
+        is not stored again; the existing question's id is returned instead.
+        """
+        content_hash = question_hash(system, question_text, options)
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO questions (topic, system, difficulty, question_text, options, 
+                                     correct_answer, explanation, source_document, source_page,
+                                     content_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (content_hash) DO NOTHING
+                RETURNING question_id
+            ''', (topic, system, difficulty, question_text, json.dumps(options), 
+                  correct_answer, explanation, source_document, source_page, content_hash))
+            
+            row = cursor.fetchone()
+            if row is None:
+                row = conn.execute(
+                    'SELECT question_id FROM questions WHERE content_hash = ?', (content_hash,)
+                ).fetchone()
+            question_id = row[0]
         
         return question_id
     
-    def get_questions_by_system(self, system, limit=None):
-        """Get questions filtered by system"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
+    def add_questions_bulk(self, questions):
+        """Add many questions in one transaction and return their ids in input order
         
-        query = 'SELECT * FROM questions WHERE system = ?'
-        if limit:
-            query += f' LIMIT {limit}'
+        Each item is a dict with the same keys as add_question's arguments.
+        Exact duplicates, of stored questions or of earlier items in the batch,
+        are skipped and get the id of the question they duplicate.
+        """
+        rows = [
+            (q['topic'], q['system'], q['difficulty'], q['question_text'], json.dumps(q['options']),
+             q['correct_answer'], q['explanation'], q['source_document'], q.get('source_page'),
+             question_hash(q['system'], q['question_text'], q['options']))
+            for q in questions
+        ]
+        if not rows:
+            return []
+        
+        with self.transaction() as conn:
+            return self._insert_deduplicated(conn, 'questions', (
+                'topic', 'system', 'difficulty', 'question_text', 'options',
+                'correct_answer', 'explanation', 'source_document', 'source_page', 'content_hash'
+            ), rows, key='question_id')
+    
+    def _insert_deduplicated(self, conn, table, columns, rows, key):
+        """Insert the rows whose content_hash (last column) is new; return every row's id in input order
         
-        cursor.execute(query, (system,))
-        questions = cursor.fetchall()
-        conn.close()
+        The insert skips hashes that are already stored (ON CONFLICT DO
+        NOTHING), so a writer racing to insert the same content waits for it
+        instead of failing the batch; the ids of skipped rows are read after.
+        """
+        first_rows = {}
+        for row in rows:
+            first_rows.setdefault(row[-1], row)
+        unique_rows = list(first_rows.values())
+        new_ids = self.backend.insert_many(conn, table, columns, unique_rows, key=key, conflict='content_hash')
+        ids_by_hash = dict(zip((row[-1] for row in unique_rows), new_ids))
+        
+        existing = [content_hash for content_hash, row_id in ids_by_hash.items() if row_id is None]
+        for start in range(0, len(existing), 500):
+            batch = existing[start:start + 500]
+            placeholders = ', '.join('?' for _ in batch)
+            cursor = conn.execute(
+                f'SELECT content_hash, {key} FROM {table} WHERE content_hash IN ({placeholders})', batch
+            )
+            ids_by_hash.update(cursor.fetchall())
         
-        return self._format_questions(questions)
+        return [ids_by_hash[row[-1]] for row in rows]
     
-    def get_random_questions(self, count=40):
-        """Get random questions for practice"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM questions ORDER BY RANDOM() LIMIT ?', (count,))
-        questions = cursor.fetchall()
-        conn.close()
-        
-        return self._format_questions(questions)
-    
-    def _format_questions(self, questions):
-        """Format question tuples into dictionaries"""
-        formatted = []
-        for q in questions:
-            formatted.append({
-                'question_id': q[0],
-                'topic': q[1],
-                'system': q[2],
-                'difficulty': q[3],
-                'question_text': q[4],
-                'options': json.loads(q[5]),
-                'correct_answer': q[6],
-                'explanation': q[7],
-                'source_document': q[8],
-                'source_page': q[9],
-                'created_at': q[10]
-            })
-        return formatted
+    def merge_duplicate_questions(self, keep_id, duplicate_ids):
+        """Fold duplicate questions (same system) into keep_id, moving their responses over"""
+        with self.transaction() as conn:
+            return merge_questions(conn, keep_id, list(duplicate_ids))
     
-    def record_user_response(self, user_id, question_id, selected_answer, 
-                            is_correct, time_taken=None):
-        """Record a user's response to a question"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO user_responses (user_id, question_id, selected_answer, 
-                                       is_correct, time_taken)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, question_id, selected_answer, int(is_correct), time_taken))
+    def get_questions_by_system(self, system, limit=None):
+        """Get questions filtered by system"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = Question.row_factory
+            
+            query = f'SELECT {Question.columns} FROM questions WHERE system = ? ORDER BY question_id'
+            params = [system]
+            if limit:
+                query += ' LIMIT ?'
+                params.append(limit)
+            
+            cursor.execute(query, params)
+            return cursor.fetchall()
+    
+    def get_questions_page(self, system=None, topic=None, difficulty=None, after_id=0, limit=50):
+        """Get one page of questions in question_id order
         
-        conn.commit()
-        conn.close()
+        Keyset pagination: pass the last question_id of the previous page as
+        after_id. Each page is an index range scan, so its cost does not grow
+        with how far into the bank it is.
+        """
+        query = f'SELECT {Question.columns} FROM questions WHERE question_id > ?'
+        params = [after_id]
+        for column, value in (('system', system), ('topic', topic), ('difficulty', difficulty)):
+            if value is not None:
+                query += f' AND {column} = ?'
+                params.append(value)
+        query += ' ORDER BY question_id LIMIT ?'
+        params.append(limit)
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = Question.row_factory
+            cursor.execute(query, params)
+            return cursor.fetchall()
     
-    def get_user_statistics(self, user_id):
-        """Get comprehensive statistics for a user"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
+    def iter_questions(self, system=None, topic=None, difficulty=None, page_size=200):
+        """Iterate over every matching question, fetching one page at a time"""
+        after_id = 0
+        while True:
+            page = self.get_questions_page(system, topic, difficulty, after_id=after_id, limit=page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            after_id = page[-1].question_id
+    
+    def get_random_questions(self, count=40, system=None, difficulty=None, exclude_user_id=None,
+                             stratify_by=None, weights=None):
+        """Get random questions for practice
         
-        # Total questions answered
-        cursor.execute('SELECT COUNT(*) FROM user_responses WHERE user_id = ?', (user_id,))
-        total_questions = cursor.fetchone()[0]
+        Optionally restricted to a system and/or difficulty, skipping questions
+        exclude_user_id has already answered, and stratified or weighted by
+        system/difficulty (see QuestionSampler.sample).
+        """
+        question_ids = self.sampler.sample(
+            count,
+            system=system,
+            difficulty=difficulty,
+            exclude_user_id=exclude_user_id,
+            stratify_by=stratify_by,
+            weights=weights
+        )
+        if not question_ids:
+            return []
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = Question.row_factory
+            placeholders = ', '.join('?' for _ in question_ids)
+            cursor.execute(
+                f'SELECT {Question.columns} FROM questions WHERE question_id IN ({placeholders})',
+                question_ids
+            )
+            by_id = {question.question_id: question for question in cursor.fetchall()}
         
-        # Correct answers
-        cursor.execute('SELECT COUNT(*) FROM user_responses WHERE user_id = ? AND is_correct = 1', (user_id,))
-        correct_answers = cursor.fetchone()[0]
+        # Keep the sampler's random order
+        return [by_id[qid] for qid in question_ids if qid in by_id]
+    
+    def record_user_response(self, user_id, question_id, selected_answer, 
+                            is_correct, time_taken=None, answered_at=None):
+        """Record a user's response to a question
         
-        # Performance by system
-        cursor.execute('''
-            SELECT q.system, 
-                   COUNT(*) as total,
-                   SUM(ur.is_correct) as correct
-            FROM user_responses ur
-            JOIN questions q ON ur.question_id = q.question_id
-            WHERE ur.user_id = ?
-            GROUP BY q.system
-        ''', (user_id,))
+        answered_at: UTC 'YYYY-MM-DD HH:MM:SS' string; defaults to now
+        """
+        with self.transaction() as conn:
+            conn.execute('''
+                INSERT INTO user_responses (user_id, question_id, selected_answer, 
+                                           is_correct, time_taken, timestamp)
+                VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ''', (user_id, question_id, selected_answer, int(is_correct), time_taken, answered_at))
+    
+    def log_user_response(self, user_id, question_id, selected_answer, 
+                          is_correct, time_taken=None):
+        """Record a response through the write-behind queue when enabled, otherwise immediately"""
+        if self.writer:
+            self.writer.log_response(user_id, question_id, selected_answer, is_correct, time_taken)
+        else:
+            self.record_user_response(user_id, question_id, selected_answer, is_correct, time_taken)
+    
+    def get_user_statistics(self, user_id):
+        """Get comprehensive statistics for a user
         
+        Reads the user_system_stats aggregates, which triggers keep current
+        as responses are recorded.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT system, total, correct
+                FROM user_system_stats
+                WHERE user_id = ?
+            ''', (user_id,))
+            rows = cursor.fetchall()
+        
+        total_questions = 0
+        correct_answers = 0
         system_performance = {}
-        for row in cursor.fetchall():
-            system_performance[row[0]] = {
-                'total': row[1],
-                'correct': row[2],
-                'accuracy': (row[2] / row[1] * 100) if row[1] > 0 else 0
-            }
-        
-        conn.close()
+        for system, total, correct in rows:
+            total_questions += total
+            correct_answers += correct
+            # '' collects responses to deleted questions; they count toward totals only
+            if system and total > 0:
+                system_performance[system] = {
+                    'total': total,
+                    'correct': correct,
+                    'accuracy': correct / total * 100
+                }
         
         return {
             'total_questions': total_questions,
@@ -228,152 +348,277 @@ class DatabaseManager:
             'system_performance': system_performance
         }
     
+    def rebuild_user_statistics(self):
+        """Recompute every user's statistics from the raw response log
+        
+        Use after editing questions or responses outside the app, or if the
+        aggregates are ever suspected to have drifted.
+        """
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM user_system_stats')
+            conn.execute(REBUILD_USER_SYSTEM_STATS)
+            return conn.execute('SELECT COUNT(*) FROM user_system_stats').fetchone()[0]
+    
     # Flashcard Methods
     def add_flashcard(self, front_text, back_text, topic, system, source_document):
-        """Add a new flashcard"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO flashcards (front_text, back_text, topic, system, source_document)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (front_text, back_text, topic, system, source_document))
-        
-        card_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        """Add a new flashcard, or get the id of an existing card with the same front and back"""
+        content_hash = flashcard_hash(front_text, back_text)
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO flashcards (front_text, back_text, topic, system, source_document, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (content_hash) DO NOTHING
+                RETURNING card_id
+            ''', (front_text, back_text, topic, system, source_document, content_hash))
+            
+            row = cursor.fetchone()
+            if row is None:
+                row = conn.execute('SELECT card_id FROM flashcards WHERE content_hash = ?', (content_hash,)).fetchone()
+            card_id = row[0]
         
         return card_id
     
-    def get_due_flashcards(self, user_id, limit=20):
-        """Get flashcards due for review using SM-2 algorithm"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
+    def add_flashcards_bulk(self, flashcards):
+        """Add many flashcards in one transaction and return their ids in input order
         
-        # Get cards that are due or new cards
-        cursor.execute('''
-            SELECT f.*, fp.ease_factor, fp.interval, fp.repetitions, 
-                   fp.next_review_date, fp.last_reviewed
-            FROM flashcards f
-            LEFT JOIN flashcard_progress fp ON f.card_id = fp.card_id AND fp.user_id = ?
-            WHERE fp.next_review_date IS NULL OR fp.next_review_date <= datetime('now')
-            ORDER BY fp.next_review_date ASC
-            LIMIT ?
-        ''', (user_id, limit))
-        
-        cards = cursor.fetchall()
-        conn.close()
-        
-        return self._format_flashcards(cards)
-    
-    def _format_flashcards(self, cards):
-        """Format flashcard tuples into dictionaries"""
-        formatted = []
-        for c in cards:
-            formatted.append({
-                'card_id': c[0],
-                'front_text': c[1],
-                'back_text': c[2],
-                'topic': c[3],
-                'system': c[4],
-                'source_document': c[5],
-                'ease_factor': c[7] if len(c) > 7 else 2.5,
-                'interval': c[8] if len(c) > 8 else 1,
-                'repetitions': c[9] if len(c) > 9 else 0
-            })
-        return formatted
-    
-    def update_flashcard_progress(self, user_id, card_id, quality):
-        """Update flashcard progress using SM-2 algorithm
-        quality: 0-5 (0=complete blackout, 5=perfect response)
+        Each item is a dict with the same keys as add_flashcard's arguments.
+        Exact duplicates get the id of the card they duplicate.
         """
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
-        
-        # Get current progress
-        cursor.execute('''
-            SELECT ease_factor, interval, repetitions
-            FROM flashcard_progress
-            WHERE user_id = ? AND card_id = ?
-        ''', (user_id, card_id))
+        rows = [
+            (c['front_text'], c['back_text'], c['topic'], c['system'], c['source_document'],
+             flashcard_hash(c['front_text'], c['back_text']))
+            for c in flashcards
+        ]
+        if not rows:
+            return []
+        
+        with self.transaction() as conn:
+            return self._insert_deduplicated(conn, 'flashcards', (
+                'front_text', 'back_text', 'topic', 'system', 'source_document', 'content_hash'
+            ), rows, key='card_id')
+    
+    def merge_duplicate_flashcards(self, keep_id, duplicate_ids):
+        """Fold duplicate flashcards into keep_id, moving review progress over"""
+        with self.transaction() as conn:
+            return merge_flashcards(conn, keep_id, list(duplicate_ids))
+    
+    def get_due_flashcards(self, user_id, limit=20, as_of=None):
+        """Get the user's reviewed flashcards that are due, most overdue first
         
-        result = cursor.fetchone()
+        Cards the user has never reviewed are not included; page through them
+        with get_new_flashcards.
+        """
+        as_of = as_of or datetime.now()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = Flashcard.row_factory
+            
+            # Range scan of the user's slice of idx_flashcard_progress_queue
+            cursor.execute(f'''
+                SELECT {Flashcard.columns}
+                FROM flashcard_progress fp
+                JOIN flashcards f ON f.card_id = fp.card_id
+                WHERE fp.user_id = ? AND fp.next_review_date <= ?
+                ORDER BY fp.next_review_date ASC
+                LIMIT ?
+            ''', (user_id, as_of, limit))
+            
+            return cursor.fetchall()
+    
+    def count_due_flashcards(self, user_id, as_of=None):
+        """Count the user's reviewed flashcards that are due"""
+        as_of = as_of or datetime.now()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COUNT(*) FROM flashcard_progress
+                WHERE user_id = ? AND next_review_date <= ?
+            ''', (user_id, as_of))
+            return cursor.fetchone()[0]
+    
+    def get_new_flashcards(self, user_id, limit=20, after_card_id=0, system=None):
+        """Get flashcards the user has never reviewed, in card_id order
         
-        if result:
-            ease_factor, interval, repetitions = result
+        Pass the last card_id returned as after_card_id to fetch the next page.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = Flashcard.row_factory
+            
+            query = f'''
+                SELECT {Flashcard.columns}
+                FROM flashcards f
+                LEFT JOIN flashcard_progress fp ON fp.user_id = ? AND fp.card_id = f.card_id
+                WHERE f.card_id > ? AND fp.card_id IS NULL
+            '''
+            params = [user_id, after_card_id]
+            if system is not None:
+                query += ' AND f.system = ?'
+                params.append(system)
+            query += ' ORDER BY f.card_id LIMIT ?'
+            params.append(limit)
+            
+            cursor.execute(query, params)
+            return cursor.fetchall()
+    
+    def log_flashcard_review(self, user_id, card_id, quality):
+        """Record a review through the write-behind queue when enabled, otherwise immediately"""
+        if self.writer:
+            self.writer.log_review(user_id, card_id, quality)
         else:
-            ease_factor, interval, repetitions = 2.5, 1, 0
-        
-        # SM-2 algorithm
-        if quality >= 3:
-            if repetitions == 0:
-                interval = 1
-            elif repetitions == 1:
-                interval = 6
+            self.update_flashcard_progress(user_id, card_id, quality)
+    
+    def update_flashcard_progress(self, user_id, card_id, quality, reviewed_at=None):
+        """Update flashcard progress using SM-2 algorithm
+        quality: 0-5 (0=complete blackout, 5=perfect response)
+        reviewed_at: when the review happened; defaults to now
+        """
+        reviewed_at = reviewed_at or datetime.now()
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Start from the column defaults on a first review; the row then
+            # exists to be locked, so concurrent reviews of one card apply in turn
+            cursor.execute('''
+                INSERT INTO flashcard_progress (user_id, card_id) VALUES (?, ?)
+                ON CONFLICT (user_id, card_id) DO NOTHING
+            ''', (user_id, card_id))
+            
+            # Get current progress
+            cursor.execute(f'''
+                SELECT ease_factor, interval, repetitions
+                FROM flashcard_progress
+                WHERE user_id = ? AND card_id = ?{self.backend.row_lock}
+            ''', (user_id, card_id))
+            
+            ease_factor, interval, repetitions = cursor.fetchone()
+            
+            # SM-2 algorithm
+            if quality >= 3:
+                if repetitions == 0:
+                    interval = 1
+                elif repetitions == 1:
+                    interval = 6
+                else:
+                    interval = int(interval * ease_factor)
+                repetitions += 1
             else:
-                interval = int(interval * ease_factor)
-            repetitions += 1
-        else:
-            repetitions = 0
-            interval = 1
-        
-        ease_factor = ease_factor + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
-        ease_factor = max(1.3, ease_factor)
-        
-        next_review_date = datetime.now() + timedelta(days=interval)
-        
-        # Update or insert progress
-        cursor.execute('''
-            INSERT OR REPLACE INTO flashcard_progress 
-            (user_id, card_id, ease_factor, interval, repetitions, next_review_date, last_reviewed)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, card_id, ease_factor, interval, repetitions, next_review_date, datetime.now()))
-        
-        conn.commit()
-        conn.close()
+                repetitions = 0
+                interval = 1
+            
+            ease_factor = ease_factor + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+            ease_factor = max(1.3, ease_factor)
+            
+            next_review_date = reviewed_at + timedelta(days=interval)
+            
+            cursor.execute('''
+                UPDATE flashcard_progress
+                SET ease_factor = ?, interval = ?, repetitions = ?, next_review_date = ?, last_reviewed = ?
+                WHERE user_id = ? AND card_id = ?
+            ''', (ease_factor, interval, repetitions, next_review_date, reviewed_at, user_id, card_id))
     
     # Wiki Methods
     def add_wiki_page(self, title, system, content, related_pages=None, source_documents=None):
-        """Add a new wiki page"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
-        
-        try:
+        """Add a new wiki page, or update the content of an existing page with the same title"""
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
             cursor.execute('''
                 INSERT INTO wiki_pages (title, system, content, related_pages, source_documents)
                 VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(title) DO UPDATE SET
+                    content = excluded.content,
+                    related_pages = excluded.related_pages,
+                    source_documents = excluded.source_documents,
+                    updated_at = ?
+                RETURNING page_id
             ''', (title, system, content, 
-                  json.dumps(related_pages) if related_pages else None,
-                  json.dumps(source_documents) if source_documents else None))
-            
-            page_id = cursor.lastrowid
-            conn.commit()
-            return page_id
-        except sqlite3.IntegrityError:
-            # Page already exists, update it
-            cursor.execute('''
-                UPDATE wiki_pages 
-                SET content = ?, related_pages = ?, source_documents = ?, updated_at = ?
-                WHERE title = ?
-            ''', (content, 
                   json.dumps(related_pages) if related_pages else None,
                   json.dumps(source_documents) if source_documents else None,
-                  datetime.now(), title))
-            conn.commit()
+                  datetime.now()))
             
-            cursor.execute('SELECT page_id FROM wiki_pages WHERE title = ?', (title,))
             return cursor.fetchone()[0]
-        finally:
-            conn.close()
+    
+    def upsert_wiki_pages_bulk(self, pages):
+        """Insert or update many wiki pages in one transaction
+        
+        Each item is a dict with the same keys as add_wiki_page's arguments.
+        Existing titles are updated the same way add_wiki_page updates them.
+        Returns the page ids in input order.
+        """
+        rows = [
+            (p['title'], p['system'], p['content'],
+             json.dumps(p['related_pages']) if p.get('related_pages') else None,
+             json.dumps(p['source_documents']) if p.get('source_documents') else None,
+             datetime.now())
+            for p in pages
+        ]
+        if not rows:
+            return []
+        
+        with self.transaction() as conn:
+            conn.executemany('''
+                INSERT INTO wiki_pages (title, system, content, related_pages, source_documents)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(title) DO UPDATE SET
+                    content = excluded.content,
+                    related_pages = excluded.related_pages,
+                    source_documents = excluded.source_documents,
+                    updated_at = ?
+            ''', rows)
+            
+            # Look the ids up by title, since updated rows keep their original id
+            titles = list({row[0] for row in rows})
+            ids_by_title = {}
+            for start in range(0, len(titles), 500):
+                batch = titles[start:start + 500]
+                placeholders = ', '.join('?' for _ in batch)
+                cursor = conn.execute(
+                    f'SELECT title, page_id FROM wiki_pages WHERE title IN ({placeholders})', batch
+                )
+                ids_by_title.update(cursor.fetchall())
+        
+        return [ids_by_title[row[0]] for row in rows]
+    
+    def _wiki_generation(self, conn):
+        """Current wiki_pages generation; triggers bump it on every page write"""
+        row = conn.execute("SELECT generation FROM cache_generations WHERE name = 'wiki_pages'").fetchone()
+        return row[0] if row else None
+    
+    def _cached_wiki_read(self, key, loader):
+        """Serve a wiki read from the shared cache, loading and caching it on a miss
+        
+        Cached values are shared between callers and must be treated as read-only.
+        """
+        with self.connection() as conn:
+            # Read the generation before the data so a cached value is never older than its tag
+            generation = self._wiki_generation(conn)
+            found, value = self.wiki_cache.get(key, generation)
+            if found:
+                return value
+            value = loader(conn)
+        
+        self.wiki_cache.put(key, value, generation)
+        return value
+    
+    def get_wiki_cache_stats(self):
+        """Get wiki cache hit, miss and invalidation counters"""
+        return self.wiki_cache.get_stats()
     
     def get_wiki_page(self, title):
         """Get a wiki page by title"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        return self._cached_wiki_read(('page', title), lambda conn: self._load_wiki_page(conn, title))
+    
+    def _load_wiki_page(self, conn, title):
+        """Read and decode a wiki page from the database"""
         cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM wiki_pages WHERE title = ?', (title,))
+        cursor.execute('''
+            SELECT page_id, title, system, content, related_pages, source_documents, created_at, updated_at
+            FROM wiki_pages WHERE title = ?
+        ''', (title,))
         page = cursor.fetchone()
-        conn.close()
         
         if page:
             return {
@@ -388,31 +633,55 @@ class DatabaseManager:
             }
         return None
     
-    def search_wiki_pages(self, query):
-        """Search wiki pages by title or content"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
+    def search_wiki_pages(self, query, limit=50):
+        """Full-text search over wiki pages, best matches first
         
-        cursor.execute('''
-            SELECT page_id, title, system 
-            FROM wiki_pages 
-            WHERE title LIKE ? OR content LIKE ?
-            LIMIT 50
-        ''', (f'%{query}%', f'%{query}%'))
+        Every word in the query must match, and each word also matches as a
+        prefix ("cardio" finds "cardiomyopathy"). Title hits rank above body hits.
+        Each result carries a highlighted snippet of the matching content.
+        """
+        match_query = self.backend.build_search_query(query)
+        if not match_query:
+            return []
         
-        results = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(self.backend.search_wiki_sql, (match_query, limit))
+            
+            results = cursor.fetchall()
+        
+        return [
+            {'page_id': r[0], 'title': r[1], 'system': r[2], 'snippet': r[3], 'rank': r[4]}
+            for r in results
+        ]
+    
+    def search_wiki_pages_like(self, query, limit=50):
+        """Search wiki pages by title or content substring (unranked full scan)"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            like = self.backend.like_operator
+            cursor.execute(f'''
+                SELECT page_id, title, system 
+                FROM wiki_pages 
+                WHERE title {like} ? OR content {like} ?
+                LIMIT ?
+            ''', (f'%{query}%', f'%{query}%', limit))
+            
+            results = cursor.fetchall()
         
         return [{'page_id': r[0], 'title': r[1], 'system': r[2]} for r in results]
     
     def get_all_wiki_pages_by_system(self):
         """Get all wiki pages organized by system"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        return self._cached_wiki_read(('by_system',), self._load_wiki_pages_by_system)
+    
+    def _load_wiki_pages_by_system(self, conn):
+        """Read the wiki page index from the database, grouped by system"""
         cursor = conn.cursor()
-        
         cursor.execute('SELECT page_id, title, system FROM wiki_pages ORDER BY system, title')
         pages = cursor.fetchall()
-        conn.close()
         
         # Organize by system
         by_system = {}
@@ -423,3 +692,52 @@ class DatabaseManager:
             by_system[system].append({'page_id': page[0], 'title': page[1]})
         
         return by_system
+    
+    def get_wiki_system_counts(self):
+        """Get {system: page count} for every system that has wiki pages"""
+        return self._cached_wiki_read(('system_counts',), self._load_wiki_system_counts)
+    
+    def _load_wiki_system_counts(self, conn):
+        """Count wiki pages per system from the database"""
+        cursor = conn.execute('SELECT system, COUNT(*) FROM wiki_pages GROUP BY system ORDER BY system')
+        return dict(cursor.fetchall())
+    
+    def get_wiki_pages_page(self, system=None, after=None, limit=100):
+        """Get one page of the wiki index ({page_id, title, system}) in (system, title) order
+        
+        Keyset pagination: pass the (system, title) of the last page returned
+        as `after`. Each page is a range scan of idx_wiki_pages_system_title.
+        """
+        key = ('index_page', system, tuple(after) if after else None, limit)
+        return self._cached_wiki_read(
+            key, lambda conn: self._load_wiki_pages_page(conn, system, after, limit)
+        )
+    
+    def _load_wiki_pages_page(self, conn, system, after, limit):
+        """Read one page of the wiki index from the database"""
+        query = 'SELECT page_id, title, system FROM wiki_pages'
+        params = []
+        if system is not None:
+            query += ' WHERE system = ?'
+            params.append(system)
+            if after:
+                query += ' AND title > ?'
+                params.append(after[1])
+        elif after:
+            query += ' WHERE (system, title) > (?, ?)'
+            params.extend(after)
+        query += ' ORDER BY system, title LIMIT ?'
+        params.append(limit)
+        
+        cursor = conn.execute(query, params)
+        return [{'page_id': r[0], 'title': r[1], 'system': r[2]} for r in cursor.fetchall()]
+    
+    def iter_wiki_pages(self, system=None, page_size=200):
+        """Iterate over the wiki index in (system, title) order, fetching one page at a time"""
+        after = None
+        while True:
+            page = self.get_wiki_pages_page(system, after=after, limit=page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            after = (page[-1]['system'], page[-1]['title'])
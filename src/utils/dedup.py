@@ -0,0 +1,137 @@
+"""
+Content deduplication for MedPrepLibrary
+Normalized content hashes for questions and flashcards, and merging duplicate rows
+"""
+import hashlib
+import json
+import re
+
+
+def _normalize(text):
+    """Lowercase and collapse whitespace so trivial formatting differences hash alike"""
+    return re.sub(r'\s+', ' ', str(text or '')).strip().lower()
+
+
+def _digest(parts):
+    return hashlib.sha256('\x1f'.join(_normalize(part) for part in parts).encode()).hexdigest()
+
+
+def question_hash(system, question_text, options):
+    """Hash a question's system, stem and options (in option-letter order)
+    
+    The system is part of the key so merging duplicates never moves responses
+    between the per-system statistics.
+    """
+    if isinstance(options, str):
+        options = json.loads(options)
+    option_parts = [f'{key} {options[key]}' for key in sorted(options)] if isinstance(options, dict) else list(options)
+    return _digest([system, question_text] + option_parts)
+
+
+def flashcard_hash(front_text, back_text):
+    """Hash a flashcard's front and back"""
+    return _digest([front_text, back_text])
+
+
+def merge_questions(conn, keep_id, duplicate_ids):
+    """Fold duplicate questions into keep_id: their responses move over, then the rows are deleted
+    
+    Runs on the caller's connection inside its write transaction. Duplicates
+    must share keep_id's system so the response aggregates stay correct.
+    """
+    duplicate_ids = [qid for qid in duplicate_ids if qid != keep_id]
+    if not duplicate_ids:
+        return 0
+    placeholders = ', '.join('?' for _ in duplicate_ids)
+    conn.execute(
+        f'UPDATE user_responses SET question_id = ? WHERE question_id IN ({placeholders})',
+        [keep_id] + duplicate_ids
+    )
+    conn.execute(f'DELETE FROM questions WHERE question_id IN ({placeholders})', duplicate_ids)
+    return len(duplicate_ids)
+
+
+def merge_flashcards(conn, keep_id, duplicate_ids):
+    """Fold duplicate flashcards into keep_id, keeping each user's existing progress on keep_id
+    
+    Runs on the caller's connection inside its write transaction.
+    """
+    duplicate_ids = [card_id for card_id in duplicate_ids if card_id != keep_id]
+    for card_id in duplicate_ids:
+        # A user can hold one progress row per card: the one already on keep_id wins
+        conn.execute('''
+            DELETE FROM flashcard_progress
+            WHERE card_id = ? AND user_id IN (SELECT user_id FROM flashcard_progress WHERE card_id = ?)
+        ''', (card_id, keep_id))
+        conn.execute('UPDATE flashcard_progress SET card_id = ? WHERE card_id = ?', (keep_id, card_id))
+    if duplicate_ids:
+        placeholders = ', '.join('?' for _ in duplicate_ids)
+        conn.execute(f'DELETE FROM flashcards WHERE card_id IN ({placeholders})', duplicate_ids)
+    return len(duplicate_ids)
+
+
+def backfill_question_hashes(conn, batch_size):
+    """Migration backfill: hash unhashed questions
+    
+    A question that duplicates an already hashed one keeps a NULL hash and
+    records which question it duplicates in duplicate_of; nothing is merged
+    or deleted here (see merge_exact_duplicates).
+    """
+    rows = conn.execute('''
+        SELECT question_id, system, question_text, options FROM questions
+        WHERE content_hash IS NULL AND duplicate_of IS NULL ORDER BY question_id LIMIT ?
+    ''', (batch_size,)).fetchall()
+    for question_id, system, question_text, options in rows:
+        digest = question_hash(system, question_text, options)
+        existing = conn.execute('SELECT question_id FROM questions WHERE content_hash = ?', (digest,)).fetchone()
+        if existing:
+            conn.execute('UPDATE questions SET duplicate_of = ? WHERE question_id = ?', (existing[0], question_id))
+        else:
+            conn.execute('UPDATE questions SET content_hash = ? WHERE question_id = ?', (digest, question_id))
+    return len(rows)
+
+
+def backfill_flashcard_hashes(conn, batch_size):
+    """Migration backfill: hash unhashed flashcards, recording duplicates in duplicate_of"""
+    rows = conn.execute('''
+        SELECT card_id, front_text, back_text FROM flashcards
+        WHERE content_hash IS NULL AND duplicate_of IS NULL ORDER BY card_id LIMIT ?
+    ''', (batch_size,)).fetchall()
+    for card_id, front_text, back_text in rows:
+        digest = flashcard_hash(front_text, back_text)
+        existing = conn.execute('SELECT card_id FROM flashcards WHERE content_hash = ?', (digest,)).fetchone()
+        if existing:
+            conn.execute('UPDATE flashcards SET duplicate_of = ? WHERE card_id = ?', (existing[0], card_id))
+        else:
+            conn.execute('UPDATE flashcards SET content_hash = ? WHERE card_id = ?', (digest, card_id))
+    return len(rows)
+
+
+def backfill_content_hashes(conn, batch_size):
+    """Migration backfill covering both tables"""
+    return backfill_question_hashes(conn, batch_size) or backfill_flashcard_hashes(conn, batch_size)
+
+
+def find_exact_duplicates(db, kind='questions'):
+    """Group the rows the backfill found to duplicate a hashed row: [(keep_id, [duplicate_ids])]"""
+    table, key = {'questions': ('questions', 'question_id'), 'flashcards': ('flashcards', 'card_id')}[kind]
+    with db.connection() as conn:
+        rows = conn.execute(f'''
+            SELECT d.duplicate_of, d.{key} FROM {table} d
+            JOIN {table} k ON k.{key} = d.duplicate_of
+            ORDER BY d.duplicate_of, d.{key}
+        ''').fetchall()
+    groups = {}
+    for keep_id, duplicate_id in rows:
+        groups.setdefault(keep_id, []).append(duplicate_id)
+    return list(groups.items())
+
+
+def merge_exact_duplicates(db, kind='questions', dry_run=False):
+    """Fold each group found by find_exact_duplicates into its kept row (unless dry_run)"""
+    groups = find_exact_duplicates(db, kind)
+    if not dry_run:
+        merge = db.merge_duplicate_questions if kind == 'questions' else db.merge_duplicate_flashcards
+        for keep_id, duplicate_ids in groups:
+            merge(keep_id, duplicate_ids)
+    return groups
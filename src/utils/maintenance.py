@@ -0,0 +1,140 @@
+"""
+Database maintenance for MedPrepLibrary
+Refreshes planner statistics, checkpoints the WAL and returns free pages to the filesystem
+
+By default every step is safe to run while the app is serving. Statistics
+refreshes and the PASSIVE WAL checkpoint never block readers or writers, and the
+incremental vacuum takes the write lock in short slices of `vacuum_step` pages.
+Two options are for when the app is stopped:
+- truncate_wal: checkpoint with TRUNCATE, which waits on writers (up to
+  `busy_timeout_ms`) to reset the WAL file to zero bytes
+- convert_incremental: rewrite the whole file once with VACUUM, blocking writers
+  while it runs
+
+Databases created before auto_vacuum=INCREMENTAL became a default PRAGMA keep
+auto_vacuum=NONE, and incremental vacuum reclaims nothing from them until they
+have been converted once with convert_incremental (maintain_db.py --convert).
+"""
+import os
+import time
+
+from src.utils.backends import create_backend
+
+
+def maintain_database(target, analyze=False, convert_incremental=False, truncate_wal=False,
+                      vacuum_step=1000, max_vacuum_pages=None, busy_timeout_ms=2000):
+    """Run maintenance on one database and report its size before and after
+    
+    target: a SQLite file path, a postgresql:// URL, or a backend
+    analyze: run a full ANALYZE instead of the cheaper PRAGMA optimize (SQLite;
+        PostgreSQL always runs VACUUM (ANALYZE))
+    convert_incremental: switch an older SQLite file to auto_vacuum=INCREMENTAL
+        (one full VACUUM) so later runs can shrink it in small steps
+    truncate_wal: also reset the WAL file with a TRUNCATE checkpoint (SQLite;
+        blocks writers, so only with the app stopped)
+    vacuum_step: free pages released per incremental vacuum transaction
+    max_vacuum_pages: stop after releasing this many pages (None: all of them)
+    """
+    backend = create_backend(target)
+    conn = backend.connect()
+    try:
+        if backend.name == 'postgres':
+            return _maintain_postgres(backend, conn)
+        return _maintain_sqlite(backend, conn, analyze, convert_incremental, truncate_wal, vacuum_step,
+                                max_vacuum_pages, busy_timeout_ms)
+    finally:
+        conn.close()
+
+
+def _sqlite_stats(backend, conn):
+    """Get file sizes and free-page fragmentation for a SQLite database"""
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    freelist_count = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    wal_path = backend.db_path + '-wal'
+    return {
+        'file_bytes': os.path.getsize(backend.db_path),
+        'wal_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist_count,
+        'free_percent': (freelist_count / page_count * 100) if page_count > 0 else 0.0,
+        'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(
+            conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        )
+    }
+
+
+def _maintain_sqlite(backend, conn, analyze, convert_incremental, truncate_wal, vacuum_step,
+                     max_vacuum_pages, busy_timeout_ms):
+    """Maintenance steps for a SQLite file"""
+    start = time.perf_counter()
+    report = {'database': backend.db_path, 'before': _sqlite_stats(backend, conn)}
+    
+    # Planner statistics: optimize only re-analyzes tables whose row counts have
+    # drifted, with a bounded sample per index; ANALYZE rescans everything
+    if analyze:
+        conn.execute('ANALYZE')
+    else:
+        conn.execute('PRAGMA analysis_limit=1000')
+        conn.execute('PRAGMA optimize')
+    
+    if convert_incremental and report['before']['auto_vacuum'] != 'incremental':
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+        report['converted'] = True
+    
+    # Release free pages a slice at a time so writers only wait for one small transaction
+    vacuumed = 0
+    if _sqlite_stats(backend, conn)['auto_vacuum'] == 'incremental':
+        while max_vacuum_pages is None or vacuumed < max_vacuum_pages:
+            free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if free_pages == 0:
+                break
+            step = min(vacuum_step, free_pages)
+            if max_vacuum_pages is not None:
+                step = min(step, max_vacuum_pages - vacuumed)
+            # executescript steps the pragma to completion; execute() would free a single page
+            conn.executescript(f'PRAGMA incremental_vacuum({step})')
+            vacuumed += free_pages - conn.execute('PRAGMA freelist_count').fetchone()[0]
+    report['vacuumed_pages'] = vacuumed
+    
+    # Copy as much of the WAL back into the database as readers allow, without waiting
+    mode = 'PASSIVE'
+    busy, wal_frames, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+    if truncate_wal:
+        # Offline only: TRUNCATE waits for writers, giving up after the busy timeout
+        mode = 'TRUNCATE'
+        conn.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        busy, wal_frames, checkpointed = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+    report['checkpoint'] = {'mode': mode, 'truncated': truncate_wal and busy == 0,
+                            'wal_frames': wal_frames, 'checkpointed_frames': checkpointed}
+    
+    report['after'] = _sqlite_stats(backend, conn)
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+def _postgres_stats(conn):
+    """Get database size and dead-row bloat for a PostgreSQL database"""
+    size = conn.execute('SELECT pg_database_size(current_database())').fetchone()[0]
+    live, dead = conn.execute(
+        'SELECT COALESCE(SUM(n_live_tup), 0), COALESCE(SUM(n_dead_tup), 0) FROM pg_stat_user_tables'
+    ).fetchone()
+    total = live + dead
+    return {
+        'database_bytes': size,
+        'live_rows': live,
+        'dead_rows': dead,
+        'dead_percent': (dead / total * 100) if total > 0 else 0.0
+    }
+
+
+def _maintain_postgres(backend, conn):
+    """Maintenance steps for a PostgreSQL database (plain VACUUM never blocks reads or writes)"""
+    start = time.perf_counter()
+    report = {'database': backend.dsn, 'before': _postgres_stats(conn)}
+    conn.execute('VACUUM (ANALYZE)')
+    report['after'] = _postgres_stats(conn)
+    report['seconds'] = time.perf_counter() - start
+    return report
@@ -0,0 +1,629 @@
+"""
+Schema migrations for MedPrepLibrary
+Ordered, versioned schema changes applied by DatabaseManager at startup
+"""
+from src.utils.dedup import backfill_content_hashes
+
+class Migration:
+    def __init__(self, version, description, statements, backfill=None):
+        self.version = version
+        self.description = description
+        # SQL run in a single transaction when the migration is applied
+        self.statements = statements
+        # Optional callable(conn, batch_size) -> rows changed, run in short
+        # transactions until it returns 0 so a large table never blocks writers for long
+        self.backfill = backfill
+
+
+def backfill_in_batches(table, set_clause, where_clause, key='rowid'):
+    """Build a backfill step that updates rows matching `where_clause` a batch at a time
+    
+    The WHERE clause must stop matching a row once it has been updated,
+    so an interrupted backfill resumes where it left off.
+    """
+    def backfill(conn, batch_size):
+        cursor = conn.execute(f'''
+            UPDATE {table} SET {set_clause}
+            WHERE {key} IN (SELECT {key} FROM {table} WHERE {where_clause} LIMIT ?)
+        ''', (batch_size,))
+        return cursor.rowcount
+    return backfill
+
+
+# Recomputes user_system_stats from the raw response log
+REBUILD_USER_SYSTEM_STATS = '''
+    INSERT INTO user_system_stats (user_id, system, total, correct)
+    SELECT ur.user_id, COALESCE(q.system, ''), COUNT(*), SUM(ur.is_correct)
+    FROM user_responses ur
+    LEFT JOIN questions q ON ur.question_id = q.question_id
+    GROUP BY ur.user_id, COALESCE(q.system, '')
+'''
+
+
+MIGRATIONS = [
+    Migration(1, "Base tables", [
+        # Questions table
+        '''
+        CREATE TABLE IF NOT EXISTS questions (
+            question_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT NOT NULL,
+            system TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            question_text TEXT NOT NULL,
+            options TEXT NOT NULL,
+            correct_answer TEXT NOT NULL,
+            explanation TEXT NOT NULL,
+            source_document TEXT NOT NULL,
+            source_page TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # User responses table
+        '''
+        CREATE TABLE IF NOT EXISTS user_responses (
+            response_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            selected_answer TEXT NOT NULL,
+            is_correct INTEGER NOT NULL,
+            time_taken INTEGER,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (question_id) REFERENCES questions(question_id)
+        )
+        ''',
+        # Flashcards table
+        '''
+        CREATE TABLE IF NOT EXISTS flashcards (
+            card_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            front_text TEXT NOT NULL,
+            back_text TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            system TEXT NOT NULL,
+            source_document TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Flashcard progress table (SM-2 algorithm)
+        '''
+        CREATE TABLE IF NOT EXISTS flashcard_progress (
+            progress_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            card_id INTEGER NOT NULL,
+            ease_factor REAL DEFAULT 2.5,
+            interval INTEGER DEFAULT 1,
+            repetitions INTEGER DEFAULT 0,
+            next_review_date TIMESTAMP,
+            last_reviewed TIMESTAMP,
+            FOREIGN KEY (card_id) REFERENCES flashcards(card_id),
+            UNIQUE(user_id, card_id)
+        )
+        ''',
+        # Wiki pages table
+        '''
+        CREATE TABLE IF NOT EXISTS wiki_pages (
+            page_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT UNIQUE NOT NULL,
+            system TEXT NOT NULL,
+            content TEXT NOT NULL,
+            related_pages TEXT,
+            source_documents TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # User bookmarks table
+        '''
+        CREATE TABLE IF NOT EXISTS user_bookmarks (
+            bookmark_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            page_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (page_id) REFERENCES wiki_pages(page_id),
+            UNIQUE(user_id, page_id)
+        )
+        '''
+    ]),
+    Migration(2, "Indexes for per-user stats, system filters and due cards", [
+        # Covers both per-user COUNTs and the join to questions without touching the table
+        'CREATE INDEX IF NOT EXISTS idx_user_responses_user ON user_responses(user_id, is_correct, question_id)',
+        'CREATE INDEX IF NOT EXISTS idx_questions_system ON questions(system)',
+        'CREATE INDEX IF NOT EXISTS idx_flashcards_system ON flashcards(system)',
+        'CREATE INDEX IF NOT EXISTS idx_flashcard_progress_due ON flashcard_progress(user_id, next_review_date)',
+        'CREATE INDEX IF NOT EXISTS idx_wiki_pages_system_title ON wiki_pages(system, title)'
+    ]),
+    Migration(3, "FTS5 full-text index over wiki pages", [
+        # External-content index: stores only the inverted index, text stays in wiki_pages.
+        # Prefix indexes keep short "type-ahead" prefix queries cheap.
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS wiki_pages_fts USING fts5(
+            title, content,
+            content='wiki_pages', content_rowid='page_id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS wiki_pages_fts_insert AFTER INSERT ON wiki_pages BEGIN
+            INSERT INTO wiki_pages_fts(rowid, title, content)
+            VALUES (new.page_id, new.title, new.content);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS wiki_pages_fts_delete AFTER DELETE ON wiki_pages BEGIN
+            INSERT INTO wiki_pages_fts(wiki_pages_fts, rowid, title, content)
+            VALUES ('delete', old.page_id, old.title, old.content);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS wiki_pages_fts_update AFTER UPDATE OF title, content ON wiki_pages BEGIN
+            INSERT INTO wiki_pages_fts(wiki_pages_fts, rowid, title, content)
+            VALUES ('delete', old.page_id, old.title, old.content);
+            INSERT INTO wiki_pages_fts(rowid, title, content)
+            VALUES (new.page_id, new.title, new.content);
+        END
+        ''',
+        # Index the pages that already exist
+        "INSERT INTO wiki_pages_fts(wiki_pages_fts) VALUES ('rebuild')"
+    ]),
+    Migration(4, "Per-user, per-system response aggregates", [
+        # system is '' for responses whose question no longer exists, so totals
+        # still match a COUNT(*) over user_responses
+        '''
+        CREATE TABLE IF NOT EXISTS user_system_stats (
+            user_id INTEGER NOT NULL,
+            system TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, system)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS user_responses_stats_insert AFTER INSERT ON user_responses BEGIN
+            INSERT INTO user_system_stats (user_id, system, total, correct)
+            SELECT new.user_id,
+                   COALESCE((SELECT system FROM questions WHERE question_id = new.question_id), ''),
+                   1, new.is_correct
+            WHERE true
+            ON CONFLICT (user_id, system) DO UPDATE SET
+                total = total + 1,
+                correct = correct + excluded.correct;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS user_responses_stats_delete AFTER DELETE ON user_responses BEGIN
+            UPDATE user_system_stats
+            SET total = total - 1, correct = correct - old.is_correct
+            WHERE user_id = old.user_id
+              AND system = COALESCE((SELECT system FROM questions WHERE question_id = old.question_id), '');
+        END
+        ''',
+        REBUILD_USER_SYSTEM_STATS
+    ]),
+    Migration(5, "Dense per-stratum sample slots for random question sampling", [
+        # Every question gets a slot 1..n within its (system, difficulty) stratum, so a
+        # uniform draw is a few index seeks on random slot numbers whatever the id gaps
+        'ALTER TABLE questions ADD COLUMN sample_slot INTEGER',
+        '''
+        CREATE TABLE IF NOT EXISTS question_strata (
+            system TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            question_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (system, difficulty)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        INSERT INTO question_strata (system, difficulty, question_count)
+        SELECT system, difficulty, COUNT(*) FROM questions GROUP BY system, difficulty
+        ''',
+        '''
+        UPDATE questions SET sample_slot = ranked.slot
+        FROM (
+            SELECT question_id,
+                   ROW_NUMBER() OVER (PARTITION BY system, difficulty ORDER BY question_id) AS slot
+            FROM questions
+        ) AS ranked
+        WHERE questions.question_id = ranked.question_id
+        ''',
+        # (system, difficulty, sample_slot) also serves the old system-only lookups
+        'CREATE INDEX IF NOT EXISTS idx_questions_sampling ON questions(system, difficulty, sample_slot)',
+        'DROP INDEX IF EXISTS idx_questions_system',
+        # New question: takes the next slot in its stratum
+        '''
+        CREATE TRIGGER IF NOT EXISTS questions_slot_insert AFTER INSERT ON questions BEGIN
+            INSERT INTO question_strata (system, difficulty, question_count)
+            VALUES (new.system, new.difficulty, 1)
+            ON CONFLICT (system, difficulty) DO UPDATE SET question_count = question_count + 1;
+            UPDATE questions SET sample_slot = (
+                SELECT question_count FROM question_strata
+                WHERE system = new.system AND difficulty = new.difficulty
+            )
+            WHERE question_id = new.question_id;
+        END
+        ''',
+        # Deleted question: the stratum's last slot moves into the hole
+        '''
+        CREATE TRIGGER IF NOT EXISTS questions_slot_delete AFTER DELETE ON questions BEGIN
+            UPDATE questions SET sample_slot = old.sample_slot
+            WHERE system = old.system AND difficulty = old.difficulty AND sample_slot = (
+                SELECT question_count FROM question_strata
+                WHERE system = old.system AND difficulty = old.difficulty
+            );
+            UPDATE question_strata SET question_count = question_count - 1
+            WHERE system = old.system AND difficulty = old.difficulty;
+        END
+        ''',
+        # Re-classified question: leaves its old stratum like a delete, joins the new one like an insert
+        '''
+        CREATE TRIGGER IF NOT EXISTS questions_slot_update AFTER UPDATE OF system, difficulty ON questions
+        WHEN old.system IS NOT new.system OR old.difficulty IS NOT new.difficulty BEGIN
+            UPDATE questions SET sample_slot = old.sample_slot
+            WHERE system = old.system AND difficulty = old.difficulty AND sample_slot = (
+                SELECT question_count FROM question_strata
+                WHERE system = old.system AND difficulty = old.difficulty
+            );
+            UPDATE question_strata SET question_count = question_count - 1
+            WHERE system = old.system AND difficulty = old.difficulty;
+            INSERT INTO question_strata (system, difficulty, question_count)
+            VALUES (new.system, new.difficulty, 1)
+            ON CONFLICT (system, difficulty) DO UPDATE SET question_count = question_count + 1;
+            UPDATE questions SET sample_slot = (
+                SELECT question_count FROM question_strata
+                WHERE system = new.system AND difficulty = new.difficulty
+            )
+            WHERE question_id = new.question_id;
+        END
+        '''
+    ]),
+    Migration(6, "Generation counters for cross-process cache invalidation", [
+        '''
+        CREATE TABLE IF NOT EXISTS cache_generations (
+            name TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        ''',
+        "INSERT OR IGNORE INTO cache_generations (name, generation) VALUES ('wiki_pages', 0)",
+        # Any write to wiki_pages, from any process, moves the wiki caches to a new generation
+        '''
+        CREATE TRIGGER IF NOT EXISTS wiki_pages_generation_insert AFTER INSERT ON wiki_pages BEGIN
+            UPDATE cache_generations SET generation = generation + 1 WHERE name = 'wiki_pages';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS wiki_pages_generation_update AFTER UPDATE ON wiki_pages BEGIN
+            UPDATE cache_generations SET generation = generation + 1 WHERE name = 'wiki_pages';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS wiki_pages_generation_delete AFTER DELETE ON wiki_pages BEGIN
+            UPDATE cache_generations SET generation = generation + 1 WHERE name = 'wiki_pages';
+        END
+        '''
+    ]),
+    Migration(7, "Covering per-user review queue index on flashcard progress", [
+        # (user_id, next_review_date, card_id): the due queue and due counts are
+        # range scans over one user's slice instead of a join over every flashcard
+        'CREATE INDEX IF NOT EXISTS idx_flashcard_progress_queue ON flashcard_progress(user_id, next_review_date, card_id)',
+        'DROP INDEX IF EXISTS idx_flashcard_progress_due'
+    ]),
+    Migration(8, "Keyset pagination indexes for question listings", [
+        # Filtered listings page through question_id order as range scans
+        'CREATE INDEX IF NOT EXISTS idx_questions_system_id ON questions(system, question_id)',
+        'CREATE INDEX IF NOT EXISTS idx_questions_system_difficulty_id ON questions(system, difficulty, question_id)',
+        'CREATE INDEX IF NOT EXISTS idx_questions_topic_id ON questions(topic, question_id)'
+    ]),
+    Migration(9, "Content hashes rejecting duplicate questions and flashcards", [
+        # Normalized content hashes (see dedup.py); NULL until backfilled, and
+        # a unique index allows any number of NULLs
+        'ALTER TABLE questions ADD COLUMN content_hash TEXT',
+        'ALTER TABLE flashcards ADD COLUMN content_hash TEXT',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_content_hash ON questions(content_hash)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_flashcards_content_hash ON flashcards(content_hash)'
+    ], backfill=backfill_content_hashes),
+    Migration(10, "Record duplicates found by the content-hash backfill instead of merging them", [
+        # Set by the backfill on a row whose content matches an earlier row,
+        # whose hash then stays NULL; only dedup_content.py, run by an
+        # operator, merges such rows. Backfills run after all pending DDL, so
+        # version 9's backfill (the same one) already has this column
+        'ALTER TABLE questions ADD COLUMN duplicate_of INTEGER',
+        'ALTER TABLE flashcards ADD COLUMN duplicate_of INTEGER'
+    ], backfill=backfill_content_hashes),
+    Migration(11, "Per-user answered-question index for sampler exclusions", [
+        # Lets the sampler reject answered questions with a NOT EXISTS probe
+        # per candidate instead of loading the user's whole answer history
+        'CREATE INDEX IF NOT EXISTS idx_user_responses_user_question ON user_responses(user_id, question_id)'
+    ])
+]
+
+
+# PostgreSQL starts from the schema SQLite reaches at version 7, in one step.
+# Later migrations get the same version number in both lists.
+POSTGRES_MIGRATIONS = [
+    Migration(7, "Base schema (equivalent to SQLite migrations 1-7)", [
+        # Questions; sample_slot is kept dense per (system, difficulty) by questions_slot_*
+        '''
+        CREATE TABLE IF NOT EXISTS questions (
+            question_id SERIAL PRIMARY KEY,
+            topic TEXT NOT NULL,
+            system TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            question_text TEXT NOT NULL,
+            options TEXT NOT NULL,
+            correct_answer TEXT NOT NULL,
+            explanation TEXT NOT NULL,
+            source_document TEXT NOT NULL,
+            source_page TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sample_slot INTEGER
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_responses (
+            response_id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL REFERENCES questions(question_id),
+            selected_answer TEXT NOT NULL,
+            is_correct INTEGER NOT NULL,
+            time_taken INTEGER,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS flashcards (
+            card_id SERIAL PRIMARY KEY,
+            front_text TEXT NOT NULL,
+            back_text TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            system TEXT NOT NULL,
+            source_document TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS flashcard_progress (
+            progress_id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            card_id INTEGER NOT NULL REFERENCES flashcards(card_id),
+            ease_factor REAL DEFAULT 2.5,
+            interval INTEGER DEFAULT 1,
+            repetitions INTEGER DEFAULT 0,
+            next_review_date TIMESTAMP,
+            last_reviewed TIMESTAMP,
+            UNIQUE (user_id, card_id)
+        )
+        ''',
+        # search_vector replaces the FTS5 table: title lexemes weigh A, content B
+        '''
+        CREATE TABLE IF NOT EXISTS wiki_pages (
+            page_id SERIAL PRIMARY KEY,
+            title TEXT UNIQUE NOT NULL,
+            system TEXT NOT NULL,
+            content TEXT NOT NULL,
+            related_pages TEXT,
+            source_documents TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', title), 'A') ||
+                setweight(to_tsvector('simple', content), 'B')
+            ) STORED
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_bookmarks (
+            bookmark_id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            page_id INTEGER NOT NULL REFERENCES wiki_pages(page_id),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, page_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_system_stats (
+            user_id INTEGER NOT NULL,
+            system TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, system)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS question_strata (
+            system TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            question_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (system, difficulty)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS cache_generations (
+            name TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        "INSERT INTO cache_generations (name, generation) VALUES ('wiki_pages', 0) ON CONFLICT DO NOTHING",
+        'CREATE INDEX IF NOT EXISTS idx_user_responses_user ON user_responses(user_id, is_correct, question_id)',
+        'CREATE INDEX IF NOT EXISTS idx_questions_sampling ON questions(system, difficulty, sample_slot)',
+        'CREATE INDEX IF NOT EXISTS idx_flashcards_system ON flashcards(system)',
+        'CREATE INDEX IF NOT EXISTS idx_flashcard_progress_queue ON flashcard_progress(user_id, next_review_date, card_id)',
+        'CREATE INDEX IF NOT EXISTS idx_wiki_pages_system_title ON wiki_pages(system, title)',
+        'CREATE INDEX IF NOT EXISTS idx_wiki_pages_search ON wiki_pages USING GIN (search_vector)',
+        # Per-user, per-system response aggregates ('' for responses to deleted questions)
+        '''
+        CREATE OR REPLACE FUNCTION user_responses_stats() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO user_system_stats (user_id, system, total, correct)
+                VALUES (NEW.user_id,
+                        COALESCE((SELECT system FROM questions WHERE question_id = NEW.question_id), ''),
+                        1, NEW.is_correct)
+                ON CONFLICT (user_id, system) DO UPDATE SET
+                    total = user_system_stats.total + 1,
+                    correct = user_system_stats.correct + EXCLUDED.correct;
+                RETURN NEW;
+            END IF;
+            UPDATE user_system_stats
+            SET total = total - 1, correct = correct - OLD.is_correct
+            WHERE user_id = OLD.user_id
+              AND system = COALESCE((SELECT system FROM questions WHERE question_id = OLD.question_id), '');
+            RETURN OLD;
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        'DROP TRIGGER IF EXISTS user_responses_stats ON user_responses',
+        '''
+        CREATE TRIGGER user_responses_stats AFTER INSERT OR DELETE ON user_responses
+        FOR EACH ROW EXECUTE FUNCTION user_responses_stats()
+        ''',
+        # Dense sample slots, as in SQLite migration 5: a new question takes the next
+        # slot in its stratum, a leaving one has the stratum's last slot moved into its
+        # hole. The question_strata row lock serializes writers to the same stratum.
+        '''
+        CREATE OR REPLACE FUNCTION questions_slot() RETURNS trigger AS $$
+        DECLARE
+            slot INTEGER;
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                UPDATE question_strata SET question_count = question_count - 1
+                WHERE system = OLD.system AND difficulty = OLD.difficulty
+                RETURNING question_count + 1 INTO slot;
+                UPDATE questions SET sample_slot = OLD.sample_slot
+                WHERE system = OLD.system AND difficulty = OLD.difficulty AND sample_slot = slot;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                INSERT INTO question_strata (system, difficulty, question_count)
+                VALUES (NEW.system, NEW.difficulty, 1)
+                ON CONFLICT (system, difficulty) DO UPDATE SET question_count = question_strata.question_count + 1
+                RETURNING question_count INTO slot;
+                UPDATE questions SET sample_slot = slot WHERE question_id = NEW.question_id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        'DROP TRIGGER IF EXISTS questions_slot_insert_delete ON questions',
+        '''
+        CREATE TRIGGER questions_slot_insert_delete AFTER INSERT OR DELETE ON questions
+        FOR EACH ROW EXECUTE FUNCTION questions_slot()
+        ''',
+        'DROP TRIGGER IF EXISTS questions_slot_update ON questions',
+        '''
+        CREATE TRIGGER questions_slot_update AFTER UPDATE OF system, difficulty ON questions
+        FOR EACH ROW
+        WHEN (OLD.system IS DISTINCT FROM NEW.system OR OLD.difficulty IS DISTINCT FROM NEW.difficulty)
+        EXECUTE FUNCTION questions_slot()
+        ''',
+        # Any write to wiki_pages, from any app node, moves the wiki caches to a new generation
+        '''
+        CREATE OR REPLACE FUNCTION wiki_pages_generation() RETURNS trigger AS $$
+        BEGIN
+            UPDATE cache_generations SET generation = generation + 1 WHERE name = 'wiki_pages';
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        'DROP TRIGGER IF EXISTS wiki_pages_generation ON wiki_pages',
+        '''
+        CREATE TRIGGER wiki_pages_generation AFTER INSERT OR UPDATE OR DELETE ON wiki_pages
+        FOR EACH STATEMENT EXECUTE FUNCTION wiki_pages_generation()
+        '''
+    ]),
+    Migration(8, "Keyset pagination indexes for question listings", [
+        'CREATE INDEX IF NOT EXISTS idx_questions_system_id ON questions(system, question_id)',
+        'CREATE INDEX IF NOT EXISTS idx_questions_system_difficulty_id ON questions(system, difficulty, question_id)',
+        'CREATE INDEX IF NOT EXISTS idx_questions_topic_id ON questions(topic, question_id)'
+    ]),
+    Migration(9, "Content hashes rejecting duplicate questions and flashcards", [
+        'ALTER TABLE questions ADD COLUMN content_hash TEXT',
+        'ALTER TABLE flashcards ADD COLUMN content_hash TEXT',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_content_hash ON questions(content_hash)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_flashcards_content_hash ON flashcards(content_hash)'
+    ], backfill=backfill_content_hashes),
+    Migration(10, "Record duplicates found by the content-hash backfill instead of merging them", [
+        'ALTER TABLE questions ADD COLUMN duplicate_of INTEGER',
+        'ALTER TABLE flashcards ADD COLUMN duplicate_of INTEGER'
+    ], backfill=backfill_content_hashes),
+    Migration(11, "Per-user answered-question index for sampler exclusions", [
+        'CREATE INDEX IF NOT EXISTS idx_user_responses_user_question ON user_responses(user_id, question_id)'
+    ])
+]
+
+
+def _ensure_version_table(conn):
+    """Create the schema_version bookkeeping table"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            backfill_complete INTEGER NOT NULL DEFAULT 1,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def get_schema_version(conn, backend):
+    """Get the highest migration version recorded on this connection's database"""
+    if not backend.table_exists(conn, 'schema_version'):
+        return 0
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def run_migrations(db, migrations=None, batch_size=1000):
+    """Apply pending migrations in order, then finish any outstanding backfills
+    
+    Each migration's DDL runs in its own write transaction and the version is
+    re-checked inside it, so several processes starting at once apply each step
+    exactly once. Backfills run afterwards in small batches. Migrations default
+    to the list for the database's backend (see backends.py).
+    """
+    backend = db.backend
+    migrations = sorted(migrations if migrations is not None else backend.migrations, key=lambda m: m.version)
+    
+    # Fast path: an up-to-date database needs no write lock at startup
+    with db.connection() as conn:
+        current_version = get_schema_version(conn, backend)
+        if current_version >= migrations[-1].version and not conn.execute(
+            'SELECT 1 FROM schema_version WHERE backfill_complete = 0'
+        ).fetchone():
+            return
+    
+    with db.transaction() as conn:
+        backend.lock_schema(conn)
+        _ensure_version_table(conn)
+    
+    for migration in migrations:
+        with db.transaction() as conn:
+            backend.lock_schema(conn)
+            if get_schema_version(conn, backend) >= migration.version:
+                continue
+            for statement in migration.statements:
+                conn.execute(statement)
+            conn.execute(
+                'INSERT INTO schema_version (version, description, backfill_complete) VALUES (?, ?, ?)',
+                (migration.version, migration.description, 0 if migration.backfill else 1)
+            )
+    
+    _run_pending_backfills(db, migrations, batch_size)
+
+
+def _run_pending_backfills(db, migrations, batch_size):
+    """Run backfills for applied migrations that have not finished them"""
+    with db.connection() as conn:
+        pending = {row[0] for row in conn.execute(
+            'SELECT version FROM schema_version WHERE backfill_complete = 0'
+        )}
+    
+    for migration in migrations:
+        if migration.version not in pending or not migration.backfill:
+            continue
+        
+        while True:
+            with db.transaction() as conn:
+                changed = migration.backfill(conn, batch_size)
+            if not changed:
+                break
+        
+        with db.transaction() as conn:
+            conn.execute(
+                'UPDATE schema_version SET backfill_complete = 1 WHERE version = ?',
+                (migration.version,)
+            )
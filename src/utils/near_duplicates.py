@@ -0,0 +1,68 @@
+"""
+Near-duplicate detection for MedPrepLibrary
+Finds questions and flashcards that say the same thing in different words, using sentence embeddings
+"""
+from collections import defaultdict
+
+import numpy as np
+
+# What each kind of content is compared on: table, id column, text expression
+_SOURCES = {
+    'questions': ('questions', 'question_id', "question_text || ' ' || options"),
+    'flashcards': ('flashcards', 'card_id', "front_text || ' ' || back_text"),
+}
+
+
+def _load_items(db, kind):
+    """Get (id, system, text) for every item of one kind, oldest first"""
+    table, key, text = _SOURCES[kind]
+    with db.connection() as conn:
+        return conn.execute(f'SELECT {key}, system, {text} FROM {table} ORDER BY {key}').fetchall()
+
+
+def find_near_duplicates(db, embedding_generator, kind='questions', threshold=0.92, block_size=1024):
+    """Group items whose embeddings have cosine similarity >= threshold
+    
+    Items are only compared within their own system. Each group is
+    (keep_id, [duplicate_ids]) with the oldest item kept; grouping is greedy in
+    id order, so an item already claimed by an earlier group is not used to
+    pull in further items. Similarities are computed a block of rows at a time
+    so memory stays at block_size x n floats per system.
+    """
+    by_system = defaultdict(list)
+    for item_id, system, text in _load_items(db, kind):
+        by_system[system].append((item_id, text))
+    
+    groups = []
+    for system, items in by_system.items():
+        if len(items) < 2:
+            continue
+        ids = [item_id for item_id, _ in items]
+        embeddings = np.asarray(embedding_generator.encode([text for _, text in items]), dtype=np.float32)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        
+        claimed = np.zeros(len(ids), dtype=bool)
+        for start in range(0, len(ids), block_size):
+            similarities = embeddings[start:start + block_size] @ embeddings.T
+            for offset, row in enumerate(similarities):
+                i = start + offset
+                if claimed[i]:
+                    continue
+                # Only later items can be duplicates of item i: earlier ones were already grouped
+                matches = np.nonzero(row[i + 1:] >= threshold)[0] + i + 1
+                matches = matches[~claimed[matches]]
+                if len(matches):
+                    claimed[matches] = True
+                    groups.append((ids[i], [ids[j] for j in matches]))
+    
+    return groups
+
+
+def merge_near_duplicates(db, embedding_generator, kind='questions', threshold=0.92, dry_run=False):
+    """Find near-duplicate groups and fold each into its oldest item (unless dry_run)"""
+    groups = find_near_duplicates(db, embedding_generator, kind, threshold)
+    if not dry_run:
+        merge = db.merge_duplicate_questions if kind == 'questions' else db.merge_duplicate_flashcards
+        for keep_id, duplicate_ids in groups:
+            merge(keep_id, duplicate_ids)
+    return groups
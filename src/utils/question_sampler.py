@@ -0,0 +1,189 @@
+"""
+Random question sampling for MedPrepLibrary
+Draws practice sets without sorting the whole questions table
+"""
+import random
+
+
+class QuestionSampler:
+    """Samples questions through their dense per-stratum sample slots
+    
+    Triggers keep every question in a slot 1..n of its (system, difficulty)
+    stratum, with n stored in question_strata. Laying the strata end to end gives
+    one dense position space with no rowid gaps, so drawing distinct random
+    positions and looking their slots up on idx_questions_sampling is an exact
+    uniform sample at a cost proportional to the sample size, not the table.
+    Already-answered questions are rejected in the same lookup with a NOT EXISTS
+    probe on idx_user_responses_user_question and redrawn; if a user has answered
+    most of the candidates, the draw finishes with an index-only scan.
+    """
+    
+    def __init__(self, db, max_rounds=6, rng=None):
+        self.db = db
+        self.max_rounds = max_rounds
+        self.rng = rng or random.Random()
+    
+    def sample(self, count, system=None, difficulty=None, exclude_user_id=None,
+               stratify_by=None, weights=None):
+        """Sample up to `count` distinct question ids in random order
+        
+        system / difficulty: restrict to one system and/or difficulty
+        exclude_user_id: skip questions this user has already answered
+        stratify_by: None for a uniform draw, or 'system', 'difficulty' or
+            ('system', 'difficulty') to split `count` across those groups in
+            proportion to their size (or to `weights`) and draw each share separately
+        weights: optional {group: weight} for stratified draws, where group is a
+            system name, a difficulty, or a (system, difficulty) tuple matching
+            stratify_by; groups left out get weight 0
+        """
+        with self.db.connection() as conn:
+            strata = self._load_strata(conn, system, difficulty)
+            
+            chosen = set()
+            if stratify_by:
+                allocation = self._allocate(strata, count, stratify_by, weights)
+                for group, share in allocation.items():
+                    members = [s for s in strata if self._group_key(s, stratify_by) == group]
+                    self._draw(conn, members, share, exclude_user_id, chosen)
+            else:
+                self._draw(conn, strata, count, exclude_user_id, chosen)
+        
+        ids = list(chosen)
+        self.rng.shuffle(ids)
+        return ids
+    
+    def _load_strata(self, conn, system, difficulty):
+        """Get the non-empty (system, difficulty) strata and their sizes"""
+        query = 'SELECT system, difficulty, question_count FROM question_strata WHERE question_count > 0'
+        params = []
+        if system is not None:
+            query += ' AND system = ?'
+            params.append(system)
+        if difficulty is not None:
+            query += ' AND difficulty = ?'
+            params.append(difficulty)
+        
+        return [
+            {'system': row[0], 'difficulty': row[1], 'size': row[2]}
+            for row in conn.execute(query, params).fetchall()
+        ]
+    
+    def _unanswered_clause(self, user_id):
+        """SQL condition (and its params) keeping questions `user_id` has not answered"""
+        if user_id is None:
+            return '', ()
+        return '''
+            AND NOT EXISTS (SELECT 1 FROM user_responses ur
+                            WHERE ur.user_id = ? AND ur.question_id = questions.question_id)
+        ''', (user_id,)
+    
+    def _group_key(self, stratum, stratify_by):
+        """Get the group a stratum belongs to under a stratification"""
+        if isinstance(stratify_by, str):
+            return stratum[stratify_by]
+        return tuple(stratum[field] for field in stratify_by)
+    
+    def _allocate(self, strata, count, stratify_by, weights):
+        """Split `count` across groups by weight (default: group size), largest remainder first"""
+        sizes = {}
+        for stratum in strata:
+            group = self._group_key(stratum, stratify_by)
+            sizes[group] = sizes.get(group, 0) + stratum['size']
+        
+        if weights is None:
+            group_weights = dict(sizes)
+        else:
+            group_weights = {group: weights.get(group, 0) for group in sizes}
+        total_weight = sum(group_weights.values())
+        if total_weight <= 0:
+            return {}
+        
+        exact = {group: count * w / total_weight for group, w in group_weights.items()}
+        allocation = {group: min(int(share), sizes[group]) for group, share in exact.items()}
+        
+        # Hand out the remaining slots by largest fractional share, skipping full groups
+        available = sum(size for group, size in sizes.items() if group_weights[group] > 0)
+        remaining = min(count, available) - sum(allocation.values())
+        order = sorted(exact, key=lambda g: exact[g] - int(exact[g]), reverse=True)
+        while remaining > 0:
+            progressed = False
+            for group in order:
+                if remaining == 0:
+                    break
+                if allocation[group] < sizes[group] and group_weights[group] > 0:
+                    allocation[group] += 1
+                    remaining -= 1
+                    progressed = True
+            if not progressed:
+                break
+        return allocation
+    
+    def _draw(self, conn, strata, count, exclude_user_id, chosen):
+        """Add up to `count` ids drawn uniformly from the union of `strata` to `chosen`"""
+        target = len(chosen) + count
+        total = sum(s['size'] for s in strata)
+        tried = set()
+        acceptance = 1.0
+        
+        for _ in range(self.max_rounds):
+            needed = target - len(chosen)
+            untried = total - len(tried)
+            if needed <= 0 or untried <= 0:
+                return
+            # Positions are only tried once, so a nearly used-up space is cheaper to scan
+            if untried < 4 * needed:
+                break
+            
+            # Draw fresh positions, with headroom for the share the last round rejected
+            draws = min(untried, int(needed / acceptance) + 1)
+            positions = set()
+            while len(positions) < draws:
+                position = self.rng.randrange(total)
+                if position not in tried:
+                    positions.add(position)
+            tried |= positions
+            
+            found = self._lookup_positions(conn, strata, positions, exclude_user_id)
+            found = [qid for qid in found if qid not in chosen]
+            acceptance = max(len(found) / draws, 0.01)
+            self.rng.shuffle(found)
+            chosen.update(found[:target - len(chosen)])
+        
+        if len(chosen) >= target:
+            return
+        
+        # Most candidates were answered or tried: finish with an index-only scan
+        unanswered, params = self._unanswered_clause(exclude_user_id)
+        pool = []
+        for stratum in strata:
+            cursor = conn.execute(f'''
+                SELECT question_id FROM questions WHERE system = ? AND difficulty = ?{unanswered}
+            ''', (stratum['system'], stratum['difficulty'], *params))
+            pool.extend(row[0] for row in cursor if row[0] not in chosen)
+        needed = target - len(chosen)
+        chosen.update(self.rng.sample(pool, min(needed, len(pool))))
+    
+    def _lookup_positions(self, conn, strata, positions, exclude_user_id=None):
+        """Map positions in the concatenated strata to unanswered question ids via their sample slots"""
+        slots_by_stratum = {}
+        for position in sorted(positions):
+            offset = position
+            for index, stratum in enumerate(strata):
+                if offset < stratum['size']:
+                    slots_by_stratum.setdefault(index, []).append(offset + 1)
+                    break
+                offset -= stratum['size']
+        
+        unanswered, params = self._unanswered_clause(exclude_user_id)
+        found = []
+        for index, slots in slots_by_stratum.items():
+            stratum = strata[index]
+            for start in range(0, len(slots), 500):
+                batch = slots[start:start + 500]
+                placeholders = ', '.join('?' for _ in batch)
+                cursor = conn.execute(f'''
+                    SELECT question_id FROM questions
+                    WHERE system = ? AND difficulty = ? AND sample_slot IN ({placeholders}){unanswered}
+                ''', (stratum['system'], stratum['difficulty'], *batch, *params))
+                found.extend(row[0] for row in cursor)
+        return found
@@ -0,0 +1,125 @@
+"""
+Row record types for MedPrepLibrary
+Compact question and flashcard objects built straight from SQLite rows
+"""
+import json
+
+
+class Record:
+    """Base for __slots__ row records that also behave like read/write dicts
+    
+    Existing callers index records like the dicts the database layer used to
+    return (record['topic'], record.get('options'), dict(record.items())), so
+    the mapping methods cover the public field names in `fields`.
+    """
+    __slots__ = ()
+    fields = ()
+    
+    @classmethod
+    def row_factory(cls, cursor, row):
+        """sqlite3 row factory: build a record from a row in `columns` order"""
+        return cls(*row)
+    
+    def __getitem__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __setitem__(self, key, value):
+        if key not in self.fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+    
+    def __contains__(self, key):
+        return key in self.fields
+    
+    def __iter__(self):
+        return iter(self.fields)
+    
+    def __len__(self):
+        return len(self.fields)
+    
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+    
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.fields else default
+    
+    def keys(self):
+        return list(self.fields)
+    
+    def values(self):
+        return [getattr(self, key) for key in self.fields]
+    
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.fields]
+    
+    def to_dict(self):
+        """Get a plain dict copy (decodes any lazy fields)"""
+        return {key: getattr(self, key) for key in self.fields}
+
+
+class Question(Record):
+    """A question row; `options` is decoded from JSON on first access"""
+    __slots__ = ('question_id', 'topic', 'system', 'difficulty', 'question_text', '_options_json',
+                 '_options', 'correct_answer', 'explanation', 'source_document', 'source_page',
+                 'created_at')
+    fields = ('question_id', 'topic', 'system', 'difficulty', 'question_text', 'options',
+              'correct_answer', 'explanation', 'source_document', 'source_page', 'created_at')
+    # Column list matching __init__'s argument order
+    columns = ('question_id, topic, system, difficulty, question_text, options, '
+               'correct_answer, explanation, source_document, source_page, created_at')
+    
+    def __init__(self, question_id, topic, system, difficulty, question_text, options,
+                 correct_answer, explanation, source_document, source_page, created_at):
+        self.question_id = question_id
+        self.topic = topic
+        self.system = system
+        self.difficulty = difficulty
+        self.question_text = question_text
+        self._options_json = options
+        self._options = None
+        self.correct_answer = correct_answer
+        self.explanation = explanation
+        self.source_document = source_document
+        self.source_page = source_page
+        self.created_at = created_at
+    
+    @property
+    def options(self):
+        if self._options is None and self._options_json is not None:
+            self._options = json.loads(self._options_json)
+            self._options_json = None
+        return self._options
+    
+    @options.setter
+    def options(self, value):
+        self._options = value
+        self._options_json = None
+
+
+class Flashcard(Record):
+    """A flashcard row, with the user's SM-2 progress when read through get_due_flashcards"""
+    __slots__ = ('card_id', 'front_text', 'back_text', 'topic', 'system', 'source_document',
+                 'ease_factor', 'interval', 'repetitions')
+    fields = __slots__
+    # Column list matching __init__'s argument order (progress columns come from flashcard_progress)
+    columns = ('f.card_id, f.front_text, f.back_text, f.topic, f.system, f.source_document, '
+               'fp.ease_factor, fp.interval, fp.repetitions')
+    
+    def __init__(self, card_id, front_text, back_text, topic, system, source_document,
+                 ease_factor=2.5, interval=1, repetitions=0):
+        self.card_id = card_id
+        self.front_text = front_text
+        self.back_text = back_text
+        self.topic = topic
+        self.system = system
+        self.source_document = source_document
+        self.ease_factor = ease_factor
+        self.interval = interval
+        self.repetitions = repetitions
@@ -0,0 +1,52 @@
+"""
+Organ system classification for MedPrepLibrary
+Keyword-based assignment of text (wiki topics, document chunks) to one of the USMLE systems
+"""
+
+# Keywords per system; a text belongs to the system with the most distinct keywords in it
+SYSTEM_KEYWORDS = {
+    "Cardiovascular": ["heart", "cardiac", "vascular", "blood pressure", "artery", "vein",
+                       "myocardial", "coronary", "atrial", "ventricular", "valve", "aortic"],
+    "Respiratory": ["lung", "pulmonary", "respiratory", "breathing", "airway", "bronch",
+                    "alveol", "pneumo", "pleural", "oxygen", "ventilation"],
+    "Gastrointestinal": ["stomach", "intestine", "liver", "pancreas", "digestive", "gastric",
+                         "hepat", "bowel", "colon", "esophag", "duoden", "bile"],
+    "Renal": ["kidney", "renal", "urine", "nephron", "glomerular", "urinary", "bladder"],
+    "Endocrine": ["hormone", "thyroid", "diabetes", "insulin", "pituitary", "adrenal",
+                  "endocrine", "metabolic", "glucose", "cortisol"],
+    "Neurology": ["brain", "nerve", "neural", "cerebral", "spinal", "neuro", "seizure",
+                  "stroke", "cognitive", "motor", "sensory"],
+    "Hematology": ["blood", "anemia", "leukemia", "coagulation", "platelet", "hemoglobin",
+                   "lymphoma", "bone marrow", "hematologic"],
+    "Immunology": ["immune", "antibody", "antigen", "lymphocyte", "autoimmune", "allergy",
+                   "immunodeficiency", "inflammation"],
+    "Musculoskeletal": ["bone", "muscle", "joint", "skeletal", "arthritis", "fracture",
+                        "osteo", "muscular", "cartilage"],
+    "Reproductive": ["reproductive", "pregnancy", "ovary", "testis", "uterus", "prostate",
+                     "sexual", "menstrual", "fetal"],
+    "Pathology": ["pathology", "disease", "neoplasia", "tumor", "cancer", "malignant",
+                  "benign", "metastasis", "carcinoma"],
+    "Pharmacology": ["drug", "medication", "pharmacology", "therapy", "treatment", "agent",
+                     "inhibitor", "receptor", "dose"],
+    "Microbiology": ["bacteria", "virus", "fungal", "infection", "microbe", "pathogen",
+                     "antibiotic", "sepsis", "organism"],
+    "Biochemistry": ["metabolism", "enzyme", "biochemical", "pathway", "synthesis", "cycle",
+                     "metabolic", "substrate", "cofactor"],
+    "Behavioral Science": ["behavior", "psychology", "psychiatric", "mental", "cognitive",
+                           "disorder", "depression", "anxiety", "psychosis"]
+}
+
+# Assigned when no keyword matches
+DEFAULT_SYSTEM = "General"
+
+
+def classify_system(*texts):
+    """Get the system whose keywords best match the texts (ties go to the earlier system)"""
+    lowered = [text.lower() for text in texts if text]
+    scores = {
+        system: sum(1 for keyword in keywords if any(keyword in text for text in lowered))
+        for system, keywords in SYSTEM_KEYWORDS.items()
+    }
+    if max(scores.values()) > 0:
+        return max(scores, key=scores.get)
+    return DEFAULT_SYSTEM
@@ -0,0 +1,214 @@
+"""
+Write-behind logger for MedPrepLibrary
+Moves answer and flashcard-review writes off the request path onto one background writer
+
+Durability: an event is durable once its batch commits, normally within
+`flush_interval` seconds of being queued. Committed batches survive an app
+crash. Because connections run WAL with synchronous=NORMAL, the last few
+commits can still be lost on an OS crash or power failure. Events still in the
+queue are written by close(), which also runs at interpreter exit. A hard kill
+(SIGKILL, OOM) loses them. Reads made right after queuing an event, such as
+dashboard statistics, can lag by up to one flush interval.
+"""
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+
+
+class WriteBehindLogger:
+    def __init__(self, db, max_queue=10000, batch_size=200, flush_interval=0.5,
+                 put_timeout=1.0, max_retries=3):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        # close() waits on this until no producer is between its closing check and its put
+        self._idle = threading.Condition(self._lock)
+        self._closing = False
+        self._producers = 0
+        self._thread = None
+        self._conn = None
+        
+        # Metrics
+        self._enqueued = 0
+        self._written = 0
+        self._batches = 0
+        self._sync_fallbacks = 0
+        self._failed = 0
+        self._total_commit = 0.0
+        self._max_commit = 0.0
+        self._last_commit = 0.0
+        self._max_depth = 0
+    
+    def start(self):
+        """Start the writer thread; it holds one pooled connection until close()"""
+        if self._thread is not None:
+            return self
+        self._conn = self.db.pool.acquire()
+        self._thread = threading.Thread(target=self._run, name="medprep-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+    
+    def log_response(self, user_id, question_id, selected_answer, is_correct, time_taken=None):
+        """Queue a question response (see DatabaseManager.record_user_response)"""
+        self._put(('response', (user_id, question_id, selected_answer, is_correct, time_taken),
+                   {'answered_at': self._utc_timestamp()}))
+    
+    def log_review(self, user_id, card_id, quality):
+        """Queue a flashcard review (see DatabaseManager.update_flashcard_progress)"""
+        self._put(('review', (user_id, card_id, quality), {'reviewed_at': datetime.now()}))
+    
+    def _utc_timestamp(self):
+        """Current time in the format SQLite's CURRENT_TIMESTAMP uses"""
+        return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    
+    def _put(self, event):
+        """Queue an event, writing it synchronously if the queue stays full or the writer is down"""
+        with self._lock:
+            accepting = self._thread is not None and not self._closing
+            if accepting:
+                self._producers += 1
+        if accepting:
+            try:
+                self._queue.put(event, timeout=self.put_timeout)
+                with self._lock:
+                    self._enqueued += 1
+                    self._max_depth = max(self._max_depth, self._queue.qsize())
+                return
+            except queue.Full:
+                pass
+            finally:
+                with self._lock:
+                    self._producers -= 1
+                    self._idle.notify_all()
+        
+        # Backpressure fallback: never drop an answer, pay the synchronous commit instead
+        with self._lock:
+            self._sync_fallbacks += 1
+        self._apply(event)
+    
+    def _apply(self, event):
+        """Write one event through the DatabaseManager (joins an open transaction)"""
+        kind, args, kwargs = event
+        if kind == 'response':
+            self.db.record_user_response(*args, **kwargs)
+        elif kind == 'review':
+            self.db.update_flashcard_progress(*args, **kwargs)
+    
+    def _run(self):
+        """Writer loop: gather events for up to flush_interval, then commit them together"""
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._commit(batch)
+    
+    def _next_batch(self):
+        """Collect up to batch_size events, waiting at most flush_interval after the first"""
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0 and not self._stop.is_set():
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Out of time (or shutting down): take only what is already queued
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _commit(self, batch):
+        """Commit a batch in one transaction, retrying, then falling back to one event at a time"""
+        for attempt in range(self.max_retries):
+            start = time.perf_counter()
+            try:
+                with self.db.transaction(conn=self._conn):
+                    for event in batch:
+                        self._apply(event)
+            except Exception as e:
+                print(f"Write-behind batch of {len(batch)} failed (attempt {attempt + 1}): {str(e)}")
+                time.sleep(0.1 * (attempt + 1))
+                continue
+            
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._written += len(batch)
+                self._batches += 1
+                self._total_commit += elapsed
+                self._max_commit = max(self._max_commit, elapsed)
+                self._last_commit = elapsed
+            for _ in batch:
+                self._queue.task_done()
+            return
+        
+        # Isolate the bad event(s) so one poison event cannot block the rest
+        for event in batch:
+            try:
+                with self.db.transaction(conn=self._conn):
+                    self._apply(event)
+                with self._lock:
+                    self._written += 1
+            except Exception as e:
+                print(f"Write-behind dropped {event[0]} event {event[1]}: {str(e)}")
+                with self._lock:
+                    self._failed += 1
+            self._queue.task_done()
+    
+    def flush(self, timeout=None):
+        """Block until every event queued so far has been committed"""
+        if self._thread is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+    
+    def close(self):
+        """Drain the queue, stop the writer thread and return its connection"""
+        if self._thread is None:
+            return
+        # New events go synchronous from here; the writer only stops once
+        # every put already under way has landed in the queue
+        with self._lock:
+            self._closing = True
+            self._idle.wait_for(lambda: self._producers == 0)
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.db.pool.release(self._conn)
+        self._conn = None
+        atexit.unregister(self.close)
+    
+    def get_stats(self):
+        """Get queue depth and commit latency metrics"""
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_depth,
+                'queue_capacity': self._queue.maxsize,
+                'enqueued': self._enqueued,
+                'written': self._written,
+                'failed': self._failed,
+                'sync_fallbacks': self._sync_fallbacks,
+                'batches': self._batches,
+                'avg_batch_size': (self._written / self._batches) if self._batches > 0 else 0.0,
+                'avg_commit_seconds': (self._total_commit / self._batches) if self._batches > 0 else 0.0,
+                'max_commit_seconds': self._max_commit,
+                'last_commit_seconds': self._last_commit
+            }
@@ -3,6 +3,8 @@ Wiki builder for creating document-faithful wiki pages
 """
 import re
 
+from src.utils.systems import classify_system
+
 class WikiBuilder:
     def __init__(self, db_manager, rag_processor):
         self.db = db_manager
@@ -25,7 +27,7 @@ class WikiBuilder:
             "Behavioral Science"
         ]
     
-    def build_wiki_from_documents(self, documents):
+    def build_wiki_from_documents(self, documents, batch_size=50, retrieval_batch_size=64):
         """Build comprehensive wiki pages from processed documents"""
         print("Building wiki pages from documents...")
         
@@ -33,11 +35,14 @@ class WikiBuilder:
         topics = self._get_comprehensive_topics()
         
         created_count = 0
-        for topic in topics:
+        pending_pages = []
+        for i, topic in enumerate(topics):
+            # Retrieve content for the next batch of topics in one encode and one index search
+            if i % retrieval_batch_size == 0:
+                topic_results = self._retrieve_topics(topics[i:i + retrieval_batch_size])
+            results = topic_results.get(topic)
+            
             try:
-                # Get relevant content for this topic
-                results = self.rag.get_relevant_chunks(topic, k=8)
-                
                 if results and len(results) > 0:
                     # Combine context from multiple chunks for comprehensive coverage
                     content_parts = []
@@ -55,25 +60,59 @@ class WikiBuilder:
                         # Determine which system this topic belongs to
                         system = self._classify_topic_system(topic, content)
                         
-                        # Create wiki page
-                        self.db.add_wiki_page(
-                            title=topic,
-                            system=system,
-                            content=content,
-                            related_pages=[],
-                            source_documents=list(sources)
-                        )
-                        
-                        created_count += 1
-                        print(f"✓ Created: {topic} ({system})")
+                        # Queue wiki page; pages are written in batched transactions
+                        pending_pages.append({
+                            'title': topic,
+                            'system': system,
+                            'content': content,
+                            'related_pages': [],
+                            'source_documents': list(sources)
+                        })
+                        print(f"✓ Prepared: {topic} ({system})")
                 
             except Exception as e:
                 print(f"✗ Error creating {topic}: {str(e)}")
                 continue
+            
+            if len(pending_pages) >= batch_size:
+                created_count += self._flush_wiki_pages(pending_pages)
+                pending_pages = []
+        
+        created_count += self._flush_wiki_pages(pending_pages)
         
         print(f"\n✅ Created {created_count} wiki pages")
         return created_count
     
+    def _retrieve_topics(self, topics, k=8):
+        """Get {topic: chunks} for a batch of topics, retrying one at a time if the batch fails
+        
+        A topic whose own retrieval fails is reported and left out.
+        """
+        try:
+            return dict(zip(topics, self.rag.get_relevant_chunks_batch(topics, k=k)))
+        except Exception as e:
+            print(f"✗ Error retrieving a batch of {len(topics)} topics, retrying one at a time: {str(e)}")
+        
+        topic_results = {}
+        for topic in topics:
+            try:
+                topic_results[topic] = self.rag.get_relevant_chunks(topic, k=k)
+            except Exception as e:
+                print(f"✗ Error creating {topic}: {str(e)}")
+        return topic_results
+    
+    def _flush_wiki_pages(self, pages):
+        """Write a batch of wiki pages in one transaction, returning how many were saved"""
+        if not pages:
+            return 0
+        
+        try:
+            self.db.upsert_wiki_pages_bulk(pages)
+            return len(pages)
+        except Exception as e:
+            print(f"✗ Error saving batch of {len(pages)} pages: {str(e)}")
+            return 0
+    
     def _format_wiki_content(self, topic, content_parts):
         """Format wiki content for readability"""
         # Combine content with proper formatting
@@ -283,57 +322,11 @@ class WikiBuilder:
     
     def _classify_topic_system(self, topic, context):
         """Classify a topic into a system based on content"""
-        topic_lower = topic.lower()
-        context_lower = context.lower()
-        
-        # Comprehensive keyword-based classification
-        system_keywords = {
-            "Cardiovascular": ["heart", "cardiac", "vascular", "blood pressure", "artery", "vein", 
-                              "myocardial", "coronary", "atrial", "ventricular", "valve", "aortic"],
-            "Respiratory": ["lung", "pulmonary", "respiratory", "breathing", "airway", "bronch",
-                           "alveol", "pneumo", "pleural", "oxygen", "ventilation"],
-            "Gastrointestinal": ["stomach", "intestine", "liver", "pancreas", "digestive", "gastric",
-                                "hepat", "bowel", "colon", "esophag", "duoden", "bile"],
-            "Renal": ["kidney", "renal", "urine", "nephron", "glomerular", "urinary", "bladder"],
-            "Endocrine": ["hormone", "thyroid", "diabetes", "insulin", "pituitary", "adrenal",
-                         "endocrine", "metabolic", "glucose", "cortisol"],
-            "Neurology": ["brain", "nerve", "neural", "cerebral", "spinal", "neuro", "seizure",
-                         "stroke", "cognitive", "motor", "sensory"],
-            "Hematology": ["blood", "anemia", "leukemia", "coagulation", "platelet", "hemoglobin",
-                          "lymphoma", "bone marrow", "hematologic"],
-            "Immunology": ["immune", "antibody", "antigen", "lymphocyte", "autoimmune", "allergy",
-                          "immunodeficiency", "inflammation"],
-            "Musculoskeletal": ["bone", "muscle", "joint", "skeletal", "arthritis", "fracture",
-                               "osteo", "muscular", "cartilage"],
-            "Reproductive": ["reproductive", "pregnancy", "ovary", "testis", "uterus", "prostate",
-                            "sexual", "menstrual", "fetal"],
-            "Pathology": ["pathology", "disease", "neoplasia", "tumor", "cancer", "malignant",
-                         "benign", "metastasis", "carcinoma"],
-            "Pharmacology": ["drug", "medication", "pharmacology", "therapy", "treatment", "agent",
-                            "inhibitor", "receptor", "dose"],
-            "Microbiology": ["bacteria", "virus", "fungal", "infection", "microbe", "pathogen",
-                            "antibiotic", "sepsis", "organism"],
-            "Biochemistry": ["metabolism", "enzyme", "biochemical", "pathway", "synthesis", "cycle",
-                            "metabolic", "substrate", "cofactor"],
-            "Behavioral Science": ["behavior", "psychology", "psychiatric", "mental", "cognitive",
-                                  "disorder", "depression", "anxiety", "psychosis"]
-        }
-        
-        # Count keyword matches for each system
-        scores = {}
-        for system, keywords in system_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in topic_lower or keyword in context_lower)
-            scores[system] = score
-        
-        # Return system with highest score
-        if scores and max(scores.values()) > 0:
-            return max(scores, key=scores.get)
-        
-        return "General"
+        return classify_system(topic, context)
     
-    def search_wiki(self, query):
-        """Search wiki pages"""
-        return self.db.search_wiki_pages(query)
+    def search_wiki(self, query, limit=50):
+        """Search wiki pages, ranked by relevance with highlighted snippets"""
+        return self.db.search_wiki_pages(query, limit=limit)
     
     def get_wiki_page(self, title):
         """Get a specific wiki page"""
@@ -0,0 +1,8 @@
+"""
+Shared pytest setup for MedPrepLibrary
+Makes the repository root importable so tests can use `from src...` like the app does
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -0,0 +1,260 @@
+"""
+Backend contract checks
+Runs the same DatabaseManager/AuthManager operations against every storage backend:
+always SQLite, and PostgreSQL too: the server DATABASE_URL points at, or else a
+throwaway local one started with pgserver (each test gets its own schema there,
+dropped afterwards)
+"""
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.utils.backends import SQLiteBackend, _to_pyformat, create_backend
+from src.utils.database import DatabaseManager
+from src.utils.dedup import find_exact_duplicates, merge_exact_duplicates
+from src.utils.migrations import run_migrations
+
+BACKENDS = ['sqlite', 'postgres']
+
+
+@pytest.fixture(scope='session')
+def postgres_url(tmp_path_factory):
+    """URL of the PostgreSQL server to test against, started for the session if none is configured"""
+    if os.environ.get('DATABASE_URL'):
+        yield os.environ['DATABASE_URL']
+        return
+    pgserver = pytest.importorskip('pgserver', reason='set DATABASE_URL or pip install pgserver')
+    server = pgserver.get_server(tmp_path_factory.mktemp('postgres'), cleanup_mode='stop')
+    yield server.get_uri()
+    server.cleanup()
+
+
+@pytest.fixture(params=BACKENDS)
+def target(request, tmp_path):
+    """A database target (file path or URL) for each backend, empty at the start of the test"""
+    if request.param == 'sqlite':
+        yield str(tmp_path / "contract.db")
+        return
+    
+    psycopg2 = pytest.importorskip('psycopg2')
+    url = request.getfixturevalue('postgres_url')
+    schema = f'contract_{uuid.uuid4().hex[:12]}'
+    admin = psycopg2.connect(url)
+    admin.autocommit = True
+    admin.cursor().execute(f'CREATE SCHEMA {schema}')
+    try:
+        yield f"{url}{'&' if '?' in url else '?'}options=-csearch_path%3D{schema}"
+    finally:
+        admin.cursor().execute(f'DROP SCHEMA {schema} CASCADE')
+        admin.close()
+
+
+@pytest.fixture
+def db(target):
+    db = DatabaseManager(target)
+    yield db
+    db.close()
+
+
+def question(i, system='Renal'):
+    return {'topic': f'Topic {i}', 'system': system, 'difficulty': 'Easy',
+            'question_text': f'Question {i}?', 'options': {'A': 'yes', 'B': 'no'},
+            'correct_answer': 'A', 'explanation': 'Because.', 'source_document': 'doc.pdf'}
+
+
+def test_placeholders_rewritten_outside_quotes():
+    assert _to_pyformat("SELECT ? WHERE a = '?' AND b LIKE '%x' AND c = ?") == \
+        "SELECT %s WHERE a = '?' AND b LIKE '%x' AND c = %s"
+    assert _to_pyformat("SELECT 'it''s ?', ? % 2") == "SELECT 'it''s ?', %s %% 2"
+
+
+def test_create_backend_dispatch(tmp_path):
+    assert isinstance(create_backend(tmp_path / "x.db"), SQLiteBackend)
+    backend = SQLiteBackend(tmp_path / "y.db")
+    assert create_backend(backend) is backend
+
+
+def test_migrations_reach_latest_version(db):
+    assert db.get_schema_version() == max(m.version for m in db.backend.migrations)
+    # Postgres starts at 7; both backends must end on the same version
+    assert db.get_schema_version() == 11
+
+
+def test_insert_many_returns_ids_in_input_order(db):
+    first = db.add_questions_bulk([question(i) for i in range(5)])
+    assert len(set(first)) == 5
+    
+    # Leave a gap in the id sequence, then insert past it
+    with db.transaction() as conn:
+        conn.execute('DELETE FROM questions WHERE question_id = ?', (first[2],))
+    second = db.add_questions_bulk([question(i) for i in range(10, 15)])
+    for question_id, i in zip(second, range(10, 15)):
+        with db.connection() as conn:
+            text = conn.execute('SELECT question_text FROM questions WHERE question_id = ?',
+                                (question_id,)).fetchone()[0]
+        assert text == f'Question {i}?'
+
+
+def test_bulk_insert_deduplicates(db):
+    ids = db.add_questions_bulk([question(1), question(2), question(1)])
+    assert ids[0] == ids[2] != ids[1]
+    assert db.add_questions_bulk([question(2), question(3)])[0] == ids[1]
+
+
+def test_transaction_rolls_back(db):
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.add_questions_bulk([question(1)])
+            raise RuntimeError('abort')
+    with db.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0] == 0
+
+
+def test_wiki_search(db):
+    db.add_wiki_page('Loop diuretics', 'Renal', 'Furosemide inhibits NKCC2 in the thick ascending limb.')
+    db.add_wiki_page('Heart failure', 'Cardiovascular', 'Diuretics relieve congestion.')
+    results = db.search_wiki_pages('diuretic')
+    assert [page['title'] for page in results][0] == 'Loop diuretics'
+    assert {page['title'] for page in results} == {'Loop diuretics', 'Heart failure'}
+
+
+def test_create_user_on_conflict(target):
+    pytest.importorskip('streamlit')
+    from src.auth import AuthManager
+    
+    auth = AuthManager(target)
+    try:
+        assert auth.create_user('contract', 'secret')
+        assert not auth.create_user('contract', 'other')
+        assert auth.verify_credentials('contract', 'secret')[0]
+        assert not auth.verify_credentials('contract', 'other')[0]
+    finally:
+        auth.close()
+
+
+def test_response_triggers_keep_statistics(db):
+    renal = db.add_questions_bulk([question(i) for i in range(3)])
+    cardio = db.add_questions_bulk([question(i, 'Cardiovascular') for i in range(3)])
+    for question_id, correct in zip(renal + cardio[:1], (True, True, False, False)):
+        db.record_user_response(1, question_id, 'A', correct)
+    stats = db.get_user_statistics(1)
+    assert (stats['total_questions'], stats['correct_answers']) == (4, 2)
+    assert stats['system_performance']['Renal']['correct'] == 2
+    assert stats['system_performance']['Cardiovascular']['total'] == 1
+    
+    assert db.rebuild_user_statistics() == 2
+    assert db.get_user_statistics(1) == stats
+
+
+def test_sampler_slots_survive_deletes(db):
+    ids = db.add_questions_bulk([question(i) for i in range(20)])
+    with db.transaction() as conn:
+        conn.execute('DELETE FROM questions WHERE question_id IN (?, ?)', (ids[0], ids[7]))
+    
+    sampled = db.get_random_questions(count=18, system='Renal')
+    assert sorted(q.question_id for q in sampled) == sorted(set(ids) - {ids[0], ids[7]})
+    db.record_user_response(1, ids[1], 'A', True)
+    assert ids[1] not in {q.question_id for q in db.get_random_questions(count=18, exclude_user_id=1)}
+    
+    # With nearly everything answered, the draw falls back to scanning for the rest
+    for question_id in ids[2:17]:
+        if question_id != ids[7]:
+            db.record_user_response(1, question_id, 'A', True)
+    assert sorted(q.question_id for q in db.get_random_questions(count=18, exclude_user_id=1)) == ids[17:]
+
+
+def test_flashcard_progress_upsert(db):
+    card_id = db.add_flashcard('Front', 'Back', 'Topic', 'Renal', 'doc.pdf')
+    reviewed_at = datetime(2024, 1, 1)
+    db.update_flashcard_progress(1, card_id, 5, reviewed_at=reviewed_at)
+    db.update_flashcard_progress(1, card_id, 5, reviewed_at=reviewed_at)
+    due = db.get_due_flashcards(1, as_of=reviewed_at + timedelta(days=7))
+    assert [card.card_id for card in due] == [card_id]
+    assert db.count_due_flashcards(1, as_of=reviewed_at + timedelta(days=5)) == 0
+    assert db.get_new_flashcards(1) == []
+
+
+def test_snapshot_ignores_later_commits(target, db):
+    db.add_questions_bulk([question(1)])
+    with db.snapshot():
+        with db.connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0] == 1
+        other = DatabaseManager(target, pool_size=1)
+        other.add_questions_bulk([question(2)])
+        other.close()
+        with db.connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0] == 1
+    with db.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0] == 2
+
+
+def run_concurrently(target, workers, action):
+    """Run action(db) on `workers` threads, each with its own DatabaseManager (as separate app nodes have)"""
+    barrier = threading.Barrier(workers)
+    results = [None] * workers
+    
+    def run(i):
+        db = DatabaseManager(target, pool_size=1)
+        try:
+            barrier.wait()
+            results[i] = action(db)
+        finally:
+            db.close()
+    
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_bulk_inserts_of_the_same_content(target, db):
+    batch = [question(i) for i in range(200)]
+    results = run_concurrently(target, 4, lambda node: node.add_questions_bulk(batch))
+    assert all(ids == results[0] for ids in results)
+    with db.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0] == 200
+
+
+def test_concurrent_reviews_of_one_card(target, db):
+    card_id = db.add_flashcard('Front', 'Back', 'Topic', 'Renal', 'doc.pdf')
+    run_concurrently(target, 4, lambda node: node.update_flashcard_progress(1, card_id, 5))
+    with db.connection() as conn:
+        repetitions = conn.execute('SELECT repetitions FROM flashcard_progress WHERE card_id = ?',
+                                   (card_id,)).fetchone()[0]
+    assert repetitions == 4
+
+
+def test_hash_backfill_records_duplicates_without_merging(db):
+    # Rows stored before content hashing: same question twice, each answered
+    ids = db.add_questions_bulk([question(1), question(2)])
+    with db.transaction() as conn:
+        conn.execute('UPDATE questions SET content_hash = NULL')
+        copy_id = conn.execute('''
+            INSERT INTO questions (topic, system, difficulty, question_text, options, correct_answer,
+                                   explanation, source_document)
+            SELECT topic, system, difficulty, question_text, options, correct_answer, explanation, source_document
+            FROM questions WHERE question_id = ?
+            RETURNING question_id
+        ''', (ids[0],)).fetchone()[0]
+        conn.execute("UPDATE schema_version SET backfill_complete = 0 WHERE version >= 9")
+    db.record_user_response(1, ids[0], 'A', True)
+    db.record_user_response(2, copy_id, 'B', False)
+    
+    run_migrations(db)
+    with db.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0] == 3
+        assert conn.execute('SELECT duplicate_of FROM questions WHERE question_id = ?', (copy_id,)).fetchone()[0] == ids[0]
+    assert find_exact_duplicates(db, 'questions') == [(ids[0], [copy_id])]
+    assert merge_exact_duplicates(db, 'questions', dry_run=True) == [(ids[0], [copy_id])]
+    assert db.get_user_statistics(2)['total_questions'] == 1
+    
+    merge_exact_duplicates(db, 'questions')
+    assert find_exact_duplicates(db, 'questions') == []
+    with db.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM user_responses WHERE question_id = ?', (ids[0],)).fetchone()[0] == 2
+        assert conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0] == 2
@@ -0,0 +1,79 @@
+"""
+Columnar export/import round trip
+Exports one database and imports it into another that already holds part of the bank
+"""
+import pytest
+
+pytest.importorskip('pyarrow', exc_type=ImportError)
+
+from src.utils import columnar
+from src.utils.columnar import export_tables, import_tables
+from src.utils.database import DatabaseManager
+
+
+def question(i):
+    return {'topic': 'Topic', 'system': 'Renal', 'difficulty': 'Easy', 'question_text': f'Question {i}?',
+            'options': {'A': 'yes', 'B': 'no'}, 'correct_answer': 'A', 'explanation': 'Because.',
+            'source_document': 'doc.pdf'}
+
+
+def test_import_counts_only_inserted_rows(tmp_path):
+    source = DatabaseManager(tmp_path / "source.db")
+    source.add_questions_bulk([question(i) for i in range(7)])
+    card_id = source.add_flashcard('Front', 'Back', 'Topic', 'Renal', 'doc.pdf')
+    source.update_flashcard_progress(1, card_id, 4)
+    source.record_user_response(1, 1, 'A', True)
+    assert export_tables(source, tmp_path / "export") == {
+        'questions': 7, 'flashcards': 1, 'user_responses': 1, 'flashcard_progress': 1}
+    source.close()
+    
+    target = DatabaseManager(tmp_path / "target.db")
+    target.add_questions_bulk([question(i) for i in range(3)])
+    assert import_tables(target, tmp_path / "export") == {
+        'questions': 4, 'flashcards': 1, 'user_responses': 1, 'flashcard_progress': 1}
+    # Everything but the (appended) response log is already there the second time
+    assert import_tables(target, tmp_path / "export") == {
+        'questions': 0, 'flashcards': 0, 'user_responses': 1, 'flashcard_progress': 0}
+    target.close()
+
+
+def test_import_keeps_created_at(tmp_path):
+    source = DatabaseManager(tmp_path / "source.db")
+    source.add_questions_bulk([question(1), question(2)])
+    source.add_flashcard('Front', 'Back', 'Topic', 'Renal', 'doc.pdf')
+    with source.transaction() as conn:
+        conn.execute("UPDATE questions SET created_at = '2021-03-04 05:06:07'")
+        conn.execute("UPDATE flashcards SET created_at = '2020-01-02 03:04:05.250000'")
+    export_tables(source, tmp_path / "export")
+    source.close()
+    
+    target = DatabaseManager(tmp_path / "target.db")
+    import_tables(target, tmp_path / "export")
+    with target.connection() as conn:
+        assert {row[0] for row in conn.execute('SELECT created_at FROM questions')} == {'2021-03-04 05:06:07'}
+        assert conn.execute('SELECT created_at FROM flashcards').fetchone()[0] == '2020-01-02 03:04:05.250000'
+    target.close()
+
+
+def test_export_reads_one_snapshot(tmp_path, monkeypatch):
+    source = DatabaseManager(tmp_path / "source.db")
+    source.add_questions_bulk([question(i) for i in range(3)])
+    source.record_user_response(1, 1, 'A', True)
+    
+    # Another app node answers a new question after questions were exported
+    read_chunks = columnar._read_chunks
+    
+    def read_then_write(db, table, *args):
+        yield from read_chunks(db, table, *args)
+        if table == 'questions':
+            other = DatabaseManager(tmp_path / "source.db")
+            question_id = other.add_questions_bulk([question(3)])[0]
+            other.record_user_response(1, question_id, 'A', True)
+            other.close()
+    
+    monkeypatch.setattr(columnar, '_read_chunks', read_then_write)
+    assert export_tables(source, tmp_path / "export") == {
+        'questions': 3, 'flashcards': 0, 'user_responses': 1, 'flashcard_progress': 0}
+    with source.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM user_responses').fetchone()[0] == 2
+    source.close()
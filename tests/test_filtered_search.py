@@ -0,0 +1,54 @@
+"""
+Filtered dense search for every index type
+Builds a small index of each type with a deterministic stand-in for the
+embedding model and checks that a source-filtered search returns k chunks,
+all from that source, through both the exact sub-index and the ID-selector paths
+"""
+import hashlib
+
+import numpy as np
+import pytest
+
+from src.qa_system import rag_processor
+from src.qa_system.index_factory import DEFAULT_PARAMS
+from src.qa_system.rag_processor import RAGProcessor
+
+DOCUMENTS = 30
+CHUNKS_PER_DOCUMENT = 10
+
+
+class HashEmbeddings:
+    """Maps each text to a fixed pseudo-random unit vector"""
+    embedding_size = 96
+    
+    def encode(self, texts, batch_size=32, show_progress=False):
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], 'little')
+            vector = np.random.default_rng(seed).standard_normal(self.embedding_size)
+            vectors.append(vector / np.linalg.norm(vector))
+        return np.asarray(vectors, dtype='float32')
+
+
+def document(i):
+    # One sentence per chunk: each is longer than half of chunk_text's 800 characters
+    return ' '.join(f'Document {i} sentence {j} ' + 'x' * 500 + '.' for j in range(CHUNKS_PER_DOCUMENT))
+
+
+@pytest.fixture(autouse=True)
+def split_sentences(monkeypatch):
+    # Stands in for NLTK's punkt model, which is downloaded separately
+    monkeypatch.setattr(rag_processor.nltk, 'sent_tokenize', lambda text: text.split('. '))
+
+
+@pytest.mark.parametrize('small_filter', [rag_processor.SMALL_FILTER, 0], ids=['sub-index', 'selector'])
+@pytest.mark.parametrize('index_type', list(DEFAULT_PARAMS))
+def test_filtered_search(tmp_path, monkeypatch, index_type, small_filter):
+    monkeypatch.setattr(rag_processor, 'SMALL_FILTER', small_filter)
+    rag = RAGProcessor(tmp_path / "cache", HashEmbeddings(), index_type=index_type)
+    assert rag.process_documents({f'doc_{i}.pdf': document(i) for i in range(DOCUMENTS)}, workers=1)
+    
+    chunks = rag.get_relevant_chunks('Document 7 sentence 3', k=5, source='doc_7.pdf')
+    assert len(chunks) == 5
+    assert {chunk['source'] for chunk in chunks} == {'doc_7.pdf'}
+    assert rag.get_relevant_chunks('Document 7 sentence 3', k=5, source='missing.pdf') == []
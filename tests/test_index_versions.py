@@ -0,0 +1,76 @@
+"""
+Concurrent writers on one versioned index cache
+Several instances (each with its own lock file handle, as separate sessions
+or processes have) create and publish versions at once
+"""
+import shutil
+import threading
+
+import pytest
+
+from src.qa_system import rag_processor
+from src.qa_system.index_versions import INDEX_FILES, IndexVersions
+from src.qa_system.rag_processor import RAGProcessor
+
+from test_filtered_search import HashEmbeddings, document
+
+SESSIONS = 8
+
+
+def run_concurrently(target):
+    """Run target(i) on SESSIONS threads started together; returns their results"""
+    barrier = threading.Barrier(SESSIONS)
+    results = [None] * SESSIONS
+    
+    def run(i):
+        barrier.wait()
+        results[i] = target(i)
+    
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(SESSIONS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_locked_writers_get_distinct_versions(tmp_path):
+    def write(i):
+        versions = IndexVersions(tmp_path)
+        with versions.lock():
+            version, directory = versions.create(versions.directory(versions.current()["version"])
+                                                 if versions.current() else None)
+            (directory / "manifest.json").write_text(str(i))
+            versions.publish(version)
+        return version
+    
+    published = run_concurrently(write)
+    assert sorted(published) == [f"v{n:06d}" for n in range(1, SESSIONS + 1)]
+    assert IndexVersions(tmp_path).current()["version"] == f"v{SESSIONS:06d}"
+
+
+def test_sessions_migrate_a_legacy_cache_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_processor.nltk, 'sent_tokenize', lambda text: text.split('. '))
+    builder = RAGProcessor(tmp_path / "build", HashEmbeddings())
+    assert builder.process_documents({f'doc_{i}.pdf': document(i) for i in range(3)}, workers=1)
+    
+    # Lay the build out the way caches were saved before versioning
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    for name in INDEX_FILES:
+        path = builder.version_dir / name
+        if path.exists():
+            shutil.copy2(path, cache / name)
+    
+    sessions = [RAGProcessor(cache, HashEmbeddings()) for _ in range(SESSIONS)]
+    assert run_concurrently(lambda i: sessions[i].load_index()) == [True] * SESSIONS
+    
+    versions = IndexVersions(cache)
+    assert versions.current()["version"] == "v000001"
+    assert [path.name for path in versions.versions_dir.iterdir()] == ["v000001"]
+    assert {session.version for session in sessions} == {"v000001"}
+    # Left for sessions that may still be reading them
+    assert (cache / "faiss_index.idx").exists()
+    
+    chunks = sessions[0].get_relevant_chunks('Document 1 sentence 2', k=3, source='doc_1.pdf')
+    assert {chunk['source'] for chunk in chunks} == {'doc_1.pdf'}
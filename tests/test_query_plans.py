@@ -0,0 +1,118 @@
+"""
+Query plan checks for the hot-path indexes
+Runs the app's own queries on a freshly migrated database and asserts, through
+EXPLAIN QUERY PLAN, that each is answered from its index instead of a table scan
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.utils.database import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(tmp_path / "plans.db")
+    db.add_questions_bulk([
+        {'topic': f'Topic {i}', 'system': system, 'difficulty': difficulty,
+         'question_text': f'Question {i} about {system}?', 'options': {'A': 'yes', 'B': 'no'},
+         'correct_answer': 'A', 'explanation': 'Because.', 'source_document': 'doc.pdf'}
+        for i, (system, difficulty) in enumerate(
+            (system, difficulty) for system in ('Cardiovascular', 'Renal') for difficulty in ('Easy', 'Hard')
+            for _ in range(10)
+        )
+    ])
+    for i in range(4):
+        card_id = db.add_flashcard(f'Front {i}', f'Back {i}', f'Topic {i}', 'Renal', 'doc.pdf')
+        db.update_flashcard_progress(1, card_id, 4, reviewed_at=datetime.now() - timedelta(days=10))
+        db.add_wiki_page(f'Page {i}', 'Renal' if i % 2 else 'Cardiovascular', f'Content of page {i}')
+    db.record_user_response(1, 1, 'A', True)
+    yield db
+    db.close()
+
+
+def query_plans(db, action):
+    """Run `action` and get (sql, plan) for every SELECT it issued, with parameters filled in"""
+    statements = []
+    with db.transaction() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            action()
+        finally:
+            conn.set_trace_callback(None)
+        return [
+            (sql, ' | '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)))
+            for sql in statements if sql.lstrip().upper().startswith('SELECT')
+        ]
+
+
+def plan_for(plans, table):
+    """Get the plan of the single traced query that reads `table`"""
+    matching = [plan for sql, plan in plans if f'FROM {table}' in sql]
+    assert len(matching) == 1, plans
+    return matching[0]
+
+
+def test_due_queue_uses_queue_index(db):
+    plans = query_plans(db, lambda: db.get_due_flashcards(1))
+    assert 'USING INDEX idx_flashcard_progress_queue (user_id=? AND next_review_date<?)' in plan_for(
+        plans, 'flashcard_progress')
+    
+    plans = query_plans(db, lambda: db.count_due_flashcards(1))
+    assert 'USING COVERING INDEX idx_flashcard_progress_queue' in plan_for(plans, 'flashcard_progress')
+
+
+def test_user_statistics_read_the_aggregate_key(db):
+    plans = query_plans(db, lambda: db.get_user_statistics(1))
+    assert 'SEARCH user_system_stats USING PRIMARY KEY (user_id=?)' in plan_for(plans, 'user_system_stats')
+
+
+def test_answered_questions_use_covering_index(db):
+    # Candidates are probed one at a time; the user's answers are never read in full
+    plans = query_plans(db, lambda: db.get_random_questions(2, exclude_user_id=1))
+    probe_plans = [plan for sql, plan in plans if 'NOT EXISTS' in sql]
+    assert probe_plans
+    for plan in probe_plans:
+        assert 'USING COVERING INDEX idx_user_responses_user_question (user_id=? AND question_id=?)' in plan
+    assert all('NOT EXISTS' in sql for sql, plan in plans if 'user_responses' in sql)
+
+
+def test_sampling_looks_up_slots(db):
+    plans = query_plans(db, lambda: db.sampler.sample(2, system='Renal'))
+    slot_plans = [plan for sql, plan in plans if 'sample_slot IN' in sql]
+    assert slot_plans
+    for plan in slot_plans:
+        assert 'USING COVERING INDEX idx_questions_sampling (system=? AND difficulty=? AND sample_slot=?)' in plan
+    assert 'SCAN' not in plan_for(plans, 'question_strata')
+    
+    # Drawing nearly the whole stratum finishes with an index-only scan (of
+    # either (system, difficulty, ...) index)
+    plans = query_plans(db, lambda: db.sampler.sample(20, system='Renal'))
+    scan_plans = [plan for sql, plan in plans if 'sample_slot' not in sql and 'FROM questions' in sql]
+    assert scan_plans
+    for plan in scan_plans:
+        assert 'USING COVERING INDEX' in plan and '(system=? AND difficulty=?)' in plan
+
+
+def test_question_listing_uses_keyset_index(db):
+    plans = query_plans(db, lambda: db.get_questions_page(system='Renal', after_id=1))
+    assert 'USING INDEX idx_questions_system_id (system=? AND question_id>?)' in plan_for(plans, 'questions')
+
+
+def test_wiki_index_reads_use_system_title_index(db):
+    plans = query_plans(db, db.get_all_wiki_pages_by_system)
+    assert 'USING COVERING INDEX idx_wiki_pages_system_title' in plan_for(plans, 'wiki_pages')
+    
+    plans = query_plans(db, db.get_wiki_system_counts)
+    assert 'USING COVERING INDEX idx_wiki_pages_system_title' in plan_for(plans, 'wiki_pages')
+    
+    plans = query_plans(db, lambda: db.get_wiki_pages_page(system='Renal'))
+    assert 'USING COVERING INDEX idx_wiki_pages_system_title (system=?)' in plan_for(plans, 'wiki_pages')
+
+
+def test_wiki_lookups_use_title_and_fulltext_indexes(db):
+    plans = query_plans(db, lambda: db.get_wiki_page('Page 1'))
+    assert 'USING INDEX sqlite_autoindex_wiki_pages_1 (title=?)' in plan_for(plans, 'wiki_pages')
+    
+    plans = query_plans(db, lambda: db.search_wiki_pages('content'))
+    assert 'VIRTUAL TABLE INDEX' in plan_for(plans, 'wiki_pages_fts')
@@ -0,0 +1,102 @@
+"""
+Write-behind logger checks
+Events queued on the background writer must all reach the database: on close,
+when the queue is full, and when close() races with a thread still logging
+"""
+import threading
+
+import pytest
+
+from src.utils.database import DatabaseManager
+
+
+@pytest.fixture
+def question_ids(tmp_path):
+    db = DatabaseManager(tmp_path / "write_behind.db")
+    ids = db.add_questions_bulk([
+        {'topic': f'Topic {i}', 'system': 'Renal', 'difficulty': 'Easy',
+         'question_text': f'Question {i}?', 'options': {'A': 'yes', 'B': 'no'},
+         'correct_answer': 'A', 'explanation': 'Because.', 'source_document': 'doc.pdf'}
+        for i in range(10)
+    ])
+    db.close()
+    return ids
+
+
+def open_db(tmp_path, **options):
+    return DatabaseManager(tmp_path / "write_behind.db", write_behind=True, write_behind_options=options)
+
+
+def responses(db):
+    with db.connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM user_responses').fetchone()[0]
+
+
+def test_close_flushes_queued_events(tmp_path, question_ids):
+    db = open_db(tmp_path, flush_interval=0.5)
+    for question_id in question_ids:
+        db.log_user_response(1, question_id, 'A', True)
+    db.writer.close()
+    assert responses(db) == len(question_ids)
+    
+    stats = db.writer.get_stats()
+    assert (stats['enqueued'], stats['written'], stats['failed']) == (len(question_ids), len(question_ids), 0)
+    assert stats['queue_depth'] == 0 and stats['batches'] >= 1
+    assert stats['avg_batch_size'] == len(question_ids) / stats['batches']
+    db.close()
+
+
+def test_full_queue_falls_back_to_synchronous_write(tmp_path, question_ids):
+    db = open_db(tmp_path, max_queue=1, put_timeout=0.05)
+    writer = db.writer
+    committing, release = threading.Event(), threading.Event()
+    commit = writer._commit
+    
+    def stalled_commit(batch):
+        committing.set()
+        release.wait()
+        commit(batch)
+    
+    writer._commit = stalled_commit
+    db.log_user_response(1, question_ids[0], 'A', True)  # taken by the stalled writer
+    assert committing.wait(5)
+    db.log_user_response(1, question_ids[1], 'A', True)  # fills the queue
+    db.log_user_response(1, question_ids[2], 'A', True)  # written synchronously
+    assert responses(db) == 1
+    assert writer.get_stats()['sync_fallbacks'] == 1
+    
+    release.set()
+    db.close()
+    stats = writer.get_stats()
+    assert (stats['enqueued'], stats['written'], stats['max_queue_depth']) == (2, 2, 1)
+    check = DatabaseManager(tmp_path / "write_behind.db")
+    assert responses(check) == 3
+    check.close()
+
+
+def test_event_queued_during_close_is_written(tmp_path, question_ids):
+    db = open_db(tmp_path, flush_interval=0.01)
+    writer = db.writer
+    putting, release = threading.Event(), threading.Event()
+    put = writer._queue.put
+    
+    def stalled_put(event, timeout=None):
+        # Past the closing check, not yet in the queue
+        putting.set()
+        release.wait()
+        put(event, timeout=timeout)
+    
+    writer._queue.put = stalled_put
+    producer = threading.Thread(target=writer.log_response, args=(1, question_ids[0], 'A', True))
+    producer.start()
+    assert putting.wait(5)
+    closer = threading.Thread(target=writer.close)
+    closer.start()
+    closer.join(0.2)
+    release.set()
+    producer.join()
+    closer.join()
+    
+    assert responses(db) == 1
+    assert writer.get_stats()['written'] == 1
+    db.close()